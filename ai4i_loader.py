@@ -0,0 +1,301 @@
+"""
+High-throughput loader for the AI4I 2020 predictive maintenance dataset.
+
+Reads the dataset from a local CSV, reshapes it into long-format
+sensor_readings rows with vectorized pandas/NumPy and streams them into
+Postgres with COPY FROM STDIN. `--scale N` synthesizes N machines from the
+base dataset for load testing.
+
+Usage:
+    python ai4i_loader.py --csv ai4i2020.csv
+    python ai4i_loader.py --csv ai4i2020.csv --scale 1000 --plant PLANT-LOAD
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import time
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2.extras import execute_values
+
+# (CSV column, sensor_type, unit, offset applied to the raw value)
+SENSOR_COLUMNS = [
+    ("Air temperature [K]", "air_temperature", "°C", -273.15),
+    ("Process temperature [K]", "process_temperature", "°C", -273.15),
+    ("Rotational speed [rpm]", "rotational_speed", "rpm", 0.0),
+    ("Torque [Nm]", "torque", "Nm", 0.0),
+    ("Tool wear [min]", "tool_wear", "min", 0.0),
+]
+
+FAILURE_MODES = [
+    ("TWF", "Tool Wear Failure. "),
+    ("HDF", "Heat Dissipation Failure. "),
+    ("PWF", "Power Failure. "),
+    ("OSF", "Overstrain Failure. "),
+    ("RNF", "Random Failures. "),
+]
+
+# Relative noise applied per synthesized machine, by sensor type
+SCALE_NOISE = {
+    "air_temperature": 0.002,
+    "process_temperature": 0.002,
+    "rotational_speed": 0.02,
+    "torque": 0.03,
+    "tool_wear": 0.0,
+}
+
+READING_COLUMNS = ("time", "asset_id", "sensor_type", "value", "unit", "quality")
+
+
+def load_ai4i_csv(path: str) -> pd.DataFrame:
+    """Read the AI4I CSV and check it has the columns the loader uses"""
+    columns = [column for column, _, _, _ in SENSOR_COLUMNS] + ["Machine failure"]
+    df = pd.read_csv(path)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"{path} is missing AI4I columns: {', '.join(missing)}")
+    return df
+
+
+def reading_timestamps(n: int, end_time: datetime.datetime, interval_minutes: int) -> pd.DatetimeIndex:
+    """Evenly spaced timestamps, oldest first, with the last one at `end_time`"""
+    return pd.date_range(end=end_time, periods=n, freq=f"{interval_minutes}min")
+
+
+def sensor_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Wide frame of converted sensor values, one column per sensor_type"""
+    return pd.DataFrame({
+        sensor_type: (df[column].to_numpy(dtype=np.float64) + offset).round(2)
+        for column, sensor_type, _, offset in SENSOR_COLUMNS
+    })
+
+
+def synthesize_machine(base: pd.DataFrame, rng: np.random.Generator) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Derive a new machine from the base wide frame: rotate it in time by a
+    random offset and add small multiplicative noise per sensor.
+
+    Returns the new frame and the row order used, so labels can follow it.
+    """
+    order = np.roll(np.arange(len(base)), int(rng.integers(0, len(base))))
+    machine = pd.DataFrame({column: base[column].to_numpy()[order] for column in base.columns})
+    for sensor_type, noise in SCALE_NOISE.items():
+        if noise:
+            values = machine[sensor_type].to_numpy()
+            machine[sensor_type] = (values * (1 + rng.normal(0.0, noise, len(values)))).round(2)
+    return machine, order
+
+
+def build_readings(wide: pd.DataFrame, asset_id: str, timestamps: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    Melt a wide sensor frame into long-format sensor_readings rows.
+
+    The straightforward form of what readings_to_csv encodes; tests check
+    the fast path against it.
+    """
+    units = {sensor_type: unit for _, sensor_type, unit, _ in SENSOR_COLUMNS}
+    long = wide.assign(time=timestamps).melt(id_vars="time", var_name="sensor_type", value_name="value")
+    long["asset_id"] = asset_id
+    long["unit"] = long["sensor_type"].map(units)
+    long["quality"] = "good"
+    return long[list(READING_COLUMNS)]
+
+
+def readings_to_csv(wide: pd.DataFrame, asset_id: str, time_text: np.ndarray) -> str:
+    """
+    Encode one machine's readings as CSV for COPY.
+
+    Equivalent to build_readings(...).to_csv() but built from object-array
+    concatenation, with timestamps formatted once and shared across machines.
+    """
+    prefix = time_text + f",{asset_id},"
+    parts = []
+    for _, sensor_type, unit, _ in SENSOR_COLUMNS:
+        values = wide[sensor_type].to_numpy().astype(str).astype(object)
+        parts.append(prefix + f"{sensor_type}," + values + f",{unit},good\n")
+    return "".join(np.concatenate(parts).tolist())
+
+
+def build_anomalies(df: pd.DataFrame, asset_id: str, timestamps: pd.DatetimeIndex) -> List[Tuple]:
+    """Rows for the anomalies table, one per labelled machine failure"""
+    failed = df["Machine failure"].to_numpy() == 1
+    if not failed.any():
+        return []
+
+    description = np.full(int(failed.sum()), "", dtype=object)
+    for flag, label in FAILURE_MODES:
+        if flag in df.columns:
+            description += np.where(df[flag].to_numpy()[failed] == 1, label, "")
+    description[description == ""] = "Unknown Machine Failure."
+
+    return [
+        (asset_id, ts.isoformat(), "critical", "multiple_sensors", 0.0, 1.0, 100.0,
+         f"Ground-Truth Confirmed Kaggle AI4I Failure: {mode}", "open")
+        for ts, mode in zip(timestamps[failed], description)
+    ]
+
+
+class _ChunkReader(io.TextIOBase):
+    """File-like adapter so COPY FROM STDIN can consume a generator of text chunks"""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_readings(cursor, chunks: Iterator[str]):
+    """Stream CSV chunks into sensor_readings with COPY FROM STDIN"""
+    cursor.copy_expert(
+        f"COPY sensor_readings ({', '.join(READING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _ChunkReader(chunks),
+        size=1 << 20,
+    )
+
+
+def load(conn, df: pd.DataFrame, scale: int = 1, plant_id: str = "PLANT-001",
+         interval_minutes: int = 5, end_time: Optional[datetime.datetime] = None,
+         machines_per_copy: int = 20, include_anomalies: bool = True,
+         seed: int = 2020) -> dict:
+    """
+    Create `scale` milling machine assets and load their readings (and labelled
+    failures as anomalies). Commits after every `machines_per_copy` machines so a
+    large load makes steady progress.
+    """
+    end_time = (end_time or datetime.datetime.now(datetime.timezone.utc)).replace(microsecond=0)
+    timestamps = reading_timestamps(len(df), end_time, interval_minutes)
+    time_text = np.datetime_as_string(
+        timestamps.tz_convert("UTC").tz_localize(None).to_numpy().astype("datetime64[s]"), unit="s"
+    ).astype(object) + "Z"
+    base = sensor_frame(df)
+    rng = np.random.default_rng(seed)
+
+    asset_ids = [str(uuid.uuid4()) for _ in range(scale)]
+    names = (["AI4I Milling Machine"] if scale == 1
+             else [f"AI4I Milling Machine {i + 1:05d}" for i in range(scale)])
+    metadata = json.dumps({
+        "dataset": "AI4I 2020", "manufacturer": "Kaggle", "model": "Predictive Maintenance Simulator"
+    })
+
+    stats = {"assets": scale, "readings": 0, "anomalies": 0}
+    with conn.cursor() as cur:
+        execute_values(cur, """
+        INSERT INTO assets (id, name, type, plant_id, metadata, status, current_risk_score)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        """, [(asset_id, name, "milling_machine", plant_id, metadata, "active", 50.0)
+              for asset_id, name in zip(asset_ids, names)], page_size=1000)
+        conn.commit()
+
+        for start in range(0, scale, machines_per_copy):
+            group = asset_ids[start:start + machines_per_copy]
+            # The first machine is the dataset as-is; the rest are synthesized from it
+            machines = [(base, None) if start + i == 0 else synthesize_machine(base, rng)
+                        for i in range(len(group))]
+
+            copy_readings(cur, (readings_to_csv(machine, asset_id, time_text)
+                                for (machine, _), asset_id in zip(machines, group)))
+            stats["readings"] += len(group) * len(df) * len(SENSOR_COLUMNS)
+
+            if include_anomalies:
+                anomalies = []
+                for (_, order), asset_id in zip(machines, group):
+                    # Failure labels follow the same time rotation as the readings
+                    labels = df if order is None else df.iloc[order]
+                    anomalies.extend(build_anomalies(labels, asset_id, timestamps))
+                if anomalies:
+                    execute_values(cur, """
+                    INSERT INTO anomalies (asset_id, timestamp, severity, metric, expected_value, actual_value, deviation, description, status)
+                    VALUES %s
+                    """, anomalies, page_size=5000)
+                    stats["anomalies"] += len(anomalies)
+
+            conn.commit()
+            print(f"  loaded {min(start + machines_per_copy, scale)}/{scale} machines "
+                  f"({stats['readings']:,} readings)")
+
+    stats["asset_ids"] = asset_ids
+    return stats
+
+
+def connect_from_args(args) -> "psycopg2.extensions.connection":
+    return psycopg2.connect(
+        host=args.host,
+        port=args.port,
+        database=args.database,
+        user=args.user,
+        password=args.password,
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load the AI4I 2020 dataset into sensor_readings with COPY")
+    parser.add_argument("--csv", required=True, help="Path to a local ai4i2020.csv")
+    parser.add_argument("--scale", type=int, default=1, help="Number of machines to synthesize (default 1)")
+    parser.add_argument("--plant", default="PLANT-001", help="plant_id for the created assets")
+    parser.add_argument("--interval-minutes", type=int, default=5, help="Minutes between dataset rows")
+    parser.add_argument("--machines-per-copy", type=int, default=20,
+                        help="Machines streamed per COPY/commit (default 20)")
+    parser.add_argument("--no-anomalies", action="store_true", help="Skip importing labelled failures")
+    parser.add_argument("--seed", type=int, default=2020, help="Random seed for synthesized machines")
+    parser.add_argument("--host", default=os.getenv("DATABASE_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("DATABASE_PORT", 5433)))
+    parser.add_argument("--database", default=os.getenv("DATABASE_NAME", "opssightai"))
+    parser.add_argument("--user", default=os.getenv("DATABASE_USER", "postgres"))
+    parser.add_argument("--password", default=os.getenv("DATABASE_PASSWORD", "postgres"))
+    args = parser.parse_args(argv)
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    df = load_ai4i_csv(args.csv)
+    print(f"Read {len(df)} rows from {args.csv}; loading {args.scale} machine(s) "
+          f"= {len(df) * len(SENSOR_COLUMNS) * args.scale:,} readings")
+
+    conn = connect_from_args(args)
+    try:
+        start = time.perf_counter()
+        stats = load(
+            conn, df,
+            scale=args.scale,
+            plant_id=args.plant,
+            interval_minutes=args.interval_minutes,
+            machines_per_copy=args.machines_per_copy,
+            include_anomalies=not args.no_anomalies,
+            seed=args.seed,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    print(f"🏁 Loaded {stats['readings']:,} readings and {stats['anomalies']:,} anomalies "
+          f"for {stats['assets']} asset(s) in {elapsed:.1f}s "
+          f"({stats['readings'] / max(elapsed, 1e-9):,.0f} readings/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,70 @@ CREATE TABLE IF NOT EXISTS sensor_readings (
 -- Convert sensor_readings to hypertable
 SELECT create_hypertable('sensor_readings', 'time', if_not_exists => TRUE);
 
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_asset_sensor_time ON sensor_readings(asset_id, sensor_type, time DESC);
+
+-- Per-minute and per-hour rollups of sensor_readings (see migrations/003_sensor_readings_rollups.sql)
+-- Every column is additive across buckets, so any run of buckets combines into
+-- count, mean, std, min, max, first/last and a least-squares trend. The time_*
+-- sums use seconds since the bucket start to keep them small.
+-- materialized_only = false serves buckets the refresh policy has not reached
+-- yet straight from sensor_readings (real-time aggregation).
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', time) AS bucket,
+       asset_id,
+       sensor_type,
+       count(*) AS readings,
+       sum(value)::float8 AS value_sum,
+       sum(value::float8 * value::float8) AS value_sum_sq,
+       min(value)::float8 AS value_min,
+       max(value)::float8 AS value_max,
+       first(value, time)::float8 AS value_first,
+       last(value, time)::float8 AS value_last,
+       min(time) AS first_time,
+       max(time) AS last_time,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)))::float8 AS time_sum,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)) ^ 2)::float8 AS time_sum_sq,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)) * value)::float8 AS time_value_sum
+FROM sensor_readings
+GROUP BY bucket, asset_id, sensor_type
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', time) AS bucket,
+       asset_id,
+       sensor_type,
+       count(*) AS readings,
+       sum(value)::float8 AS value_sum,
+       sum(value::float8 * value::float8) AS value_sum_sq,
+       min(value)::float8 AS value_min,
+       max(value)::float8 AS value_max,
+       first(value, time)::float8 AS value_first,
+       last(value, time)::float8 AS value_last,
+       min(time) AS first_time,
+       max(time) AS last_time,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)))::float8 AS time_sum,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)) ^ 2)::float8 AS time_sum_sq,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)) * value)::float8 AS time_value_sum
+FROM sensor_readings
+GROUP BY bucket, asset_id, sensor_type
+WITH NO DATA;
+
+-- Refresh recent buckets in the background; readings older than start_offset
+-- (backfills, replays) are picked up with `python rollups.py --start ... --end ...`
+SELECT add_continuous_aggregate_policy('sensor_readings_1m',
+  start_offset => INTERVAL '1 day',
+  end_offset => INTERVAL '1 minute',
+  schedule_interval => INTERVAL '1 minute',
+  if_not_exists => TRUE);
+
+SELECT add_continuous_aggregate_policy('sensor_readings_1h',
+  start_offset => INTERVAL '3 days',
+  end_offset => INTERVAL '1 hour',
+  schedule_interval => INTERVAL '15 minutes',
+  if_not_exists => TRUE);
+
 -- Create risk scores table (will be converted to hypertable)
 CREATE TABLE IF NOT EXISTS risk_scores (
   time TIMESTAMPTZ NOT NULL,
@@ -123,6 +187,37 @@ CREATE TABLE IF NOT EXISTS executive_summaries (
 
 CREATE INDEX IF NOT EXISTS idx_executive_summaries_plant ON executive_summaries(plant_id, generated_at DESC);
 
+-- Plant risk rollups maintained by the risk scoring service (see migrations/004_plant_risk_rollups.sql)
+-- Counts cover the plant's active assets; assets without a score count as 0.
+-- histogram: assets per 10-point score bucket, [0, 10) ... [90, 100]
+-- band_counts: assets per risk band (low <= 30 < medium <= 60 < high <= 80 < critical)
+-- top_assets: the riskiest assets, in the executive summary's AssetRiskSummary shape
+CREATE TABLE IF NOT EXISTS plant_risk_rollups (
+  plant_id VARCHAR(100) PRIMARY KEY,
+  total_assets INTEGER NOT NULL,
+  score_sum NUMERIC(14,2) NOT NULL,
+  histogram INTEGER[] NOT NULL,
+  band_counts INTEGER[] NOT NULL,
+  top_assets JSONB NOT NULL DEFAULT '[]',
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- State of each rollup at the end of every hour it changed, for 24h / 7d deltas
+CREATE TABLE IF NOT EXISTS plant_risk_rollup_history (
+  plant_id VARCHAR(100) NOT NULL,
+  period_start TIMESTAMPTZ NOT NULL,
+  total_assets INTEGER NOT NULL,
+  score_sum NUMERIC(14,2) NOT NULL,
+  band_counts INTEGER[] NOT NULL,
+  PRIMARY KEY (plant_id, period_start)
+);
+
+-- Serves the top-N re-read of a plant after each score write
+CREATE INDEX IF NOT EXISTS idx_assets_plant_active_risk
+  ON assets (plant_id, current_risk_score DESC NULLS LAST, id)
+  WHERE status = 'active';
+
 -- Insert sample data for development
 INSERT INTO assets (name, type, plant_id, location, metadata, status, current_risk_score)
 VALUES 
@@ -0,0 +1,14 @@
+-- OpsSightAI Sensor Window Index
+-- Migration: 002_sensor_readings_window_index
+-- Description: Index sensor_readings for per-(asset, sensor type) "last K readings"
+--              and time-range lookups used by the risk scoring service
+
+-- Serves:
+--   * loose index scans for the distinct sensor types of an asset
+--   * LATERAL "ORDER BY time DESC LIMIT K" probes per (asset_id, sensor_type)
+--   * time-range reads for one asset and sensor type
+-- transaction_per_chunk builds the index chunk by chunk so large hypertables
+-- are not locked for the whole build.
+CREATE INDEX IF NOT EXISTS idx_sensor_readings_asset_sensor_time
+  ON sensor_readings (asset_id, sensor_type, time DESC)
+  WITH (timescaledb.transaction_per_chunk);
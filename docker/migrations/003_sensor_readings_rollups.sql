@@ -0,0 +1,66 @@
+-- OpsSightAI Sensor Reading Rollups
+-- Migration: 003_sensor_readings_rollups
+-- Description: Per-minute and per-hour continuous aggregates of sensor_readings
+--              per (asset_id, sensor_type), so the risk scoring service can derive
+--              24h / 7d window features from a few hundred rows instead of raw readings
+
+-- Every column is additive across buckets, so any run of buckets combines into
+-- count, mean, std, min, max, first/last and a least-squares trend. The time_*
+-- sums use seconds since the bucket start to keep them small.
+-- materialized_only = false serves buckets the refresh policy has not reached
+-- yet straight from sensor_readings (real-time aggregation).
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', time) AS bucket,
+       asset_id,
+       sensor_type,
+       count(*) AS readings,
+       sum(value)::float8 AS value_sum,
+       sum(value::float8 * value::float8) AS value_sum_sq,
+       min(value)::float8 AS value_min,
+       max(value)::float8 AS value_max,
+       first(value, time)::float8 AS value_first,
+       last(value, time)::float8 AS value_last,
+       min(time) AS first_time,
+       max(time) AS last_time,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)))::float8 AS time_sum,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)) ^ 2)::float8 AS time_sum_sq,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 minute', time)) * value)::float8 AS time_value_sum
+FROM sensor_readings
+GROUP BY bucket, asset_id, sensor_type
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_readings_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', time) AS bucket,
+       asset_id,
+       sensor_type,
+       count(*) AS readings,
+       sum(value)::float8 AS value_sum,
+       sum(value::float8 * value::float8) AS value_sum_sq,
+       min(value)::float8 AS value_min,
+       max(value)::float8 AS value_max,
+       first(value, time)::float8 AS value_first,
+       last(value, time)::float8 AS value_last,
+       min(time) AS first_time,
+       max(time) AS last_time,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)))::float8 AS time_sum,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)) ^ 2)::float8 AS time_sum_sq,
+       sum(extract(epoch FROM time - time_bucket(INTERVAL '1 hour', time)) * value)::float8 AS time_value_sum
+FROM sensor_readings
+GROUP BY bucket, asset_id, sensor_type
+WITH NO DATA;
+
+-- Refresh recent buckets in the background; readings older than start_offset
+-- (backfills, replays) are picked up with `python rollups.py --start ... --end ...`
+SELECT add_continuous_aggregate_policy('sensor_readings_1m',
+  start_offset => INTERVAL '1 day',
+  end_offset => INTERVAL '1 minute',
+  schedule_interval => INTERVAL '1 minute',
+  if_not_exists => TRUE);
+
+SELECT add_continuous_aggregate_policy('sensor_readings_1h',
+  start_offset => INTERVAL '3 days',
+  end_offset => INTERVAL '1 hour',
+  schedule_interval => INTERVAL '15 minutes',
+  if_not_exists => TRUE);
@@ -0,0 +1,35 @@
+-- OpsSightAI Plant Risk Rollups
+-- Migration: 004_plant_risk_rollups
+-- Description: Per-plant risk rollups kept current by every risk score write of the
+--              risk scoring service, so executive summaries read one row per plant
+--              instead of aggregating every asset (see ml-services/risk-scoring/plant_rollup.py)
+
+-- Counts cover the plant's active assets; assets without a score count as 0.
+-- histogram: assets per 10-point score bucket, [0, 10) ... [90, 100]
+-- band_counts: assets per risk band (low <= 30 < medium <= 60 < high <= 80 < critical)
+-- top_assets: the riskiest assets, in the executive summary's AssetRiskSummary shape
+CREATE TABLE IF NOT EXISTS plant_risk_rollups (
+  plant_id VARCHAR(100) PRIMARY KEY,
+  total_assets INTEGER NOT NULL,
+  score_sum NUMERIC(14,2) NOT NULL,
+  histogram INTEGER[] NOT NULL,
+  band_counts INTEGER[] NOT NULL,
+  top_assets JSONB NOT NULL DEFAULT '[]',
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- State of each rollup at the end of every hour it changed, for 24h / 7d deltas
+CREATE TABLE IF NOT EXISTS plant_risk_rollup_history (
+  plant_id VARCHAR(100) NOT NULL,
+  period_start TIMESTAMPTZ NOT NULL,
+  total_assets INTEGER NOT NULL,
+  score_sum NUMERIC(14,2) NOT NULL,
+  band_counts INTEGER[] NOT NULL,
+  PRIMARY KEY (plant_id, period_start)
+);
+
+-- Serves the top-N re-read of a plant after each score write
+CREATE INDEX IF NOT EXISTS idx_assets_plant_active_risk
+  ON assets (plant_id, current_risk_score DESC NULLS LAST, id)
+  WHERE status = 'active';
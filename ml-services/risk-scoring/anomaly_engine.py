@@ -0,0 +1,206 @@
+"""
+Fleet-wide anomaly detection over the same sensor columns risk scoring reads.
+
+For every (asset, sensor type) stream in a batch, the newest reading is
+tested against the rest of the window with three detectors, all computed
+for every stream at once:
+
+    z-score   distance from the window mean in standard deviations
+    EWMA      distance from an exponentially weighted mean (recent readings
+              weigh more) in exponentially weighted standard deviations
+    MAD       robust z-score from the window median and median absolute
+              deviation, which a few earlier outliers cannot inflate
+
+A reading is anomalous when any detector crosses its threshold. Severity and
+descriptions follow the backend's anomalyDetectionService.
+"""
+import os
+import threading
+from datetime import timezone
+from typing import Any, Dict, List, Mapping, Tuple
+
+import numpy as np
+
+from feature_engineering import factorize
+from metrics import REGISTRY, Counter
+
+ANOMALIES_DETECTED = REGISTRY.register(Counter(
+    'risk_anomalies_detected_total', 'Anomalous sensor readings found', ['severity']))
+
+# Deviation from the expected value (percent) at which a sensor's anomaly is high;
+# 1.5x is critical, 0.5x medium
+CRITICAL_DEVIATION = {
+    'temperature': 20.0,
+    'vibration': 50.0,
+    'voltage': 15.0,
+    'current': 25.0,
+    'pressure': 30.0
+}
+DEFAULT_CRITICAL_DEVIATION = 25.0
+
+# Scale making the MAD a consistent estimator of the standard deviation
+_MAD_SCALE = 0.6745
+# anomalies.deviation is DECIMAL(5,2)
+_MAX_DEVIATION = 999.99
+
+
+def _group_medians(codes: np.ndarray, values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Median of `values` per group code (every group non-empty)"""
+    order = np.lexsort((values, codes))
+    starts = np.concatenate(([0], np.cumsum(counts[:-1]))).astype(np.int64)
+    low = values[order[starts + (counts - 1) // 2]]
+    high = values[order[starts + counts // 2]]
+    return (low + high) / 2.0
+
+
+def _scaled_distance(distance: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    # A flat baseline makes any change infinitely unusual, and no change not at all
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scale > 0, distance / scale, np.where(distance > 1e-9, np.inf, 0.0))
+
+
+def _severity(deviation: float, sensor_type: str) -> str:
+    critical = CRITICAL_DEVIATION.get(sensor_type, DEFAULT_CRITICAL_DEVIATION)
+    if deviation >= critical * 1.5:
+        return 'critical'
+    if deviation >= critical:
+        return 'high'
+    if deviation >= critical * 0.5:
+        return 'medium'
+    return 'low'
+
+
+class AnomalyEngine:
+    """
+    Vectorized detectors over batches of sensor columns. Remembers the newest
+    reading tested per stream, so repeated passes over overlapping windows
+    report each reading once.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('ANOMALY_DETECTION_ENABLED', 'true').lower() == 'true'
+        self.min_readings = int(os.getenv('ANOMALY_MIN_READINGS', 10))
+        self.z_threshold = float(os.getenv('ANOMALY_Z_THRESHOLD', 2.5))
+        self.ewma_alpha = float(os.getenv('ANOMALY_EWMA_ALPHA', 0.1))
+        self.ewma_threshold = float(os.getenv('ANOMALY_EWMA_THRESHOLD', 3.0))
+        self.mad_threshold = float(os.getenv('ANOMALY_MAD_THRESHOLD', 3.5))
+        self._checked: Dict[Tuple[Any, Any], int] = {}
+        self._lock = threading.Lock()
+
+    def score(self, columns: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Detector scores for the newest reading of every (asset, sensor type)
+        stream in `columns` (asset_id, time, sensor_type, value; each asset's
+        rows newest first, as `Database.get_sensor_window_batch` returns them).
+
+        One entry per stream with at least `min_readings` readings: the row
+        index of the tested reading, the window mean (the expected value)
+        and the z, EWMA and MAD scores.
+        """
+        values = np.asarray(columns['value'], dtype=np.float64)
+        empty = np.empty(0)
+        if len(values) == 0:
+            return {'row': empty.astype(np.int64), 'expected': empty, 'z': empty, 'ewma': empty, 'mad': empty}
+
+        asset_codes, _ = factorize(columns['asset_id'])
+        sensor_codes, sensors = factorize(columns['sensor_type'])
+        codes, _ = factorize(asset_codes * len(sensors) + sensor_codes)
+        n_groups = int(codes.max()) + 1
+
+        # Rank 0 is the newest reading of its stream, the one tested; the rest are its baseline
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts[:-1])))
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[order] = np.arange(len(values)) - np.repeat(starts, counts)
+
+        latest_row = order[starts]
+        latest = values[latest_row]
+        baseline = rank > 0
+        base_codes, base_values = codes[baseline], values[baseline]
+        base_counts = np.maximum(counts - 1, 1).astype(np.float64)
+
+        mean = np.bincount(base_codes, weights=base_values, minlength=n_groups) / base_counts
+        deviation = base_values - mean[base_codes]
+        std = np.sqrt(np.bincount(base_codes, weights=deviation * deviation, minlength=n_groups) / base_counts)
+
+        weights = (1.0 - self.ewma_alpha) ** (rank[baseline] - 1)
+        weight_sums = np.maximum(np.bincount(base_codes, weights=weights, minlength=n_groups), 1e-300)
+        ewma = np.bincount(base_codes, weights=weights * base_values, minlength=n_groups) / weight_sums
+        ew_deviation = base_values - ewma[base_codes]
+        ew_std = np.sqrt(np.bincount(base_codes, weights=weights * ew_deviation * ew_deviation,
+                                     minlength=n_groups) / weight_sums)
+
+        # Groups without a baseline get a placeholder so the median indexing stays in range
+        median_counts = np.maximum(np.bincount(base_codes, minlength=n_groups), 1)
+        padded_codes = np.concatenate((base_codes, np.flatnonzero(counts == 1)))
+        padded_values = np.concatenate((base_values, latest[counts == 1]))
+        median = _group_medians(padded_codes, padded_values, median_counts)
+        mad = _group_medians(padded_codes, np.abs(padded_values - median[padded_codes]), median_counts)
+
+        enough = counts >= max(self.min_readings, 2)
+        return {
+            'row': latest_row[enough],
+            'expected': mean[enough],
+            'z': _scaled_distance(np.abs(latest - mean), std)[enough],
+            'ewma': _scaled_distance(np.abs(latest - ewma), ew_std)[enough],
+            'mad': _scaled_distance(_MAD_SCALE * np.abs(latest - median), mad)[enough]
+        }
+
+    def detect(self, columns: Mapping[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Anomaly records (the anomalies table's columns) for the newest reading
+        of every stream in `columns` not tested by an earlier call
+        """
+        scores = self.score(columns)
+        rows = scores['row']
+        if not len(rows):
+            return []
+
+        micros = columns['time'][rows].astype('datetime64[us]').astype(np.int64)
+        asset_ids = columns['asset_id'][rows].tolist()
+        sensor_types = columns['sensor_type'][rows].tolist()
+        keys = list(zip(asset_ids, sensor_types))
+        with self._lock:
+            fresh = np.fromiter((self._checked.get(key, -1) < stamp for key, stamp in zip(keys, micros.tolist())),
+                                dtype=bool, count=len(rows))
+            for key, stamp in zip(keys, micros.tolist()):
+                if stamp > self._checked.get(key, -1):
+                    self._checked[key] = stamp
+
+        flagged = fresh & (
+            (scores['z'] > self.z_threshold) | (scores['ewma'] > self.ewma_threshold)
+            | (scores['mad'] > self.mad_threshold)
+        )
+
+        anomalies: List[Dict[str, Any]] = []
+        values = columns['value']
+        for index in np.flatnonzero(flagged).tolist():
+            actual = float(values[rows[index]])
+            expected = float(scores['expected'][index])
+            sensor_type = sensor_types[index]
+            if expected != 0:
+                deviation = min(abs(actual - expected) / abs(expected) * 100, _MAX_DEVIATION)
+            else:
+                deviation = _MAX_DEVIATION if actual != 0 else 0.0
+            severity = _severity(deviation, sensor_type)
+            ANOMALIES_DETECTED.labels(severity).inc()
+            anomalies.append({
+                'asset_id': asset_ids[index],
+                'timestamp': columns['time'][rows[index]].item().replace(tzinfo=timezone.utc),
+                'severity': severity,
+                'metric': sensor_type,
+                'expected_value': expected,
+                'actual_value': actual,
+                'deviation': round(deviation, 2),
+                'description': (
+                    f"{sensor_type.capitalize()} reading of {actual:.2f} is {deviation:.1f}% "
+                    f"{'above' if actual > expected else 'below'} expected value of {expected:.2f} "
+                    f"(z={scores['z'][index]:.1f}, ewma={scores['ewma'][index]:.1f}, "
+                    f"mad={scores['mad'][index]:.1f})"
+                )
+            })
+        return anomalies
+
+
+anomaly_engine = AnomalyEngine()
@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the risk-scoring hot path.
+
+Run from ml-services/risk-scoring:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
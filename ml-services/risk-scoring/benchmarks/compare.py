@@ -0,0 +1,69 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Usage (from ml-services/risk-scoring):
+    python -m benchmarks.compare baseline.json candidate.json [--metric p50_ms] [--threshold 0.10]
+
+Exits with status 1 when any benchmark's metric got worse by more than the
+threshold (relative), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], metric: str,
+            threshold: float) -> List[Dict[str, Any]]:
+    """One row per benchmark present in either run; `change` is relative (positive = slower)"""
+    rows = []
+    names = list(dict.fromkeys([*baseline['results'], *candidate['results']]))
+    for name in names:
+        before = baseline['results'].get(name, {}).get(metric)
+        after = candidate['results'].get(name, {}).get(metric)
+        change = (after - before) / before if before and after is not None else None
+        if metric == 'ops_per_sec' and change is not None:
+            # Higher throughput is better, so flip the sign to keep positive = worse
+            change = -change
+        rows.append({
+            'name': name,
+            'baseline': before,
+            'candidate': after,
+            'change': change,
+            'regression': change is not None and change > threshold
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline', help="Results from the reference commit")
+    parser.add_argument('candidate', help="Results from the commit under test")
+    parser.add_argument('--metric', default='p50_ms',
+                        help="Result field to compare (default: p50_ms; ops_per_sec is treated as higher-is-better)")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown that counts as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.metric, args.threshold)
+    print(f"{baseline['environment'].get('git_revision')} -> {candidate['environment'].get('git_revision')}"
+          f" ({args.metric}, threshold {args.threshold:.0%})")
+    width = max((len(row['name']) for row in rows), default=0)
+    for row in rows:
+        before = f"{row['baseline']:.4f}" if row['baseline'] is not None else '-'
+        after = f"{row['candidate']:.4f}" if row['candidate'] is not None else '-'
+        change = f"{row['change']:+.1%}" if row['change'] is not None else 'n/a'
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<{width}}  {before:>12}  {after:>12}  {change:>8}{flag}")
+
+    if any(row['regression'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+In-memory stand-in for `database.Database` so benchmarks run without Postgres.
+
+Readings are kept per asset and materialized through the same `to_columns`
+conversion the real queries use, so the Python side of each call is measured
+and only the network round trip and server-side execution are left out.
+"""
+import asyncio
+import json
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+import plant_rollup
+from database import ROLLUP_COLUMNS, ROLLUPS, SensorColumns, to_columns
+from timestamps import to_micros
+
+
+class FakeDatabase:
+    """Answers the queries the service makes from dicts held in memory"""
+
+    def __init__(self, assets: List[Dict[str, Any]], readings: Dict[str, List[Dict[str, Any]]],
+                 pool_max: int = 10):
+        self.pool_max = pool_max
+        self._executor = ThreadPoolExecutor(max_workers=pool_max, thread_name_prefix='fake-db')
+        self.assets = {asset['id']: asset for asset in assets}
+        # Oldest first, per asset and per (asset, sensor type)
+        self.readings: Dict[str, List[Dict[str, Any]]] = {}
+        self._times: Dict[str, List[datetime]] = {}
+        self._streams: Dict[str, Dict[str, List[tuple]]] = {}
+        for asset_id, asset_readings in readings.items():
+            self._add(asset_id, asset_readings)
+        self.risk_scores: List[Dict[str, Any]] = []
+        self.anomalies: List[Dict[str, Any]] = []
+        self.forecasts: List[Dict[str, Any]] = []
+        self.plant_rollups_enabled = True
+        self.plant_rollup_top_n = 10
+        self.plant_rollup_max_age = timedelta(hours=1)
+        self.plant_rollups: Dict[str, Dict[str, Any]] = {}
+        self.plant_rollup_history: Dict[str, Dict[datetime, Dict[str, Any]]] = {}
+
+    def _add(self, asset_id: str, readings: List[Dict[str, Any]]):
+        stored = self.readings.setdefault(asset_id, [])
+        stored.extend(readings)
+        stored.sort(key=lambda reading: reading['timestamp'])
+        self._times[asset_id] = [reading['timestamp'] for reading in stored]
+        streams: Dict[str, List[tuple]] = {}
+        for reading in stored:
+            streams.setdefault(reading['sensor_type'], []).append(
+                (to_micros(reading['timestamp']), reading['sensor_type'], reading['value'])
+            )
+        self._streams[asset_id] = streams
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    def ping(self):
+        pass
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return {
+            'min_size': 0,
+            'max_size': self.pool_max,
+            'opened': True,
+            'in_use': 0,
+            'available': self.pool_max,
+            'waiting': 0,
+            'timeouts': 0,
+            'saturation': 0.0
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _window_rows(self, asset_id: str, per_sensor: int, since: Optional[datetime],
+                     sensor_types: Optional[List[str]], until: Optional[datetime] = None) -> List[tuple]:
+        since_micros = to_micros(since) if since is not None else None
+        rows: List[tuple] = []
+        for sensor_type, stream in self._streams.get(asset_id, {}).items():
+            if sensor_types and sensor_type not in sensor_types:
+                continue
+            if until is not None:
+                stream = [row for row in stream if row[0] < to_micros(until)]
+            window = stream[-per_sensor:]
+            if since_micros is not None:
+                window = [row for row in window if row[0] > since_micros]
+            rows.extend(window)
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows
+
+    def get_sensor_data(self, asset_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        return [
+            {key: reading[key] for key in ('timestamp', 'sensor_type', 'value', 'unit')}
+            for reading in reversed(self.readings.get(asset_id, [])[-limit:])
+        ]
+
+    def get_sensor_window(self, asset_id: str, per_sensor: int = 100,
+                          since: Optional[datetime] = None,
+                          sensor_types: Optional[List[str]] = None) -> SensorColumns:
+        return to_columns(self._window_rows(asset_id, per_sensor, since, sensor_types),
+                           ['time', 'sensor_type', 'value'])
+
+    def get_sensor_window_batch(self, asset_ids: List[str], per_sensor: int = 100,
+                                since: Optional[datetime] = None,
+                                until: Optional[datetime] = None) -> SensorColumns:
+        rows = [
+            (asset_id, *row)
+            for asset_id in sorted(asset_ids)
+            for row in self._window_rows(asset_id, per_sensor, since, None, until)
+        ]
+        return to_columns(rows, ['asset_id', 'time', 'sensor_type', 'value'])
+
+    def iter_sensor_readings(self, asset_ids: List[str], start: datetime, end: datetime,
+                             chunk_size: int = 50000) -> Iterator[SensorColumns]:
+        start_micros, end_micros = to_micros(start), to_micros(end)
+        rows = [
+            (asset_id, sensor_type, micros, value)
+            for asset_id in sorted(asset_ids)
+            for sensor_type, stream in sorted(self._streams.get(asset_id, {}).items())
+            for micros, _, value in stream
+            if start_micros <= micros < end_micros
+        ]
+        for first in range(0, len(rows), chunk_size):
+            yield to_columns(rows[first:first + chunk_size], ['asset_id', 'sensor_type', 'time', 'value'])
+
+    def get_sensor_rollups(self, asset_ids: List[str], since: datetime, until: Optional[datetime] = None,
+                           resolution: str = '1h') -> SensorColumns:
+        # Aggregating the covered readings directly gives what combining their buckets would
+        width = int(ROLLUPS[resolution][1].total_seconds() * 1000000)
+        since_micros = to_micros(since)
+        first_bucket = since_micros - since_micros % width
+        until_micros = to_micros(until) if until is not None else None
+        rows = []
+        for asset_id in sorted(asset_ids):
+            for sensor_type, stream in sorted(self._streams.get(asset_id, {}).items()):
+                window = [row for row in stream
+                          if row[0] >= first_bucket and (until_micros is None or row[0] < until_micros)]
+                if not window:
+                    continue
+                seconds = (np.array([row[0] for row in window], dtype=np.float64) - since_micros) / 1e6
+                values = np.array([row[2] for row in window], dtype=np.float64)
+                rows.append((
+                    asset_id, sensor_type, float(len(values)), values.sum(), (values * values).sum(),
+                    values.min(), values.max(), values[0], values[-1], seconds.sum(),
+                    (seconds * seconds).sum(), (seconds * values).sum(), seconds[0], seconds[-1]
+                ))
+        return to_columns(rows, ROLLUP_COLUMNS, floats=ROLLUP_COLUMNS[2:])
+
+    def get_sensor_data_since(self, asset_id: str, since: datetime, limit: int = 1000) -> List[Dict[str, Any]]:
+        stored = self.readings.get(asset_id, [])
+        start = bisect_right(self._times.get(asset_id, []), since)
+        return [
+            {key: reading[key] for key in ('timestamp', 'sensor_type', 'value', 'unit')}
+            for reading in stored[start:start + limit]
+        ]
+
+    def get_sensor_data_batch(self, asset_ids: List[str], limit: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+        return {asset_id: self.get_sensor_data(asset_id, limit) for asset_id in asset_ids}
+
+    def get_latest_reading_time(self, asset_id: str) -> Optional[datetime]:
+        times = self._times.get(asset_id)
+        return times[-1] if times else None
+
+    def get_asset_info(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        return self.assets.get(asset_id)
+
+    def get_assets_info(self, asset_ids: List[str]) -> List[Dict[str, Any]]:
+        return [self.assets[asset_id] for asset_id in asset_ids if asset_id in self.assets]
+
+    def get_plant_assets(self, plant_id: str) -> List[Dict[str, Any]]:
+        return [asset for asset in self.assets.values() if asset.get('plant_id') == plant_id]
+
+    def get_active_assets(self) -> List[Dict[str, Any]]:
+        return [asset for asset in self.assets.values() if asset.get('status', 'active') == 'active']
+
+    def copy_sensor_readings(self, readings: List[Dict[str, Any]]) -> int:
+        by_asset: Dict[str, List[Dict[str, Any]]] = {}
+        for reading in readings:
+            by_asset.setdefault(reading['asset_id'], []).append(reading)
+        for asset_id, asset_readings in by_asset.items():
+            self._add(asset_id, asset_readings)
+        return len(readings)
+
+    def store_risk_score(self, asset_id: str, risk_score: float, explanation: str,
+                         risk_factors: List[Dict[str, Any]], confidence: float, model_version: str = '1.0.0'):
+        # Serialize the factors as the real insert does
+        self.risk_scores.append({
+            'asset_id': asset_id,
+            'score': risk_score,
+            'explanation': explanation,
+            'factors': json.dumps(risk_factors),
+            'confidence': confidence,
+            'model_version': model_version
+        })
+        self.assets[asset_id]['current_risk_score'] = risk_score
+
+    def store_risk_scores_batch(self, scores: List[Dict[str, Any]], model_version: str = '1.0.0'):
+        moves = []
+        for score in scores:
+            asset = self.assets[score['asset_id']]
+            previous = asset.get('current_risk_score')
+            self.store_risk_score(**{key: value for key, value in score.items() if key != 'time'})
+            moves.append((asset.get('plant_id'), asset.get('status', 'active'), previous, score['risk_score']))
+        if not self.plant_rollups_enabled:
+            return
+        touched = []
+        for plant_id, score_delta, histogram, band_counts in plant_rollup.rollup_deltas(moves):
+            rollup = self.plant_rollups.get(plant_id)
+            if rollup is None:
+                continue
+            rollup['score_sum'] += score_delta
+            rollup['histogram'] = [n + dn for n, dn in zip(rollup['histogram'], histogram)]
+            rollup['band_counts'] = [n + dn for n, dn in zip(rollup['band_counts'], band_counts)]
+            rollup['updated_at'] = datetime.now(timezone.utc)
+            touched.append(plant_id)
+        self._finish_plant_rollups(touched)
+
+    def _finish_plant_rollups(self, plant_ids: List[str]):
+        hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        for plant_id in plant_ids:
+            rollup = self.plant_rollups[plant_id]
+            active = [asset for asset in self.get_active_assets() if asset.get('plant_id') == plant_id]
+            active.sort(key=lambda asset: (-(asset.get('current_risk_score') or 0.0), asset['id']))
+            rollup['top_assets'] = [plant_rollup.asset_summary(asset) for asset in active[:self.plant_rollup_top_n]]
+            self.plant_rollup_history.setdefault(plant_id, {})[hour] = {
+                'period_start': hour,
+                'total_assets': rollup['total_assets'],
+                'score_sum': rollup['score_sum'],
+                'band_counts': list(rollup['band_counts'])
+            }
+
+    def refresh_plant_rollup(self, plant_id: str) -> bool:
+        scores = [asset.get('current_risk_score') for asset in self.get_active_assets()
+                  if asset.get('plant_id') == plant_id]
+        if not scores:
+            self.plant_rollups.pop(plant_id, None)
+            return False
+        now = datetime.now(timezone.utc)
+        self.plant_rollups[plant_id] = {'plant_id': plant_id, **plant_rollup.summarize(scores),
+                                        'top_assets': [], 'refreshed_at': now, 'updated_at': now}
+        self._finish_plant_rollups([plant_id])
+        return True
+
+    def get_plant_rollup(self, plant_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        rollup = self.plant_rollups.get(plant_id)
+        if (refresh or not self.plant_rollups_enabled or rollup is None
+                or now - rollup['refreshed_at'] > self.plant_rollup_max_age):
+            if not self.refresh_plant_rollup(plant_id):
+                return None
+            rollup = self.plant_rollups[plant_id]
+        snapshots = self.plant_rollup_history.get(plant_id, {})
+        history = {}
+        for label, point in plant_rollup.history_points(now).items():
+            before = [period for period in snapshots if period <= point]
+            history[label] = dict(snapshots[max(before)]) if before else None
+        return {**rollup, 'history': history}
+
+    def store_historical_risk_scores(self, scores: List[Dict[str, Any]], model_version: str = '1.0.0') -> int:
+        for score in scores:
+            self.risk_scores.append({
+                'time': score['time'],
+                'asset_id': score['asset_id'],
+                'score': score['risk_score'],
+                'explanation': score['explanation'],
+                'factors': json.dumps(score['risk_factors']),
+                'confidence': score['confidence'],
+                'model_version': score.get('model_version', model_version)
+            })
+        return len(scores)
+
+    def store_anomalies(self, anomalies: List[Dict[str, Any]]) -> int:
+        recorded = {(a['asset_id'], a['timestamp'], a['metric']) for a in self.anomalies}
+        inserted = [a for a in anomalies if (a['asset_id'], a['timestamp'], a['metric']) not in recorded]
+        self.anomalies.extend(inserted)
+        return len(inserted)
+
+    def get_risk_score_history(self, asset_ids: List[str], since: datetime) -> SensorColumns:
+        # Only backfilled scores carry a time here
+        wanted, since_micros = set(asset_ids), to_micros(since)
+        days: Dict[tuple, List[float]] = {}
+        for score in self.risk_scores:
+            if score['asset_id'] in wanted and 'time' in score and to_micros(score['time']) >= since_micros:
+                micros = to_micros(score['time'])
+                days.setdefault((score['asset_id'], micros - micros % 86400000000), []).append(score['score'])
+        rows = [(asset_id, day, sum(scores) / len(scores)) for (asset_id, day), scores in sorted(days.items())]
+        return to_columns(rows, ['asset_id', 'time', 'score'], floats=('score',))
+
+    def store_forecasts(self, forecasts: List[Dict[str, Any]]):
+        # Serialize the predictions as the real insert does
+        self.forecasts.extend({**forecast, 'predictions': json.dumps(forecast['predictions'])}
+                              for forecast in forecasts)
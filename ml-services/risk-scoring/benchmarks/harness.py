@@ -0,0 +1,90 @@
+"""
+Timing helpers and result metadata shared by the benchmark suites
+"""
+import gc
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def summarize(samples_ms: List[float], elapsed_s: Optional[float] = None,
+              operations: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Latency percentiles over per-operation samples (milliseconds) and
+    throughput over the wall-clock time of the run.
+    """
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    operations = operations if operations is not None else len(samples)
+    elapsed_s = elapsed_s if elapsed_s is not None else samples.sum() / 1000
+    p50, p90, p95, p99 = np.percentile(samples, [50, 90, 95, 99])
+    return {
+        'samples': int(len(samples)),
+        'mean_ms': round(float(samples.mean()), 6),
+        'std_ms': round(float(samples.std()), 6),
+        'min_ms': round(float(samples.min()), 6),
+        'p50_ms': round(float(p50), 6),
+        'p90_ms': round(float(p90), 6),
+        'p95_ms': round(float(p95), 6),
+        'p99_ms': round(float(p99), 6),
+        'max_ms': round(float(samples.max()), 6),
+        'ops_per_sec': round(operations / elapsed_s, 3) if elapsed_s > 0 else None
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int = 200, warmup: int = 20,
+            number: int = 1) -> Dict[str, Any]:
+    """
+    Time `func` over `repeat` samples of `number` calls each, after `warmup`
+    untimed calls. Samples are reported per call; GC is disabled while timing
+    so collections do not land at random in the samples.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter_ns() - start) / 1e6 / number)
+        elapsed = time.perf_counter() - started
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    result = summarize(samples, elapsed, repeat * number)
+    result['calls_per_sample'] = number
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """What the numbers were measured on, so runs can be compared fairly"""
+    return {
+        'git_revision': _git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
@@ -0,0 +1,121 @@
+"""
+HTTP load generation: in-process against the ASGI app (no sockets, no
+server) or over the network against a running service.
+"""
+import asyncio
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.harness import summarize
+
+# (method, path, json body) for the next request
+RequestFactory = Callable[[int], Tuple[str, str, Any]]
+
+
+async def asgi_request(app: Any, method: str, path: str, body: Any = None,
+                       headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+    """Send one request straight into an ASGI app and collect the response"""
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('ascii'),
+        'query_string': query.encode('ascii'),
+        'root_path': '',
+        'headers': [
+            (b'host', b'benchmark'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('ascii')),
+            *((name.lower().encode('ascii'), value.encode('latin-1')) for name, value in (headers or {}).items())
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('benchmark', 80)
+    }
+    sent = False
+    status = 0
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status, b''.join(chunks)
+
+
+def run_asgi_load(app: Any, make_request: RequestFactory, requests: int,
+                  concurrency: int) -> Dict[str, Any]:
+    """`requests` requests from `concurrency` concurrent clients against an in-process app"""
+
+    async def drive():
+        latencies: List[float] = []
+        errors = 0
+        counter = iter(range(requests))
+
+        async def client():
+            nonlocal errors
+            for index in counter:
+                method, path, body = make_request(index)
+                start = time.perf_counter_ns()
+                status, _ = await asgi_request(app, method, path, body)
+                latencies.append((time.perf_counter_ns() - start) / 1e6)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+    latencies, errors, elapsed = asyncio.run(drive())
+    result = summarize(latencies, elapsed)
+    result.update({'concurrency': concurrency, 'errors': errors})
+    return result
+
+
+def run_remote_load(base_url: str, make_request: RequestFactory, requests: int,
+                    concurrency: int) -> Dict[str, Any]:
+    """Same load against a running service, one keep-alive connection per client thread"""
+    target = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if target.scheme == 'https' else http.client.HTTPConnection
+    local = threading.local()
+
+    def one(index: int) -> Tuple[float, int]:
+        if not hasattr(local, 'connection'):
+            local.connection = connection_class(target.hostname, target.port, timeout=30)
+        method, path, body = make_request(index)
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter_ns()
+        local.connection.request(method, target.path.rstrip('/') + path, body=payload,
+                                 headers={'Content-Type': 'application/json'})
+        response = local.connection.getresponse()
+        response.read()
+        return (time.perf_counter_ns() - start) / 1e6, response.status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize([latency for latency, _ in outcomes], elapsed)
+    result.update({'concurrency': concurrency, 'errors': sum(1 for _, status in outcomes if status >= 400)})
+    return result
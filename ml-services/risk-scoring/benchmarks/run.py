@@ -0,0 +1,313 @@
+"""
+Benchmark runner for the risk-scoring hot path.
+
+By default everything runs offline against synthetic data and an in-memory
+database; `--backend postgres` measures against the database configured in
+the environment instead (and writes real risk_scores rows).
+
+Usage (from ml-services/risk-scoring):
+    python -m benchmarks.run [--suite features --suite http] [--assets 200]
+                             [--backend fake|postgres --plant PLANT-001]
+                             [--url http://localhost:5000] [--output results.json]
+"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from datetime import timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import database
+from benchmarks.fake_db import FakeDatabase
+from benchmarks.harness import environment, measure
+from benchmarks.http_load import run_asgi_load, run_remote_load
+from benchmarks.synthetic import generate_dataset
+
+SUITES = ('features', 'rules', 'engine', 'store', 'replay', 'http', 'startup')
+
+
+def install_database(replacement: Any):
+    """Point every service module that imported the `db` singleton at `replacement`"""
+    original = database.db
+    for module in list(sys.modules.values()):
+        if getattr(module, 'db', None) is original:
+            module.db = replacement
+
+
+def _cycle(items: List[Any]) -> Callable[[], Any]:
+    iterator = itertools.cycle(items)
+    return lambda: next(iterator)
+
+
+def bench_features(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from feature_engineering import extract_statistical_features, extract_statistical_features_batch
+    
+    db = context['db']
+    assets = context['assets']
+    windows = [db.get_sensor_window(asset['id'], per_sensor=args.per_sensor) for asset in assets]
+    dict_windows = [db.get_sensor_data(asset['id'], limit=len(window['value']))
+                    for asset, window in zip(assets, windows)]
+    batch = db.get_sensor_window_batch([asset['id'] for asset in assets], per_sensor=args.per_sensor)
+    
+    next_window = _cycle(windows)
+    next_dicts = _cycle(dict_windows)
+    results = {
+        'extract_statistical_features[columns]': measure(
+            lambda: extract_statistical_features(next_window()), repeat=args.repeat),
+        'extract_statistical_features[dicts]': measure(
+            lambda: extract_statistical_features(next_dicts()), repeat=args.repeat),
+        'extract_statistical_features_batch': measure(
+            lambda: extract_statistical_features_batch(batch['asset_id'], batch['sensor_type'], batch['value']),
+            repeat=max(args.repeat // 10, 5), warmup=2)
+    }
+    results['extract_statistical_features_batch']['assets'] = len(assets)
+    
+    from anomaly_engine import AnomalyEngine
+    results['AnomalyEngine.score'] = measure(lambda: AnomalyEngine().score(batch),
+                                             repeat=max(args.repeat // 10, 5), warmup=2)
+    results['AnomalyEngine.score']['assets'] = len(assets)
+    return results
+
+
+def bench_rules(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from feature_engineering import calculate_risk_factors, extract_statistical_features
+    
+    db = context['db']
+    cases = [
+        (extract_statistical_features(db.get_sensor_window(asset['id'], per_sensor=args.per_sensor)), asset['type'])
+        for asset in context['assets']
+    ]
+    next_case = _cycle(cases)
+    
+    def evaluate():
+        features, asset_type = next_case()
+        return calculate_risk_factors(features, asset_type)
+    
+    return {'calculate_risk_factors': measure(evaluate, repeat=args.repeat, number=10)}
+
+
+def bench_engine(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from feature_store import feature_store
+    from risk_engine import risk_engine
+    
+    next_asset = _cycle(context['assets'])
+    
+    def calculate():
+        asset = next_asset()
+        return risk_engine.calculate_risk_score(asset['id'], asset['type'])
+    
+    results = {}
+    use_feature_store = risk_engine.use_feature_store
+    try:
+        risk_engine.use_feature_store = False
+        results['RiskEngine.calculate_risk_score[window]'] = measure(calculate, repeat=args.repeat)
+        
+        # Warm path: every asset already seeded, so only the (empty) delta is fetched
+        risk_engine.use_feature_store = True
+        for asset in context['assets']:
+            feature_store.evict(asset['id'])
+        results['RiskEngine.calculate_risk_score[feature_store]'] = measure(
+            calculate, repeat=args.repeat, warmup=len(context['assets']))
+    finally:
+        risk_engine.use_feature_store = use_feature_store
+    return results
+
+
+def bench_store(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from risk_engine import risk_engine, risk_score_record
+    
+    db = context['db']
+    records = [
+        risk_score_record(risk_engine.score_sensor_data(
+            asset['id'], asset['type'], db.get_sensor_window(asset['id'], per_sensor=args.per_sensor)
+        ))
+        for asset in context['assets']
+    ]
+    next_record = _cycle(records)
+    batch = records[:100]
+    
+    results = {
+        'store_risk_score': measure(lambda: db.store_risk_score(**next_record()),
+                                    repeat=args.repeat, warmup=5),
+        'store_risk_scores_batch[100]': measure(lambda: db.store_risk_scores_batch(batch),
+                                                repeat=max(args.repeat // 10, 5), warmup=2)
+    }
+    results['store_risk_scores_batch[100]']['rows'] = len(batch)
+    return results
+
+
+def bench_replay(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from datetime import timedelta
+    from replay import replay
+    
+    db = context['db']
+    assets = context['assets'][:100]
+    columns = db.get_sensor_window_batch([asset['id'] for asset in assets], per_sensor=args.per_sensor)
+    times = columns['time']
+    if not len(times):
+        return {}
+    start = times.min().item().replace(tzinfo=timezone.utc)
+    end = times.max().item().replace(tzinfo=timezone.utc) + timedelta(seconds=1)
+    every = max((end - start) / 20, timedelta(seconds=1))
+    
+    result = measure(lambda: replay(start, end, every, asset_ids=[asset['id'] for asset in assets], store=False),
+                     repeat=max(args.repeat // 30, 5), warmup=1)
+    result['assets'] = len(assets)
+    result['readings'] = len(times)
+    return {'replay[20 ticks]': result}
+
+
+def bench_http(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from cache import risk_cache
+    
+    assets = context['assets']
+    batch_size = min(50, len(assets))
+    
+    def calculate_request(index: int):
+        asset = assets[index % len(assets)]
+        return 'POST', '/api/risk/calculate', {'asset_id': asset['id'], 'asset_type': asset['type']}
+    
+    def batch_request(index: int):
+        first = (index * batch_size) % len(assets)
+        ids = [assets[(first + offset) % len(assets)]['id'] for offset in range(batch_size)]
+        return 'POST', '/api/risk/calculate-batch', {'asset_ids': ids}
+    
+    if args.url:
+        def load(make_request, requests):
+            return run_remote_load(args.url, make_request, requests, args.concurrency)
+    else:
+        from main import app
+        
+        def load(make_request, requests):
+            # Warm up imports, pools and caches outside the measured run
+            run_asgi_load(app, make_request, min(requests, args.concurrency * 2), args.concurrency)
+            return run_asgi_load(app, make_request, requests, args.concurrency)
+    
+    results = {}
+    enabled = risk_cache.enabled
+    if not args.url:
+        # The in-process app skips its lifespan, so start the score writer by hand
+        from write_behind import risk_writer
+        risk_writer.start()
+    try:
+        if not args.url:
+            risk_cache.enabled = False
+        results['http POST /api/risk/calculate[uncached]'] = load(calculate_request, args.requests)
+        if not args.url:
+            risk_cache.enabled = True
+            risk_cache.clear()
+            results['http POST /api/risk/calculate[cached]'] = load(calculate_request, args.requests)
+            risk_cache.enabled = enabled
+        
+        results[f'http POST /api/risk/calculate-batch[{batch_size}]'] = load(
+            batch_request, max(args.requests // batch_size, 10))
+    finally:
+        risk_cache.enabled = enabled
+        if not args.url:
+            risk_writer.stop()
+    return results
+
+
+def bench_startup(context: Dict[str, Any], args) -> Dict[str, Any]:
+    from benchmarks.startup import measure_startup
+    
+    results = {}
+    for label, warmup in (('warmup', 'true'), ('no warmup', 'false')):
+        phases = measure_startup(runs=args.startup_runs, backend=args.backend, assets=min(args.assets, 50),
+                                 per_sensor=args.per_sensor, seed=args.seed, plant=args.plant,
+                                 env={'STARTUP_WARMUP': warmup})
+        for phase, result in phases.items():
+            results[f'startup[{label}] {phase}'] = result
+    return results
+
+
+BENCHMARKS = {
+    'features': bench_features,
+    'rules': bench_rules,
+    'engine': bench_engine,
+    'store': bench_store,
+    'replay': bench_replay,
+    'http': bench_http,
+    'startup': bench_startup
+}
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the risk-scoring hot path")
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help="Suite to run (repeatable, default: all)")
+    parser.add_argument('--backend', choices=('fake', 'postgres'), default='fake',
+                        help="In-memory fake (default) or the database from the environment")
+    parser.add_argument('--plant', help="plant_id whose assets to use with --backend postgres")
+    parser.add_argument('--assets', type=int, default=200, help="Synthetic assets (default: 200)")
+    parser.add_argument('--per-sensor', type=int, default=100,
+                        help="Readings per sensor type per asset (default: 100)")
+    parser.add_argument('--seed', type=int, default=42, help="Synthetic data seed (default: 42)")
+    parser.add_argument('--repeat', type=int, default=300, help="Timed samples per micro-benchmark")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per HTTP benchmark")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent HTTP clients")
+    parser.add_argument('--startup-runs', type=int, default=5, help="Fresh processes per startup benchmark")
+    parser.add_argument('--url', help="Load a running service at this base URL instead of the in-process app")
+    parser.add_argument('--output', help="Write the JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.backend == 'postgres' and not args.plant:
+        parser.error("--backend postgres requires --plant")
+    return args
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    suites = args.suite or list(SUITES)
+    
+    if args.backend == 'fake':
+        dataset = generate_dataset(args.assets, args.per_sensor, args.seed)
+        db = FakeDatabase(dataset['assets'], dataset['readings'])
+        install_database(db)
+        assets = dataset['assets']
+    else:
+        db = database.db
+        assets = db.get_plant_assets(args.plant)
+        if not assets:
+            raise SystemExit(f"No active assets found for plant {args.plant}")
+    
+    context = {'db': db, 'assets': assets}
+    results: Dict[str, Any] = {}
+    started = time.perf_counter()
+    try:
+        for suite in suites:
+            print(f"running {suite}...", file=sys.stderr)
+            results.update(BENCHMARKS[suite](context, args))
+    finally:
+        db.close()
+    
+    report = {
+        'environment': environment(),
+        'parameters': {
+            'suites': suites,
+            'backend': args.backend,
+            'plant': args.plant,
+            'assets': len(assets),
+            'per_sensor': args.per_sensor,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'startup_runs': args.startup_runs,
+            'url': args.url
+        },
+        'duration_s': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark: each run is a fresh interpreter that imports the
+service, runs its lifespan startup and sends the first requests, timing
+every phase. Only the standard library is imported before `main`, so the
+import time is what a new pod pays.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+PHASES = ('process_ms', 'import_ms', 'startup_ms', 'first_request_ms', 'second_request_ms')
+
+
+def _child(args) -> Dict[str, Any]:
+    started = time.perf_counter()
+    main = importlib.import_module('main')
+    import_ms = (time.perf_counter() - started) * 1000
+
+    # Data set-up is not part of the measurement
+    from benchmarks.http_load import asgi_request
+    if args.backend == 'fake':
+        from benchmarks.fake_db import FakeDatabase
+        from benchmarks.run import install_database
+        from benchmarks.synthetic import generate_dataset
+        dataset = generate_dataset(args.assets, args.per_sensor, args.seed)
+        install_database(FakeDatabase(dataset['assets'], dataset['readings']))
+        assets = dataset['assets']
+    else:
+        assets = main.db.get_plant_assets(args.plant)
+
+    async def drive() -> Dict[str, float]:
+        timings = {'import_ms': import_ms}
+        start = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            timings['startup_ms'] = (time.perf_counter() - start) * 1000
+            for name, asset in (('first_request_ms', assets[0]), ('second_request_ms', assets[1 % len(assets)])):
+                start = time.perf_counter()
+                status, _ = await asgi_request(main.app, 'POST', '/api/risk/calculate',
+                                               {'asset_id': asset['id'], 'asset_type': asset['type']})
+                timings[name] = (time.perf_counter() - start) * 1000
+                if status != 200:
+                    raise RuntimeError(f"{name}: HTTP {status}")
+        return timings
+
+    return asyncio.run(drive())
+
+
+def measure_startup(runs: int = 5, backend: str = 'fake', assets: int = 50, per_sensor: int = 100,
+                    seed: int = 42, plant: Optional[str] = None,
+                    env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Percentiles of every cold-start phase over `runs` fresh processes"""
+    from benchmarks.harness import summarize
+
+    command = [sys.executable, '-m', 'benchmarks.startup', '--child', '--backend', backend,
+               '--assets', str(assets), '--per-sensor', str(per_sensor), '--seed', str(seed)]
+    if plant:
+        command += ['--plant', plant]
+    service_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    samples: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=service_dir, env={**os.environ, **(env or {})},
+                                   capture_output=True, text=True, check=True)
+        samples['process_ms'].append((time.perf_counter() - start) * 1000)
+        timings = json.loads(completed.stdout.strip().splitlines()[-1])
+        for phase, value in timings.items():
+            samples[phase].append(value)
+
+    return {phase: summarize(values) for phase, values in samples.items()}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure service import time and first-request latency")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes to measure (default: 5)")
+    parser.add_argument('--backend', choices=('fake', 'postgres'), default='fake')
+    parser.add_argument('--plant', help="plant_id whose assets to use with --backend postgres")
+    parser.add_argument('--assets', type=int, default=50)
+    parser.add_argument('--per-sensor', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_child(args)))
+        return
+    print(json.dumps(measure_startup(args.runs, args.backend, args.assets, args.per_sensor,
+                                     args.seed, args.plant), indent=2))
+
+
+if __name__ == '__main__':
+    main()
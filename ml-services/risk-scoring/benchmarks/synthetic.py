@@ -0,0 +1,68 @@
+"""
+Deterministic synthetic assets and sensor readings for benchmarks
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Sensor types per asset type with (mean, std) of a healthy reading
+SENSOR_PROFILES: Dict[str, Dict[str, tuple]] = {
+    'transformer': {'temperature': (65.0, 8.0), 'voltage': (230.0, 4.0), 'current': (80.0, 12.0)},
+    'motor': {'temperature': (70.0, 10.0), 'vibration': (3.0, 1.5), 'current': (120.0, 20.0)},
+    'generator': {'temperature': (72.0, 7.0), 'voltage': (400.0, 2.5), 'current': (170.0, 25.0)},
+    'pump': {'temperature': (60.0, 8.0), 'vibration': (2.0, 1.0), 'pressure': (50.0, 4.0)}
+}
+
+READING_INTERVAL = timedelta(seconds=10)
+
+
+def generate_assets(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Asset rows shaped like `Database.get_asset_info` results, cycling through asset types"""
+    rng = np.random.default_rng(seed)
+    asset_types = list(SENSOR_PROFILES)
+    return [
+        {
+            'id': str(uuid.UUID(bytes=rng.bytes(16), version=4)),
+            'name': f'BENCH-{index:05d}',
+            'type': asset_types[index % len(asset_types)],
+            'plant_id': 'PLANT-BENCH',
+            'status': 'active'
+        }
+        for index in range(count)
+    ]
+
+
+def generate_readings(asset: Dict[str, Any], per_sensor: int, end: datetime,
+                      rng: np.random.Generator) -> List[Dict[str, Any]]:
+    """
+    `per_sensor` readings of every sensor of the asset, oldest first, ending at
+    `end`. Readings drift upwards slightly so trends and threshold breaches
+    show up in the features.
+    """
+    readings = []
+    profile = SENSOR_PROFILES[asset['type']]
+    drift = np.linspace(0.0, 1.0, per_sensor)
+    for sensor_type, (mean, std) in profile.items():
+        values = rng.normal(mean, std, per_sensor) + drift * std
+        for index, value in enumerate(values):
+            readings.append({
+                'timestamp': end - READING_INTERVAL * (per_sensor - 1 - index),
+                'asset_id': asset['id'],
+                'sensor_type': sensor_type,
+                'value': float(value),
+                'unit': None,
+                'quality': 'good'
+            })
+    readings.sort(key=lambda reading: reading['timestamp'])
+    return readings
+
+
+def generate_dataset(asset_count: int, per_sensor: int, seed: int = 42) -> Dict[str, Any]:
+    """Assets plus their readings (oldest first), ending at a fixed timestamp"""
+    rng = np.random.default_rng(seed)
+    assets = generate_assets(asset_count, seed)
+    end = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    readings = {asset['id']: generate_readings(asset, per_sensor, end, rng) for asset in assets}
+    return {'assets': assets, 'readings': readings}
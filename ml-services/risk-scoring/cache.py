@@ -0,0 +1,225 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import CACHE_LOOKUPS
+from model_registry import model_registry
+from models import RiskScore
+from rule_engine import rule_engine
+
+
+class CacheBackend(ABC):
+    """
+    Minimal key/value interface the risk cache needs. Values are strings and
+    every entry carries a TTL in seconds.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryBackend(CacheBackend):
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Backend for any Redis-compatible client exposing get/setex/delete
+    (redis.Redis, fakeredis.FakeRedis, ...). Eviction is left to the server.
+    """
+
+    def __init__(self, client: Any, prefix: str = 'opssight:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.setex(self.prefix + key, max(int(ttl), 1), value)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+class RiskScoreCache:
+    """
+    Cache of computed RiskScores keyed by (asset_id, asset_type, latest
+    reading timestamp). A new reading changes the key, so a hit means nothing
+    has arrived since the cached score was computed and storing another
+    risk_scores row can be skipped. `scope` names what else a score depends
+    on (the active model version and the rules generation); when it changes,
+    older entries stop matching and age out.
+
+    The last key stored per asset is remembered, up to `max_tracked` assets,
+    so a newer score deletes the one it replaces instead of leaving it to
+    expire.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 300.0, enabled: bool = True,
+                 scope: Optional[Callable[[], str]] = None, max_tracked: int = 10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.scope = scope
+        self.max_tracked = max_tracked
+        self.hits = 0
+        self.misses = 0
+        self._latest_keys: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, asset_id: str, asset_type: str, latest_reading: Optional[datetime]) -> str:
+        if latest_reading is None:
+            marker = 'none'
+        elif latest_reading.tzinfo is not None:
+            marker = latest_reading.astimezone(timezone.utc).isoformat()
+        else:
+            marker = latest_reading.isoformat()
+        scope = self.scope() if self.scope is not None else ''
+        return f"risk:{asset_id}:{asset_type}:{marker}:{scope}"
+
+    def get(self, asset_id: str, asset_type: str, latest_reading: Optional[datetime]) -> Optional[RiskScore]:
+        if not self.enabled:
+            return None
+        value = self.backend.get(self._key(asset_id, asset_type, latest_reading))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.labels('miss' if value is None else 'hit').inc()
+        if value is None:
+            return None
+        return RiskScore.model_validate_json(value)
+
+    def put(self, asset_type: str, latest_reading: Optional[datetime], risk_score: RiskScore):
+        if not self.enabled:
+            return
+        key = self._key(risk_score.asset_id, asset_type, latest_reading)
+        self.backend.set(key, risk_score.model_dump_json(), self.ttl)
+        with self._lock:
+            previous = self._latest_keys.get(risk_score.asset_id)
+            self._latest_keys[risk_score.asset_id] = key
+            self._latest_keys.move_to_end(risk_score.asset_id)
+            # Forgetting an asset only means its entry is left to expire
+            while len(self._latest_keys) > self.max_tracked:
+                self._latest_keys.popitem(last=False)
+        if previous is not None and previous != key:
+            self.backend.delete(previous)
+
+    def clear(self):
+        with self._lock:
+            self._latest_keys.clear()
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.backend.stats()
+        }
+
+
+def _scoring_scope() -> str:
+    """The model version and rules generation scores are computed with"""
+    model = model_registry.active
+    # Checks the rules file too, so a hot reload takes effect on cache hits as well
+    return f"m={model.version if model else '-'}:r={rule_engine.current_generation()}"
+
+
+MAX_ENTRIES = int(os.getenv('RISK_CACHE_MAX_ENTRIES', 10000))
+
+
+def _create_backend() -> CacheBackend:
+    backend = os.getenv('RISK_CACHE_BACKEND', 'memory').lower()
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RISK_CACHE_BACKEND=redis requires the 'redis' package")
+        return RedisBackend(redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+    return InMemoryBackend(max_entries=MAX_ENTRIES)
+
+
+risk_cache = RiskScoreCache(
+    backend=_create_backend(),
+    ttl=float(os.getenv('RISK_CACHE_TTL_SECONDS', 300)),
+    enabled=os.getenv('RISK_CACHE_ENABLED', 'true').lower() == 'true',
+    scope=_scoring_scope,
+    max_tracked=MAX_ENTRIES
+)
@@ -0,0 +1,142 @@
+"""
+Columnar encodings of batch scoring results, chosen with the Accept header:
+
+    application/json                          the BatchRiskCalculationResponse model (default)
+    application/vnd.opssight.columns+json     one array per field under "columns", serialized with
+                                              orjson when it is installed
+    application/vnd.apache.arrow.stream       Arrow IPC stream, one row per asset, with the summary
+                                              in the schema metadata (needs pyarrow)
+
+Both skip building and validating a pydantic model per asset, which
+dominates the cost of large batch responses.
+"""
+import importlib.util
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from models import RiskScore
+
+COLUMNS_JSON = 'application/vnd.opssight.columns+json'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+MEDIA_TYPES = (COLUMNS_JSON, ARROW_STREAM)
+# Accept entries answered with the default JSON
+DEFAULT_TYPES = ('application/json', 'application/*', '*/*')
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    The columnar media type an Accept header prefers, None for the default
+    JSON. Entries rank by q (1 when absent); at equal q a named type beats
+    a wildcard, then the one listed first wins. application/json and
+    wildcards select the default, and q=0 excludes a type.
+    """
+    chosen, chosen_rank = None, (0.0, False)
+    for entry in (accept or '').split(','):
+        media_type, *params = [part.strip() for part in entry.split(';')]
+        media_type = media_type.lower()
+        if media_type not in MEDIA_TYPES and media_type not in DEFAULT_TYPES:
+            continue
+        rank = (_quality(params), '*' not in media_type)
+        if rank[0] > 0 and rank > chosen_rank:
+            chosen, chosen_rank = (media_type if media_type in MEDIA_TYPES else None), rank
+    return chosen
+
+
+def _quality(params: Sequence[str]) -> float:
+    """The q parameter of an Accept entry; malformed values exclude it"""
+    for param in params:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                q = float(value.strip())
+            except ValueError:
+                return 0.0
+            return q if 0.0 <= q <= 1.0 else 0.0
+    return 1.0
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def result_columns(requested_ids: Sequence[str], scores: Mapping[str, RiskScore],
+                   errors: Mapping[str, str], compute_times: Mapping[str, float]) -> Dict[str, List[Any]]:
+    """One list per result field, one entry per requested asset (same rows as the JSON `results`)"""
+    columns: Dict[str, List[Any]] = {
+        name: [] for name in ('asset_id', 'success', 'risk_score', 'confidence', 'model_version', 'timestamp',
+                              'explanation', 'risk_factors', 'error', 'compute_ms')
+    }
+    for asset_id in requested_ids:
+        score = scores.get(asset_id)
+        columns['asset_id'].append(asset_id)
+        columns['success'].append(score is not None)
+        columns['risk_score'].append(score.risk_score if score else None)
+        columns['confidence'].append(score.confidence if score else None)
+        columns['model_version'].append(score.model_version if score else None)
+        columns['timestamp'].append(score.timestamp if score else None)
+        columns['explanation'].append(score.explanation if score else None)
+        columns['risk_factors'].append([
+            {'factor': rf.factor, 'contribution': rf.contribution, 'description': rf.description}
+            for rf in score.risk_factors
+        ] if score else None)
+        columns['error'].append(
+            None if score else errors.get(asset_id, f"Asset {asset_id} not found"))
+        compute_ms = compute_times.get(asset_id)
+        columns['compute_ms'].append(round(compute_ms, 3) if compute_ms is not None else None)
+    return columns
+
+
+def encode(media_type: str, summary: Dict[str, Any], columns: Dict[str, List[Any]]) -> bytes:
+    """Serialize the summary fields (success, counts, timings) and result columns as `media_type`"""
+    if media_type == ARROW_STREAM:
+        return _encode_arrow(summary, columns)
+    return _dumps({**summary, 'columns': columns})
+
+
+def _dumps(content: Any) -> bytes:
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(content, default=_json_default, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(content)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_arrow(summary: Dict[str, Any], columns: Dict[str, List[Any]]) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError(f"{ARROW_STREAM} responses require the 'pyarrow' package")
+
+    schema = pa.schema([
+        ('asset_id', pa.string()),
+        ('success', pa.bool_()),
+        ('risk_score', pa.float64()),
+        ('confidence', pa.float64()),
+        ('model_version', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('explanation', pa.string()),
+        ('risk_factors', pa.list_(pa.struct([
+            ('factor', pa.string()),
+            ('contribution', pa.float64()),
+            ('description', pa.string())
+        ]))),
+        ('error', pa.string()),
+        ('compute_ms', pa.float64())
+    ], metadata={'summary': _dumps(summary)})
+    # Naive score times are local (datetime.now()), so convert them before they are taken as UTC
+    columns = {**columns, 'timestamp': [
+        value.astimezone(timezone.utc) if value is not None else None for value in columns['timestamp']
+    ]}
+    table = pa.Table.from_pydict(columns, schema=schema)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
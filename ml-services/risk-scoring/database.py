@@ -1,11 +1,80 @@
+import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import asyncio
+import csv
+import io
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Sequence, TypeVar
+from metrics import instrument_query
+import plant_rollup
 
 load_dotenv()
 
+T = TypeVar('T')
+
+# Column-oriented query results: name -> NumPy array, all of equal length.
+# `time` is datetime64[us] (UTC), `value` float64, text columns are object arrays.
+SensorColumns = Dict[str, np.ndarray]
+
+# Distinct sensor types of one asset via a loose index scan over
+# (asset_id, sensor_type, time), instead of a DISTINCT over every reading
+_SENSOR_TYPES_SKIP_SCAN = """
+    WITH RECURSIVE types AS (
+        SELECT min(sensor_type) AS sensor_type
+        FROM sensor_readings
+        WHERE asset_id = %(asset_id)s
+        UNION ALL
+        SELECT (
+            SELECT min(r.sensor_type)
+            FROM sensor_readings r
+            WHERE r.asset_id = %(asset_id)s AND r.sensor_type > t.sensor_type
+        )
+        FROM types t
+        WHERE t.sensor_type IS NOT NULL
+    )
+    SELECT sensor_type FROM types WHERE sensor_type IS NOT NULL
+"""
+
+_SENSOR_TYPES_GIVEN = """
+    SELECT unnest(%(sensor_types)s::text[]) AS sensor_type
+"""
+
+
+# Continuous aggregates of sensor_readings (docker/migrations/003_sensor_readings_rollups.sql)
+ROLLUPS = {
+    '1m': ('sensor_readings_1m', timedelta(minutes=1)),
+    '1h': ('sensor_readings_1h', timedelta(hours=1))
+}
+
+ROLLUP_COLUMNS = ['asset_id', 'sensor_type', 'count', 'sum', 'sum_sq', 'min', 'max', 'first', 'last',
+                  'time_sum', 'time_sum_sq', 'time_value_sum', 'first_time', 'last_time']
+
+
+def to_columns(rows: List[tuple], names: List[str], floats: Sequence[str] = ('value',)) -> SensorColumns:
+    """Transpose result rows into NumPy columns (`floats` names the float64 ones)"""
+    columns: SensorColumns = {}
+    for index, name in enumerate(names):
+        values = [row[index] for row in rows]
+        if name == 'time':
+            columns[name] = np.asarray(values, dtype=np.int64).view('datetime64[us]')
+        elif name in floats:
+            columns[name] = np.asarray(values, dtype=np.float64)
+        else:
+            columns[name] = np.asarray(values, dtype=object)
+    return columns
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
 
 class Database:
     def __init__(self):
@@ -14,32 +83,389 @@ class Database:
             'port': int(os.getenv('DATABASE_PORT', 5433)),
             'database': os.getenv('DATABASE_NAME', 'opssight'),
             'user': os.getenv('DATABASE_USER', 'postgres'),
-            'password': os.getenv('DATABASE_PASSWORD', 'postgres')
+            'password': os.getenv('DATABASE_PASSWORD', 'postgres'),
+            'connect_timeout': int(os.getenv('DATABASE_CONNECT_TIMEOUT', 5)),
+            'options': f"-c statement_timeout={int(os.getenv('DATABASE_STATEMENT_TIMEOUT_MS', 30000))}"
+        }
+        self.pool_min = int(os.getenv('DATABASE_POOL_MIN', 1))
+        self.pool_max = int(os.getenv('DATABASE_POOL_MAX', 10))
+        self.pool_timeout = float(os.getenv('DATABASE_POOL_TIMEOUT', 10))
+        
+        # Plant rollups (see plant_rollup.py) are kept current by every score write
+        self.plant_rollups_enabled = os.getenv('PLANT_ROLLUPS_ENABLED', 'true').lower() == 'true'
+        self.plant_rollup_top_n = int(os.getenv('PLANT_ROLLUP_TOP_N', 10))
+        self.plant_rollup_max_age = timedelta(seconds=float(os.getenv('PLANT_ROLLUP_MAX_AGE_S', 3600)))
+        self.plant_rollup_history_days = int(os.getenv('PLANT_ROLLUP_HISTORY_DAYS', 35))
+        
+        # The pool is opened lazily so importing this module never touches the network
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_max)
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._timeouts = 0
+        
+        # Blocking queries from async handlers run here, one worker per pooled connection
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_max, thread_name_prefix='db')
+    
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(self.pool_min, self.pool_max, **self.connection_params)
+        return self._pool
+    
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a pooled connection.
+        
+        Waits up to DATABASE_POOL_TIMEOUT seconds for a free slot. Any open
+        transaction is rolled back when the connection goes back to the pool,
+        and connections that failed at the protocol level are discarded.
+        """
+        with self._stats_lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.pool_timeout)
+        with self._stats_lock:
+            self._waiting -= 1
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolTimeoutError(
+                f"No database connection available after {self.pool_timeout}s "
+                f"(pool size {self.pool_max})"
+            )
+        
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        
+        with self._stats_lock:
+            self._in_use += 1
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            try:
+                if not conn.closed and not discard:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            pool.putconn(conn, close=discard or bool(conn.closed))
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
+    
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run a blocking database call on the bounded DB thread pool so it
+        does not stall the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+    
+    @instrument_query('ping', count_rows=False)
+    def ping(self):
+        """Run a trivial query through the pool"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Current pool utilisation"""
+        with self._stats_lock:
+            in_use = self._in_use
+            waiting = self._waiting
+            timeouts = self._timeouts
+        return {
+            'min_size': self.pool_min,
+            'max_size': self.pool_max,
+            'opened': self._pool is not None,
+            'in_use': in_use,
+            'available': self.pool_max - in_use,
+            'waiting': waiting,
+            'timeouts': timeouts,
+            'saturation': round(in_use / self.pool_max, 3)
         }
     
-    def get_connection(self):
-        return psycopg2.connect(**self.connection_params)
+    def close(self):
+        """Close every pooled connection and stop the DB thread pool"""
+        self._executor.shutdown(wait=True)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
     
+    @instrument_query('get_sensor_data')
     def get_sensor_data(self, asset_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Fetch recent sensor data for an asset"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute("""
-                    SELECT timestamp, sensor_type, value, unit
+                    SELECT time AS timestamp, sensor_type, value, unit
                     FROM sensor_readings
                     WHERE asset_id = %s
-                    ORDER BY timestamp DESC
+                    ORDER BY time DESC
                     LIMIT %s
                 """, (asset_id, limit))
                 return cursor.fetchall()
-        finally:
-            conn.close()
     
+    @instrument_query('get_sensor_window')
+    def get_sensor_window(self, asset_id: str, per_sensor: int = 100,
+                          since: Optional[datetime] = None,
+                          sensor_types: Optional[List[str]] = None) -> SensorColumns:
+        """
+        Fetch the last `per_sensor` readings of every sensor type of an asset.
+        
+        Each sensor type is read through its own LATERAL index probe on
+        (asset_id, sensor_type, time DESC), so a chatty sensor cannot crowd the
+        others out and cost stays bounded by the window, not the table size.
+        `since` optionally bounds the lookback so old chunks are excluded.
+        Returns `time`, `sensor_type` and `value` columns, newest first.
+        """
+        types_query = _SENSOR_TYPES_GIVEN if sensor_types else _SENSOR_TYPES_SKIP_SCAN
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    WITH sensor_types AS ({types_query})
+                    SELECT (extract(epoch FROM w.time) * 1000000)::bigint AS time,
+                           s.sensor_type, w.value::float8 AS value
+                    FROM sensor_types s
+                    CROSS JOIN LATERAL (
+                        SELECT time, value
+                        FROM sensor_readings r
+                        WHERE r.asset_id = %(asset_id)s
+                          AND r.sensor_type = s.sensor_type
+                          AND (%(since)s::timestamptz IS NULL OR r.time > %(since)s::timestamptz)
+                        ORDER BY r.time DESC
+                        LIMIT %(per_sensor)s
+                    ) w
+                    ORDER BY w.time DESC
+                """, {
+                    'asset_id': asset_id,
+                    'per_sensor': per_sensor,
+                    'since': since,
+                    'sensor_types': list(sensor_types or [])
+                })
+                return to_columns(cursor.fetchall(), ['time', 'sensor_type', 'value'])
+    
+    @instrument_query('get_sensor_range')
+    def get_sensor_range(self, asset_id: str, start: datetime, end: Optional[datetime] = None,
+                         sensor_types: Optional[List[str]] = None) -> SensorColumns:
+        """
+        Fetch every reading of an asset in [start, end), newest first, as
+        `time`, `sensor_type` and `value` columns.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT (extract(epoch FROM time) * 1000000)::bigint AS time,
+                           sensor_type, value::float8 AS value
+                    FROM sensor_readings
+                    WHERE asset_id = %(asset_id)s
+                      AND time >= %(start)s
+                      AND (%(end)s::timestamptz IS NULL OR time < %(end)s::timestamptz)
+                      AND (%(no_type_filter)s OR sensor_type = ANY(%(sensor_types)s::text[]))
+                    ORDER BY time DESC
+                """, {
+                    'asset_id': asset_id,
+                    'start': start,
+                    'end': end,
+                    'no_type_filter': not sensor_types,
+                    'sensor_types': list(sensor_types or [])
+                })
+                return to_columns(cursor.fetchall(), ['time', 'sensor_type', 'value'])
+    
+    @instrument_query('get_sensor_window_batch')
+    def get_sensor_window_batch(self, asset_ids: List[str], per_sensor: int = 100,
+                                since: Optional[datetime] = None,
+                                until: Optional[datetime] = None) -> SensorColumns:
+        """
+        Fetch the last `per_sensor` readings of every (asset, sensor type) pair
+        for many assets in one query.
+        
+        Pairs are found with a loose index scan over (asset_id, sensor_type),
+        then each pair's window is read with a LATERAL index probe. Returns
+        `asset_id`, `time`, `sensor_type` and `value` columns, grouped by asset
+        and newest first within each asset. `until` (exclusive) reads the
+        window as it was at that point in time.
+        """
+        if not asset_ids:
+            return to_columns([], ['asset_id', 'time', 'sensor_type', 'value'])
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    WITH RECURSIVE pairs AS (
+                        (
+                            SELECT asset_id, sensor_type
+                            FROM sensor_readings
+                            WHERE asset_id = ANY(%(asset_ids)s::uuid[])
+                            ORDER BY asset_id, sensor_type
+                            LIMIT 1
+                        )
+                        UNION ALL
+                        SELECT next_pair.asset_id, next_pair.sensor_type
+                        FROM pairs p
+                        CROSS JOIN LATERAL (
+                            SELECT r.asset_id, r.sensor_type
+                            FROM sensor_readings r
+                            WHERE r.asset_id = ANY(%(asset_ids)s::uuid[])
+                              AND (r.asset_id, r.sensor_type) > (p.asset_id, p.sensor_type)
+                            ORDER BY r.asset_id, r.sensor_type
+                            LIMIT 1
+                        ) next_pair
+                    )
+                    SELECT p.asset_id::text AS asset_id,
+                           (extract(epoch FROM w.time) * 1000000)::bigint AS time,
+                           p.sensor_type, w.value::float8 AS value
+                    FROM pairs p
+                    CROSS JOIN LATERAL (
+                        SELECT time, value
+                        FROM sensor_readings r
+                        WHERE r.asset_id = p.asset_id
+                          AND r.sensor_type = p.sensor_type
+                          AND (%(since)s::timestamptz IS NULL OR r.time > %(since)s::timestamptz)
+                          AND (%(until)s::timestamptz IS NULL OR r.time < %(until)s::timestamptz)
+                        ORDER BY r.time DESC
+                        LIMIT %(per_sensor)s
+                    ) w
+                    ORDER BY p.asset_id, w.time DESC
+                """, {
+                    'asset_ids': list(asset_ids),
+                    'per_sensor': per_sensor,
+                    'since': since,
+                    'until': until
+                })
+                return to_columns(cursor.fetchall(), ['asset_id', 'time', 'sensor_type', 'value'])
+    
+    def iter_sensor_readings(self, asset_ids: List[str], start: datetime, end: datetime,
+                             chunk_size: int = 50000) -> Iterator[SensorColumns]:
+        """
+        Stream every reading of the given assets in [start, end) through a
+        server-side cursor, ordered by asset, sensor type and time (oldest
+        first). Yields `asset_id`, `sensor_type`, `time` and `value` columns of
+        at most `chunk_size` rows, so memory stays bounded by the chunk.
+        """
+        if not asset_ids:
+            return
+        with self.connection() as conn:
+            with conn.cursor(name='iter_sensor_readings') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute("""
+                    SELECT asset_id::text AS asset_id, sensor_type,
+                           (extract(epoch FROM time) * 1000000)::bigint AS time, value::float8 AS value
+                    FROM sensor_readings
+                    WHERE asset_id = ANY(%(asset_ids)s::uuid[])
+                      AND time >= %(start)s AND time < %(end)s
+                    ORDER BY asset_id, sensor_type, time
+                """, {'asset_ids': list(asset_ids), 'start': start, 'end': end})
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield to_columns(rows, ['asset_id', 'sensor_type', 'time', 'value'])
+    
+    @instrument_query('get_sensor_rollups')
+    def get_sensor_rollups(self, asset_ids: List[str], since: datetime, until: Optional[datetime] = None,
+                           resolution: str = '1h') -> SensorColumns:
+        """
+        Combine the `resolution` rollup buckets from the one containing `since`
+        up to `until` (default: now) into one row of additive statistics per
+        (asset, sensor type).
+        
+        Returns `asset_id` and `sensor_type` plus float64 `count`, `sum`,
+        `sum_sq`, `min`, `max`, `first`, `last`, and time sums in seconds
+        since `since` (`time_sum`, `time_sum_sq`, `time_value_sum`,
+        `first_time`, `last_time`); see `extract_rollup_features`. The query
+        reads one row per bucket, so its cost depends on the window length
+        over the bucket width rather than on the number of readings.
+        """
+        if not asset_ids:
+            return to_columns([], ROLLUP_COLUMNS, floats=ROLLUP_COLUMNS[2:])
+        view, width = ROLLUPS[resolution]
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                # Bucket sums are relative to the bucket start; shift them by the
+                # bucket's offset o from `since`: sum(t + o) and sum((t + o)^2)
+                cursor.execute(f"""
+                    SELECT asset_id::text, sensor_type,
+                           sum(readings)::float8,
+                           sum(value_sum), sum(value_sum_sq),
+                           min(value_min), max(value_max),
+                           first(value_first, bucket), last(value_last, bucket),
+                           sum(time_sum + readings * o),
+                           sum(time_sum_sq + 2 * o * time_sum + readings * o * o),
+                           sum(time_value_sum + o * value_sum),
+                           extract(epoch FROM min(first_time) - %(since)s::timestamptz)::float8,
+                           extract(epoch FROM max(last_time) - %(since)s::timestamptz)::float8
+                    FROM (
+                        SELECT *, extract(epoch FROM bucket - %(since)s::timestamptz)::float8 AS o
+                        FROM {view}
+                        WHERE asset_id = ANY(%(asset_ids)s::uuid[])
+                          AND bucket >= time_bucket(%(width)s, %(since)s::timestamptz)
+                          AND (%(until)s::timestamptz IS NULL OR bucket < %(until)s::timestamptz)
+                    ) buckets
+                    GROUP BY asset_id, sensor_type
+                    ORDER BY asset_id, sensor_type
+                """, {'asset_ids': list(asset_ids), 'since': since, 'until': until, 'width': width})
+                return to_columns(cursor.fetchall(), ROLLUP_COLUMNS, floats=ROLLUP_COLUMNS[2:])
+    
+    @instrument_query('refresh_sensor_rollups', count_rows=False)
+    def refresh_sensor_rollups(self, resolution: str, start: Optional[datetime] = None,
+                               end: Optional[datetime] = None):
+        """
+        Materialize a rollup over [start, end) now, e.g. after a backfill older
+        than the refresh policy's window (None means unbounded)
+        """
+        view, _ = ROLLUPS[resolution]
+        with self.connection() as conn:
+            # refresh_continuous_aggregate cannot run inside a transaction block
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("CALL refresh_continuous_aggregate(%s, %s, %s)", (view, start, end))
+            finally:
+                conn.autocommit = False
+    
+    @instrument_query('get_sensor_data_since')
+    def get_sensor_data_since(self, asset_id: str, since: datetime, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch sensor readings newer than `since` for an asset, oldest first"""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT time AS timestamp, sensor_type, value, unit
+                    FROM sensor_readings
+                    WHERE asset_id = %s AND time > %s
+                    ORDER BY time ASC
+                    LIMIT %s
+                """, (asset_id, since, limit))
+                return cursor.fetchall()
+    
+    @instrument_query('get_latest_reading_time')
+    def get_latest_reading_time(self, asset_id: str) -> Optional[datetime]:
+        """Timestamp of the newest sensor reading for an asset"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT max(time) FROM sensor_readings WHERE asset_id = %s
+                """, (asset_id,))
+                return cursor.fetchone()[0]
+    
+    @instrument_query('get_asset_info')
     def get_asset_info(self, asset_id: str) -> Dict[str, Any]:
         """Fetch asset information"""
-        conn = self.get_connection()
-        try:
+        with self.connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute("""
                     SELECT id, name, type, location, metadata, status, current_risk_score
@@ -47,32 +473,504 @@ class Database:
                     WHERE id = %s
                 """, (asset_id,))
                 return cursor.fetchone()
-        finally:
-            conn.close()
     
+    @instrument_query('get_assets_info')
+    def get_assets_info(self, asset_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch asset information for several assets in one query"""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id::text AS id, name, type, plant_id, location, metadata, status, current_risk_score
+                    FROM assets
+                    WHERE id = ANY(%s::uuid[])
+                """, (list(asset_ids),))
+                return cursor.fetchall()
+    
+    @instrument_query('get_plant_assets')
+    def get_plant_assets(self, plant_id: str) -> List[Dict[str, Any]]:
+        """Fetch all active assets in a plant"""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id::text AS id, name, type, plant_id, location, metadata, status, current_risk_score
+                    FROM assets
+                    WHERE plant_id = %s AND status = 'active'
+                    ORDER BY id
+                """, (plant_id,))
+                return cursor.fetchall()
+    
+    @instrument_query('get_active_assets')
+    def get_active_assets(self) -> List[Dict[str, Any]]:
+        """Fetch every active asset across all plants"""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id::text AS id, name, type, plant_id, location, metadata, status, current_risk_score
+                    FROM assets
+                    WHERE status = 'active'
+                    ORDER BY id
+                """)
+                return cursor.fetchall()
+    
+    @instrument_query('get_sensor_data_batch')
+    def get_sensor_data_batch(self, asset_ids: List[str], limit: int = 100) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch the most recent sensor readings for several assets in one query.
+        
+        Each asset gets its own LIMIT through a LATERAL subquery, so a busy asset
+        cannot crowd the others out. Returns readings grouped by asset id, newest first.
+        """
+        grouped: Dict[str, List[Dict[str, Any]]] = {asset_id: [] for asset_id in asset_ids}
+        if not asset_ids:
+            return grouped
+        
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT a.id::text AS asset_id, r.timestamp, r.sensor_type, r.value, r.unit
+                    FROM unnest(%s::uuid[]) AS a(id)
+                    CROSS JOIN LATERAL (
+                        SELECT time AS timestamp, sensor_type, value, unit
+                        FROM sensor_readings
+                        WHERE asset_id = a.id
+                        ORDER BY time DESC
+                        LIMIT %s
+                    ) r
+                    ORDER BY a.id, r.timestamp DESC
+                """, (list(asset_ids), limit))
+                for row in cursor.fetchall():
+                    grouped.setdefault(row.pop('asset_id'), []).append(row)
+            return grouped
+    
+    @instrument_query('copy_sensor_readings', count_rows=False)
+    def copy_sensor_readings(self, readings: List[Dict[str, Any]]) -> int:
+        """
+        Bulk-load sensor readings with COPY.
+        
+        Rows are copied into a session-local staging table and then moved into
+        sensor_readings with ON CONFLICT DO NOTHING, so re-sent readings do not
+        fail the whole batch. Returns the number of rows actually inserted.
+        """
+        if not readings:
+            return 0
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for reading in readings:
+            writer.writerow((
+                reading['timestamp'].isoformat(),
+                reading['asset_id'],
+                reading['sensor_type'],
+                reading['value'],
+                reading.get('unit') or '',
+                reading.get('quality') or 'good'
+            ))
+        buffer.seek(0)
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS sensor_readings_staging
+                    (LIKE sensor_readings INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+                """)
+                cursor.copy_expert("""
+                    COPY sensor_readings_staging (time, asset_id, sensor_type, value, unit, quality)
+                    FROM STDIN WITH (FORMAT csv)
+                """, buffer)
+                cursor.execute("""
+                    INSERT INTO sensor_readings (time, asset_id, sensor_type, value, unit, quality)
+                    SELECT time, asset_id, sensor_type, value, unit, quality
+                    FROM sensor_readings_staging
+                    ON CONFLICT DO NOTHING
+                """)
+                inserted = cursor.rowcount
+                
+                conn.commit()
+                return inserted
+    
+    @instrument_query('store_risk_score', count_rows=False)
     def store_risk_score(self, asset_id: str, risk_score: float, explanation: str, 
-                        risk_factors: List[Dict[str, Any]], confidence: float):
+                        risk_factors: List[Dict[str, Any]], confidence: float, model_version: str = '1.0.0'):
         """Store calculated risk score"""
-        import json
-        conn = self.get_connection()
-        try:
+        # One code path for current scores keeps the plant rollups in step
+        self.store_risk_scores_batch([{
+            'asset_id': asset_id,
+            'risk_score': risk_score,
+            'explanation': explanation,
+            'risk_factors': risk_factors,
+            'confidence': confidence
+        }], model_version)
+    
+    @instrument_query('store_risk_scores_batch', count_rows=False)
+    def store_risk_scores_batch(self, scores: List[Dict[str, Any]], model_version: str = '1.0.0'):
+        """
+        Store many calculated risk scores at once.
+        
+        The risk_scores inserts and the assets.current_risk_score updates are issued
+        as a single statement (a data-modifying CTE over one VALUES list).
+        Each entry needs asset_id, risk_score, explanation, risk_factors and confidence,
+        and optionally the `time` it was computed (defaults to now) and the
+        `model_version` that produced it (defaults to `model_version`). When an asset
+        appears more than once, every score is inserted and the last one becomes
+        its current score; of scores for the same asset and time (including one
+        already stored, as when a failed flush is retried) only the last is kept.
+        The plant rollups of the assets are updated in the same transaction.
+        """
+        if not scores:
+            return
+        
+        rows = [
+            (
+                position,
+                s.get('time'),
+                s['asset_id'],
+                s['risk_score'],
+                s['explanation'],
+                json.dumps(s['risk_factors']),
+                s['confidence'],
+                s.get('model_version', model_version)
+            )
+            for position, s in enumerate(scores)
+        ]
+        
+        with self.connection() as conn:
             with conn.cursor() as cursor:
-                # Insert risk score
+                moves = execute_values(cursor, """
+                    WITH v (position, time, asset_id, score, explanation, factors, confidence, model_version) AS (
+                        VALUES %s
+                    ),
+                    inserted AS (
+                        -- One row per (time, asset_id), the key of risk_scores; the last score wins
+                        INSERT INTO risk_scores (time, asset_id, score, explanation, factors, confidence, model_version)
+                        SELECT DISTINCT ON (v.asset_id, COALESCE(v.time::timestamptz, NOW()))
+                               COALESCE(v.time::timestamptz, NOW()), v.asset_id::uuid, v.score::numeric,
+                               v.explanation, v.factors::jsonb, v.confidence::numeric, v.model_version
+                        FROM v
+                        ORDER BY v.asset_id, COALESCE(v.time::timestamptz, NOW()), v.position DESC
+                        ON CONFLICT (time, asset_id) DO UPDATE
+                        SET score = EXCLUDED.score,
+                            explanation = EXCLUDED.explanation,
+                            factors = EXCLUDED.factors,
+                            confidence = EXCLUDED.confidence,
+                            model_version = EXCLUDED.model_version
+                    ),
+                    latest AS (
+                        SELECT DISTINCT ON (asset_id) asset_id, score
+                        FROM v
+                        ORDER BY asset_id, position DESC
+                    ),
+                    previous AS (
+                        -- Locked in id order, so the previous scores are the ones being replaced
+                        SELECT assets.id, assets.current_risk_score::float8 AS score
+                        FROM assets
+                        JOIN latest ON assets.id = latest.asset_id::uuid
+                        ORDER BY assets.id
+                        FOR UPDATE OF assets
+                    )
+                    UPDATE assets
+                    SET current_risk_score = latest.score::numeric, updated_at = NOW()
+                    FROM latest
+                    JOIN previous ON previous.id = latest.asset_id::uuid
+                    WHERE assets.id = previous.id
+                    RETURNING assets.plant_id, assets.status, previous.score, assets.current_risk_score::float8
+                """, rows, page_size=len(rows), fetch=True)
+                if self.plant_rollups_enabled:
+                    self._apply_plant_rollup_moves(cursor, moves)
+                
+                conn.commit()
+    
+    def _apply_plant_rollup_moves(self, cursor, moves: List[tuple]):
+        """Apply the rollup changes of (plant_id, status, previous, new score) rows to existing rollups"""
+        deltas = plant_rollup.rollup_deltas(moves)
+        if not deltas:
+            return
+        plant_ids = [delta[0] for delta in deltas]
+        # Rows of plants without a rollup yet are built from scratch on first read
+        cursor.execute("""
+            SELECT plant_id FROM plant_risk_rollups
+            WHERE plant_id = ANY(%s)
+            ORDER BY plant_id
+            FOR UPDATE
+        """, (plant_ids,))
+        plant_ids = [row[0] for row in cursor.fetchall()]
+        if not plant_ids:
+            return
+        execute_values(cursor, """
+            UPDATE plant_risk_rollups r
+            SET score_sum = r.score_sum + d.score_delta,
+                histogram = ARRAY(
+                    SELECT n + dn FROM unnest(r.histogram, d.histogram) WITH ORDINALITY AS t(n, dn, i) ORDER BY i
+                ),
+                band_counts = ARRAY(
+                    SELECT n + dn FROM unnest(r.band_counts, d.band_counts) WITH ORDINALITY AS t(n, dn, i) ORDER BY i
+                ),
+                updated_at = NOW()
+            FROM (VALUES %s) AS d (plant_id, score_delta, histogram, band_counts)
+            WHERE r.plant_id = d.plant_id
+        """, deltas, template="(%s, %s::numeric, %s::int[], %s::int[])", page_size=len(deltas))
+        self._finish_plant_rollups(cursor, plant_ids)
+    
+    def _finish_plant_rollups(self, cursor, plant_ids: List[str]):
+        """Re-read the top assets of the plants' rollups and snapshot them for the current hour"""
+        cursor.execute("""
+            UPDATE plant_risk_rollups r
+            SET top_assets = COALESCE((
+                SELECT jsonb_agg(jsonb_build_object(
+                    'assetId', a.id::text,
+                    'assetName', a.name,
+                    'assetType', a.type,
+                    'riskScore', COALESCE(a.current_risk_score, 0)::float8,
+                    'status', a.status,
+                    'location', COALESCE(a.location->>'building', 'Unknown')
+                ) ORDER BY a.current_risk_score DESC NULLS LAST, a.id)
+                FROM (
+                    SELECT id, name, type, status, location, current_risk_score
+                    FROM assets
+                    WHERE plant_id = r.plant_id AND status = 'active'
+                    ORDER BY current_risk_score DESC NULLS LAST, id
+                    LIMIT %s
+                ) a
+            ), '[]'::jsonb)
+            WHERE r.plant_id = ANY(%s)
+        """, (self.plant_rollup_top_n, plant_ids))
+        cursor.execute("""
+            INSERT INTO plant_risk_rollup_history (plant_id, period_start, total_assets, score_sum, band_counts)
+            SELECT plant_id, date_trunc('hour', NOW()), total_assets, score_sum, band_counts
+            FROM plant_risk_rollups
+            WHERE plant_id = ANY(%s)
+            ON CONFLICT (plant_id, period_start) DO UPDATE
+            SET total_assets = EXCLUDED.total_assets,
+                score_sum = EXCLUDED.score_sum,
+                band_counts = EXCLUDED.band_counts
+        """, (plant_ids,))
+    
+    @instrument_query('refresh_plant_rollup', count_rows=False)
+    def refresh_plant_rollup(self, plant_id: str) -> bool:
+        """
+        Rebuild a plant's rollup from its active assets and prune its old
+        snapshots. Returns False (and drops the rollup) when the plant has none.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                # Shared locks, taken in the writers' id order, hold back score writes to these assets until the rebuild commits
                 cursor.execute("""
-                    INSERT INTO risk_scores (time, asset_id, score, explanation, factors, confidence, model_version)
-                    VALUES (NOW(), %s, %s, %s, %s, %s, %s)
-                """, (asset_id, risk_score, explanation, json.dumps(risk_factors), confidence, '1.0.0'))
+                    SELECT current_risk_score::float8
+                    FROM assets
+                    WHERE plant_id = %s AND status = 'active'
+                    ORDER BY id
+                    FOR SHARE
+                """, (plant_id,))
+                scores = [row[0] for row in cursor.fetchall()]
+                if not scores:
+                    cursor.execute("DELETE FROM plant_risk_rollups WHERE plant_id = %s", (plant_id,))
+                    conn.commit()
+                    return False
                 
-                # Update current risk score on asset
+                summary = plant_rollup.summarize(scores)
                 cursor.execute("""
-                    UPDATE assets
-                    SET current_risk_score = %s, updated_at = NOW()
-                    WHERE id = %s
-                """, (risk_score, asset_id))
+                    INSERT INTO plant_risk_rollups
+                        (plant_id, total_assets, score_sum, histogram, band_counts, top_assets, refreshed_at, updated_at)
+                    VALUES (%s, %s, %s::numeric, %s::int[], %s::int[], '[]'::jsonb, NOW(), NOW())
+                    ON CONFLICT (plant_id) DO UPDATE
+                    SET total_assets = EXCLUDED.total_assets,
+                        score_sum = EXCLUDED.score_sum,
+                        histogram = EXCLUDED.histogram,
+                        band_counts = EXCLUDED.band_counts,
+                        refreshed_at = EXCLUDED.refreshed_at,
+                        updated_at = EXCLUDED.updated_at
+                """, (plant_id, summary['total_assets'], summary['score_sum'], summary['histogram'],
+                      summary['band_counts']))
+                self._finish_plant_rollups(cursor, [plant_id])
+                cursor.execute("""
+                    DELETE FROM plant_risk_rollup_history
+                    WHERE plant_id = %s AND period_start < NOW() - %s * INTERVAL '1 day'
+                """, (plant_id, self.plant_rollup_history_days))
                 
                 conn.commit()
-        finally:
-            conn.close()
+                return True
+    
+    @instrument_query('get_plant_rollup', count_rows=False)
+    def get_plant_rollup(self, plant_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        A plant's rollup row with its `history` snapshot per delta period
+        (None where there is none). Rebuilt first when asked, missing, older
+        than PLANT_ROLLUP_MAX_AGE_S or not maintained by writes. None when the
+        plant has no active assets.
+        """
+        rollup = None
+        if self.plant_rollups_enabled and not refresh:
+            rollup = self._read_plant_rollup(plant_id)
+            if rollup is not None and rollup['age'] > self.plant_rollup_max_age:
+                rollup = None
+        if rollup is None:
+            if not self.refresh_plant_rollup(plant_id):
+                return None
+            rollup = self._read_plant_rollup(plant_id)
+        if rollup is not None:
+            rollup.pop('age')
+        return rollup
+    
+    def _read_plant_rollup(self, plant_id: str) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT plant_id, total_assets, score_sum::float8 AS score_sum, histogram, band_counts,
+                           top_assets, refreshed_at, updated_at, NOW() - refreshed_at AS age, NOW() AS now
+                    FROM plant_risk_rollups
+                    WHERE plant_id = %s
+                """, (plant_id,))
+                rollup = cursor.fetchone()
+                if rollup is None:
+                    return None
+                
+                rollup = dict(rollup)
+                points = plant_rollup.history_points(rollup.pop('now'))
+                cursor.execute("""
+                    SELECT p.label, h.period_start, h.total_assets, h.score_sum::float8 AS score_sum, h.band_counts
+                    FROM unnest(%s::text[], %s::timestamptz[]) AS p (label, at)
+                    CROSS JOIN LATERAL (
+                        SELECT period_start, total_assets, score_sum, band_counts
+                        FROM plant_risk_rollup_history
+                        WHERE plant_id = %s AND period_start <= p.at
+                        ORDER BY period_start DESC
+                        LIMIT 1
+                    ) h
+                """, (list(points), list(points.values()), plant_id))
+                snapshots = {row.pop('label'): dict(row) for row in cursor.fetchall()}
+                rollup['history'] = {label: snapshots.get(label) for label in points}
+                return rollup
+    
+    @instrument_query('store_historical_risk_scores', count_rows=False)
+    def store_historical_risk_scores(self, scores: List[Dict[str, Any]], model_version: str = '1.0.0') -> int:
+        """
+        Insert backfilled risk scores at their historical `time`, skipping any
+        (time, asset_id) already present so replays can be re-run safely.
+        Leaves assets.current_risk_score alone. Returns the number of rows inserted.
+        """
+        if not scores:
+            return 0
+        
+        rows = [
+            (
+                s['time'],
+                s['asset_id'],
+                s['risk_score'],
+                s['explanation'],
+                json.dumps(s['risk_factors']),
+                s['confidence'],
+                s.get('model_version', model_version)
+            )
+            for s in scores
+        ]
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO risk_scores (time, asset_id, score, explanation, factors, confidence, model_version)
+                    VALUES %s
+                    ON CONFLICT (time, asset_id) DO NOTHING
+                """, rows, template="(%s::timestamptz, %s::uuid, %s, %s, %s::jsonb, %s, %s)", page_size=len(rows))
+                inserted = cursor.rowcount
+                conn.commit()
+                return inserted
+    
+    @instrument_query('get_risk_score_history')
+    def get_risk_score_history(self, asset_ids: List[str], since: datetime) -> SensorColumns:
+        """
+        Daily mean risk score of many assets since `since`, in one query.
+        Returns `asset_id`, `time` (the day) and `score` columns, ordered by
+        asset and day; days without scores are absent.
+        """
+        if not asset_ids:
+            return to_columns([], ['asset_id', 'time', 'score'], floats=('score',))
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT asset_id::text AS asset_id,
+                           (extract(epoch FROM time_bucket(INTERVAL '1 day', time)) * 1000000)::bigint AS time,
+                           avg(score)::float8 AS score
+                    FROM risk_scores
+                    WHERE asset_id = ANY(%s::uuid[]) AND time >= %s
+                    GROUP BY 1, 2
+                    ORDER BY 1, 2
+                """, (asset_ids, since))
+                return to_columns(cursor.fetchall(), ['asset_id', 'time', 'score'], floats=('score',))
+    
+    @instrument_query('store_forecasts', count_rows=False)
+    def store_forecasts(self, forecasts: List[Dict[str, Any]]):
+        """
+        Insert many forecasts in one statement. Each entry needs asset_id,
+        generated_at, valid_until, predictions (JSON-serializable),
+        model_version and accuracy.
+        """
+        if not forecasts:
+            return
+        
+        rows = [
+            (
+                f['asset_id'],
+                f['generated_at'],
+                f['valid_until'],
+                json.dumps(f['predictions']),
+                f['model_version'],
+                f['accuracy']
+            )
+            for f in forecasts
+        ]
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO forecasts (asset_id, generated_at, valid_until, predictions, model_version, accuracy)
+                    VALUES %s
+                """, rows, template="(%s::uuid, %s, %s, %s::jsonb, %s, %s)", page_size=len(rows))
+                conn.commit()
+    
+    @instrument_query('store_anomalies', count_rows=False)
+    def store_anomalies(self, anomalies: List[Dict[str, Any]]) -> int:
+        """
+        Insert detected anomalies in one statement (see `anomaly_engine`),
+        skipping any already recorded for the same asset, reading time and
+        metric. Returns the number of rows inserted.
+        """
+        if not anomalies:
+            return 0
+        
+        rows = [
+            (
+                a['asset_id'],
+                a['timestamp'],
+                a['severity'],
+                a['metric'],
+                a['expected_value'],
+                a['actual_value'],
+                a['deviation'],
+                a['description']
+            )
+            for a in anomalies
+        ]
+        
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO anomalies (asset_id, timestamp, severity, metric, expected_value,
+                                           actual_value, deviation, description)
+                    SELECT v.asset_id::uuid, v.timestamp::timestamptz, v.severity, v.metric,
+                           v.expected_value::numeric, v.actual_value::numeric, v.deviation::numeric,
+                           v.description
+                    FROM (VALUES %s) AS v (asset_id, timestamp, severity, metric, expected_value,
+                                           actual_value, deviation, description)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM anomalies a
+                        WHERE a.asset_id = v.asset_id::uuid
+                          AND a.timestamp = v.timestamp::timestamptz
+                          AND a.metric = v.metric
+                    )
+                """, rows, page_size=len(rows))
+                inserted = cursor.rowcount
+                conn.commit()
+                return inserted
 
 
 db = Database()
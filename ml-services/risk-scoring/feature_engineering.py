@@ -1,135 +1,290 @@
 import numpy as np
-import pandas as pd
-from typing import List, Dict, Any
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Mapping, Sequence, Tuple, Union
+from rule_engine import rule_engine
 
+_DURATION = re.compile(r'^(\d+)([smhd])$')
+_DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
 
-def extract_statistical_features(sensor_data: List[Dict[str, Any]]) -> Dict[str, float]:
+# Sensor data can be a list of reading dicts, a NumPy structured array with
+# `sensor_type` and `value` fields, or a mapping of column name -> array.
+SensorData = Union[List[Dict[str, Any]], np.ndarray, Mapping[str, Sequence[Any]]]
+
+
+def factorize(labels: Any) -> Tuple[np.ndarray, List[Any]]:
+    """
+    Encode labels as integer codes numbered in order of first appearance
+    """
+    if isinstance(labels, np.ndarray):
+        uniques, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        order = np.argsort(first_index, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank[inverse.ravel()], uniques[order].tolist()
+
+    index: Dict[Any, int] = {}
+    codes = np.fromiter((index.setdefault(label, len(index)) for label in labels), dtype=np.int64)
+    return codes, list(index)
+
+
+def _sensor_columns(sensor_data: SensorData) -> Tuple[Any, np.ndarray]:
+    """Return (sensor types, float64 values) from any supported input layout"""
+    if isinstance(sensor_data, np.ndarray):
+        return sensor_data['sensor_type'], np.asarray(sensor_data['value'], dtype=np.float64)
+    if isinstance(sensor_data, Mapping):
+        types = sensor_data['sensor_type']
+        if not isinstance(types, np.ndarray):
+            types = list(types)
+        return types, np.asarray(sensor_data['value'], dtype=np.float64)
+
+    types = [reading['sensor_type'] for reading in sensor_data]
+    values = np.fromiter((float(reading['value']) for reading in sensor_data),
+                         dtype=np.float64, count=len(sensor_data))
+    return types, values
+
+
+def _grouped_statistics(codes: np.ndarray, values: np.ndarray, n_groups: int) -> Dict[str, np.ndarray]:
+    """
+    Compute per-group statistics in one vectorized pass.
+
+    Rows keep their input order inside each group; the trend is the least-squares
+    slope of value against that position (what np.polyfit(arange(n), values, 1) gives).
+    """
+    counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    mean = np.bincount(codes, weights=values, minlength=n_groups) / counts
+    deviation = values - mean[codes]
+    std = np.sqrt(np.bincount(codes, weights=deviation * deviation, minlength=n_groups) / counts)
+
+    # Stable sort groups rows contiguously without reordering them inside a group
+    order = np.argsort(codes, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(counts[:-1]))).astype(np.int64)
+    sorted_values = values[order]
+    minimum = np.minimum.reduceat(sorted_values, starts)
+    maximum = np.maximum.reduceat(sorted_values, starts)
+
+    # Closed-form slope: x is 0..n-1 per group, so Sxx = n(n^2 - 1) / 12
+    position = np.empty(len(values), dtype=np.float64)
+    position[order] = np.arange(len(values)) - np.repeat(starts, counts.astype(np.int64))
+    x_centered = position - (counts[codes] - 1) / 2.0
+    sxy = np.bincount(codes, weights=x_centered * deviation, minlength=n_groups)
+    sxx = counts * (counts * counts - 1) / 12.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trend = np.where(counts > 1, sxy / sxx, np.nan)
+        cv = np.where(mean != 0, std / mean, np.nan)
+
+    return {
+        'count': counts,
+        'mean': mean,
+        'std': std,
+        'min': minimum,
+        'max': maximum,
+        'range': maximum - minimum,
+        'trend': trend,
+        'cv': cv
+    }
+
+
+def features_for_group(stats: Dict[str, np.ndarray], group: int, sensor_type: str,
+                       features: Dict[str, float], suffix: str = ''):
+    """Add one group's statistics to `features` as {sensor_type}_{stat}{suffix}"""
+    features[f'{sensor_type}_mean{suffix}'] = float(stats['mean'][group])
+    features[f'{sensor_type}_std{suffix}'] = float(stats['std'][group])
+    features[f'{sensor_type}_min{suffix}'] = float(stats['min'][group])
+    features[f'{sensor_type}_max{suffix}'] = float(stats['max'][group])
+    features[f'{sensor_type}_range{suffix}'] = float(stats['range'][group])
+
+    # Trend needs at least two readings, CV a non-zero mean
+    if stats['count'][group] > 1:
+        features[f'{sensor_type}_trend{suffix}'] = float(stats['trend'][group])
+    if stats['mean'][group] != 0:
+        features[f'{sensor_type}_cv{suffix}'] = float(stats['cv'][group])
+
+
+def extract_statistical_features(sensor_data: SensorData) -> Dict[str, float]:
     """
     Extract statistical features from sensor data for risk scoring
     """
-    if not sensor_data:
+    if len(sensor_data) == 0:
         return {}
+
+    types, values = _sensor_columns(sensor_data)
+    if len(values) == 0:
+        return {}
+
+    codes, sensor_types = factorize(types)
+    stats = _grouped_statistics(codes, values, len(sensor_types))
+
+    features: Dict[str, float] = {}
+    for group, sensor_type in enumerate(sensor_types):
+        features_for_group(stats, group, sensor_type, features)
+
+    return features
+
+
+def extract_statistical_features_batch(asset_ids: Sequence[Any], sensor_types: Sequence[Any],
+                                       values: Sequence[float]) -> Dict[Any, Dict[str, float]]:
+    """
+    Extract features for many assets at once from flat column arrays.
+
+    All (asset, sensor_type) groups are reduced in a single pass. Each asset's
+    rows must be in the same order `extract_statistical_features` expects
+    (newest first, as returned by the database layer).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {}
+
+    asset_codes, assets = factorize(asset_ids)
+    sensor_codes, sensors = factorize(sensor_types)
+    pair_codes, pairs = factorize(asset_codes * len(sensors) + sensor_codes)
+    stats = _grouped_statistics(pair_codes, values, len(pairs))
+
+    features: Dict[Any, Dict[str, float]] = {asset_id: {} for asset_id in assets}
+    for group, pair in enumerate(pairs):
+        asset_code, sensor_code = divmod(int(pair), len(sensors))
+        features_for_group(stats, group, sensors[sensor_code], features[assets[asset_code]])
+
+    return features
+
+
+def extract_rollup_features(rollups: Mapping[str, np.ndarray]) -> Dict[Any, Dict[str, float]]:
+    """
+    Features per asset from pre-aggregated statistics, one row per (asset,
+    sensor type), as returned by `Database.get_sensor_rollups`.
     
-    # Convert to DataFrame for easier processing
-    df = pd.DataFrame(sensor_data)
-    
-    features = {}
+    Produces the same feature names as `extract_statistical_features`. The
+    trend is fitted against time and scaled to the mean spacing of the
+    readings; for evenly spaced readings it equals the per-reading trend.
+    """
+    counts = np.asarray(rollups['count'], dtype=np.float64)
+    if len(counts) == 0:
+        return {}
     
-    # Group by sensor type and calculate statistics
-    for sensor_type in df['sensor_type'].unique():
-        sensor_df = df[df['sensor_type'] == sensor_type]
-        values = sensor_df['value'].values
-        
-        if len(values) > 0:
-            features[f'{sensor_type}_mean'] = float(np.mean(values))
-            features[f'{sensor_type}_std'] = float(np.std(values))
-            features[f'{sensor_type}_min'] = float(np.min(values))
-            features[f'{sensor_type}_max'] = float(np.max(values))
-            features[f'{sensor_type}_range'] = float(np.max(values) - np.min(values))
-            
-            # Calculate trend (simple linear regression slope)
-            if len(values) > 1:
-                x = np.arange(len(values))
-                slope = np.polyfit(x, values, 1)[0]
-                features[f'{sensor_type}_trend'] = float(slope)
-            
-            # Calculate coefficient of variation
-            if np.mean(values) != 0:
-                features[f'{sensor_type}_cv'] = float(np.std(values) / np.mean(values))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = rollups['sum'] / counts
+        std = np.sqrt(np.maximum(rollups['sum_sq'] / counts - mean * mean, 0.0))
+        sxx = rollups['time_sum_sq'] - rollups['time_sum'] * rollups['time_sum'] / counts
+        sxy = rollups['time_value_sum'] - rollups['time_sum'] * rollups['sum'] / counts
+        spacing = (rollups['last_time'] - rollups['first_time']) / (counts - 1)
+        # Negated like the window trend, which counts positions newest first
+        trend = np.where((counts > 1) & (sxx > 0), -(sxy / sxx) * spacing, 0.0)
+        cv = np.where(mean != 0, std / mean, np.nan)
     
+    stats = {
+        'count': counts,
+        'mean': mean,
+        'std': std,
+        'min': rollups['min'],
+        'max': rollups['max'],
+        'range': rollups['max'] - rollups['min'],
+        'trend': trend,
+        'cv': cv
+    }
+    features: Dict[Any, Dict[str, float]] = {}
+    for group, (asset_id, sensor_type) in enumerate(zip(rollups['asset_id'], rollups['sensor_type'])):
+        features_for_group(stats, group, sensor_type, features.setdefault(asset_id, {}))
     return features
 
 
-def calculate_risk_factors(features: Dict[str, float], asset_type: str) -> List[Dict[str, Any]]:
+def extract_window_features(columns: Mapping[str, np.ndarray], windows: Mapping[str, timedelta],
+                            now: datetime) -> Dict[Any, Dict[str, float]]:
     """
-    Calculate risk factors based on features and asset type
+    Features per asset over several time windows ending at `now`, from one
+    set of columns (asset_id, time, sensor_type, value, in any order) that
+    covers the longest window.
+
+    Features are named like `extract_statistical_features` ones qualified
+    with the window's label, e.g. `temperature_max@1h` for a window labelled
+    '1h'. Each stream is sorted newest first once, so every window is a
+    prefix of it: readings are reduced once into the segments between
+    consecutive window ends, and each window's statistics are running
+    totals over a few segments. The trend is per reading, as in
+    `extract_statistical_features`.
     """
-    risk_factors = []
-    
-    # Define thresholds based on asset type
-    thresholds = {
-        'transformer': {
-            'temperature_max': 80.0,
-            'voltage_std': 5.0,
-            'current_max': 100.0
-        },
-        'motor': {
-            'temperature_max': 90.0,
-            'vibration_std': 2.0,
-            'current_max': 150.0
-        },
-        'generator': {
-            'temperature_max': 85.0,
-            'voltage_std': 3.0,
-            'current_max': 200.0
-        },
-        'pump': {
-            'temperature_max': 75.0,
-            'vibration_std': 1.5,
-            'pressure_std': 5.0
+    values = np.asarray(columns['value'], dtype=np.float64)
+    if len(values) == 0 or not windows:
+        return {}
+
+    asset_codes, assets = factorize(columns['asset_id'])
+    sensor_codes, sensors = factorize(columns['sensor_type'])
+    pair_codes, pairs = factorize(asset_codes * len(sensors) + sensor_codes)
+    n_groups = len(pairs)
+    labels = sorted(windows, key=lambda label: windows[label])
+    lengths = np.array([_duration_micros(windows[label]) for label in labels], dtype=np.int64)
+
+    # Age of every reading in microseconds, clipped to the longest window (which excludes it)
+    horizon = int(lengths[-1]) + 1
+    now_micros = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), 'us').astype(np.int64)
+    age = np.clip(now_micros - columns['time'].astype('datetime64[us]').astype(np.int64), 0, horizon - 1)
+    order = np.lexsort((age, pair_codes))
+    codes, age, values = pair_codes[order], age[order], values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts[:-1])))
+    rank = np.arange(len(values)) - np.repeat(starts, counts)
+
+    # With rows sorted by (stream, age), a window ends at the first reading at least its length old
+    keys = codes * horizon + age
+    ends = np.searchsorted(keys, np.arange(n_groups)[:, None] * horizon + lengths[None, :], side='left')
+    bounds = np.concatenate((starts[:, None], ends), axis=1)
+    window_counts = (ends - starts[:, None]).astype(np.float64)
+    empty = bounds[:, 1:] == bounds[:, :-1]
+
+    def segments(ufunc, quantity: np.ndarray, identity: float) -> np.ndarray:
+        """ufunc over each (stream, window) segment, accumulated across a stream's windows"""
+        # A trailing element keeps the last boundary a valid reduceat index
+        reduced = ufunc.reduceat(np.append(quantity, identity), bounds.ravel()).reshape(bounds.shape)[:, :-1]
+        return ufunc.accumulate(np.where(empty, identity, reduced), axis=1)
+
+    # Values relative to their stream's newest keep the sums of squares well conditioned
+    newest = values[starts]
+    centered = values - np.repeat(newest, counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_offset = segments(np.add, centered, 0.0) / window_counts
+        variance = segments(np.add, centered * centered, 0.0) / window_counts - mean_offset * mean_offset
+        mean = newest[:, None] + mean_offset
+        std = np.sqrt(np.maximum(variance, 0.0))
+        # Positions run 0..n-1 from the newest reading: sum(x) = n(n-1)/2 and Sxx = n(n^2-1)/12
+        sxy = segments(np.add, rank * centered, 0.0) - window_counts * (window_counts - 1) / 2.0 * mean_offset
+        trend = np.where(window_counts > 1, sxy / (window_counts * (window_counts ** 2 - 1) / 12.0), np.nan)
+        cv = np.where(mean != 0, std / mean, np.nan)
+    minimum = segments(np.minimum, values, np.inf)
+    maximum = segments(np.maximum, values, -np.inf)
+
+    features: Dict[Any, Dict[str, float]] = {asset_id: {} for asset_id in assets}
+    for column, label in enumerate(labels):
+        stats = {
+            'count': window_counts[:, column],
+            'mean': mean[:, column],
+            'std': std[:, column],
+            'min': minimum[:, column],
+            'max': maximum[:, column],
+            'range': maximum[:, column] - minimum[:, column],
+            'trend': trend[:, column],
+            'cv': cv[:, column]
         }
-    }
-    
-    asset_thresholds = thresholds.get(asset_type, thresholds['transformer'])
-    
-    # Check temperature
-    if 'temperature_max' in features:
-        temp_max = features['temperature_max']
-        threshold = asset_thresholds.get('temperature_max', 80.0)
-        if temp_max > threshold:
-            contribution = min(((temp_max - threshold) / threshold) * 100, 40.0)
-            risk_factors.append({
-                'factor': 'High Temperature',
-                'contribution': contribution,
-                'description': f'Maximum temperature ({temp_max:.1f}°C) exceeds safe threshold ({threshold}°C)'
-            })
-    
-    # Check voltage variability
-    if 'voltage_std' in features:
-        voltage_std = features['voltage_std']
-        threshold = asset_thresholds.get('voltage_std', 5.0)
-        if voltage_std > threshold:
-            contribution = min(((voltage_std - threshold) / threshold) * 100, 30.0)
-            risk_factors.append({
-                'factor': 'Voltage Instability',
-                'contribution': contribution,
-                'description': f'Voltage variability ({voltage_std:.2f}V) indicates unstable power supply'
-            })
-    
-    # Check vibration
-    if 'vibration_std' in features:
-        vibration_std = features['vibration_std']
-        threshold = asset_thresholds.get('vibration_std', 2.0)
-        if vibration_std > threshold:
-            contribution = min(((vibration_std - threshold) / threshold) * 100, 35.0)
-            risk_factors.append({
-                'factor': 'Excessive Vibration',
-                'contribution': contribution,
-                'description': f'Vibration variability ({vibration_std:.2f}) suggests mechanical issues'
-            })
-    
-    # Check current overload
-    if 'current_max' in features:
-        current_max = features['current_max']
-        threshold = asset_thresholds.get('current_max', 100.0)
-        if current_max > threshold:
-            contribution = min(((current_max - threshold) / threshold) * 100, 30.0)
-            risk_factors.append({
-                'factor': 'Current Overload',
-                'contribution': contribution,
-                'description': f'Peak current ({current_max:.1f}A) exceeds rated capacity ({threshold}A)'
-            })
-    
-    # Check pressure variability (for pumps)
-    if 'pressure_std' in features:
-        pressure_std = features['pressure_std']
-        threshold = asset_thresholds.get('pressure_std', 5.0)
-        if pressure_std > threshold:
-            contribution = min(((pressure_std - threshold) / threshold) * 100, 25.0)
-            risk_factors.append({
-                'factor': 'Pressure Instability',
-                'contribution': contribution,
-                'description': f'Pressure variability ({pressure_std:.2f}) indicates flow issues'
-            })
-    
-    return risk_factors
+        for group in np.flatnonzero(window_counts[:, column]).tolist():
+            asset_code, sensor_code = divmod(int(pairs[group]), len(sensors))
+            features_for_group(stats, group, sensors[sensor_code], features[assets[asset_code]], f'@{label}')
+
+    return features
+
+
+def _duration_micros(length: timedelta) -> int:
+    return (length.days * 86400 + length.seconds) * 1000000 + length.microseconds
+
+
+def parse_duration(text: str) -> timedelta:
+    """'90s', '15m', '1h', '7d' -> timedelta"""
+    match = _DURATION.match(text.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"invalid duration {text!r}, expected e.g. 15m, 1h or 7d")
+    return timedelta(**{_DURATION_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def calculate_risk_factors(features: Dict[str, float], asset_type: str) -> List[Dict[str, Any]]:
+    """
+    Calculate risk factors based on features and asset type (see `rule_engine`
+    and risk_rules.json for the thresholds)
+    """
+    return rule_engine.evaluate(features, asset_type)
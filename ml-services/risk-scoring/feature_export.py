@@ -0,0 +1,180 @@
+"""
+Export of historical feature matrices to partitioned Parquet, for training
+models offline without querying the production database.
+
+At every cadence tick over [start, end), the features
+`extract_statistical_features` gives for the last `window` readings per
+sensor type are computed for every asset, with the rolling prefix sums of
+reading_streams.py that replay.py scores from. Readings are streamed one
+group of assets and one day at a time, and each (day, group) becomes one
+file:
+
+    <out>/date=2024-01-01/part-g0000.parquet
+
+Each row is one asset at one tick with at least one reading in its window:
+asset_id, asset_type, time, reading_count and a float64 column per feature
+(NaN where the asset has none). Sensor types, and so feature columns, can
+differ between files, so read the directory with a unified schema
+(pyarrow.unify_schemas over the files' schemas). Files are replaced whole,
+so a rerun with the same parameters redoes the export from the start,
+overwriting the files it produces. Needs pyarrow.
+
+Usage (from ml-services/risk-scoring):
+    python feature_export.py --plant PLANT-001 --start 2024-01-01 --end 2024-04-01 --every 1h
+                             --out features/ [--asset ID ...] [--window 100] [--group-size 100]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from database import db
+from feature_engineering import parse_duration
+from reading_streams import (
+    Stream,
+    StreamKey,
+    carry_over,
+    concat_columns,
+    merge_streams,
+    rolling_window_stats,
+    split_streams,
+    warmup
+)
+from risk_engine import risk_engine
+from timestamps import from_micros, parse_time, to_micros
+
+logger = logging.getLogger(__name__)
+
+FEATURE_STATS = ('mean', 'std', 'min', 'max', 'range', 'trend', 'cv')
+_DAY_MICROS = 86400 * 1000000
+
+
+def feature_matrix(assets: List[Dict[str, Any]], streams: Dict[StreamKey, Stream], ticks: np.ndarray,
+                   window: int) -> Dict[str, np.ndarray]:
+    """Feature columns for every (asset, tick) with readings, ordered by asset then time"""
+    position = {asset['id']: index for index, asset in enumerate(assets)}
+    n_ticks = len(ticks)
+    counts = np.zeros(len(assets) * n_ticks)
+    features: Dict[str, np.ndarray] = {}
+
+    for (asset_id, sensor_type), (times, values) in streams.items():
+        stats = rolling_window_stats(times, values, ticks, window)
+        rows = slice(position[asset_id] * n_ticks, (position[asset_id] + 1) * n_ticks)
+        counts[rows] += stats['count']
+        for name in FEATURE_STATS:
+            column = features.setdefault(f'{sensor_type}_{name}', np.full(len(counts), np.nan))
+            column[rows] = np.where(stats['count'] > 0, stats[name], np.nan)
+
+    keep = counts > 0
+    return {
+        'asset_id': np.repeat(np.array([asset['id'] for asset in assets], dtype=object), n_ticks)[keep],
+        'asset_type': np.repeat(np.array([asset['type'] for asset in assets], dtype=object), n_ticks)[keep],
+        'time': np.tile(ticks, len(assets))[keep].view('datetime64[us]'),
+        'reading_count': counts[keep].astype(np.int64),
+        **{name: features[name][keep] for name in sorted(features)}
+    }
+
+
+def write_partition(path: str, columns: Dict[str, np.ndarray]):
+    """Write feature columns to one Parquet file, replacing it atomically"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("feature export requires the 'pyarrow' package")
+
+    arrays = {
+        name: pa.array(column, type=pa.timestamp('us', tz='UTC')) if name == 'time' else pa.array(column)
+        for name, column in columns.items()
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    pq.write_table(pa.table(arrays), temporary)
+    os.replace(temporary, path)
+
+
+def export_features(start: datetime, end: datetime, every: timedelta, out: str,
+                    plant_id: Optional[str] = None, asset_ids: Optional[List[str]] = None,
+                    window: Optional[int] = None, group_size: int = 100,
+                    chunk_size: int = 50000) -> Dict[str, Any]:
+    """
+    Write feature matrices every `every` over [start, end) for a plant's
+    active assets (or an explicit list) under `out`, partitioned by UTC day.
+    Memory is bounded by the readings of `group_size` assets over one day.
+    """
+    window = window or risk_engine.window_per_sensor
+    if end <= start:
+        raise ValueError("end must be after start")
+
+    assets = db.get_assets_info(asset_ids) if asset_ids else db.get_plant_assets(plant_id)
+    assets = sorted(assets, key=lambda asset: asset['id'])
+    groups = [assets[first:first + group_size] for first in range(0, len(assets), group_size)]
+
+    start_us, end_us, every_us = to_micros(start), to_micros(end), every // timedelta(microseconds=1)
+    stats = {'assets': len(assets), 'groups': len(groups), 'files': 0, 'readings': 0, 'rows': 0}
+    started = time.perf_counter()
+
+    for group_index, group in enumerate(groups):
+        group_ids = [asset['id'] for asset in group]
+        carry = warmup(group_ids, start, window)
+        slice_start = start_us
+
+        while slice_start < end_us:
+            slice_end = min(slice_start - slice_start % _DAY_MICROS + _DAY_MICROS, end_us)
+            first_tick = start_us + -(-(slice_start - start_us) // every_us) * every_us
+            ticks = np.arange(first_tick, slice_end, every_us, dtype=np.int64)
+
+            columns = concat_columns(db.iter_sensor_readings(
+                group_ids, from_micros(slice_start), from_micros(slice_end), chunk_size=chunk_size))
+            streams = merge_streams(carry, split_streams(columns))
+
+            matrix = feature_matrix(group, streams, ticks, window) if len(ticks) else None
+            if matrix is not None and len(matrix['asset_id']):
+                day = from_micros(slice_start).strftime('%Y-%m-%d')
+                write_partition(os.path.join(out, f'date={day}', f'part-g{group_index:04d}.parquet'), matrix)
+                stats['files'] += 1
+                stats['rows'] += len(matrix['asset_id'])
+
+            stats['readings'] += len(columns['value'])
+            # Only the trailing window is needed to continue into the next day
+            carry = carry_over(streams, window)
+            slice_start = slice_end
+        logger.info("group %d/%d exported", group_index + 1, len(groups))
+
+    stats['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export historical feature matrices to partitioned Parquet")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--plant', help="plant_id whose active assets to export")
+    target.add_argument('--asset', action='append', help="Asset id to export (repeatable)")
+    parser.add_argument('--start', required=True, type=parse_time, help="Start of the range (ISO-8601, UTC if naive)")
+    parser.add_argument('--end', required=True, type=parse_time, help="End of the range, exclusive")
+    parser.add_argument('--every', default='1h', type=parse_duration, help="Feature cadence (default: 1h)")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--window', type=int, default=None,
+                        help="Readings per sensor type in each window (default: SENSOR_WINDOW_PER_TYPE)")
+    parser.add_argument('--group-size', type=int, default=100, help="Assets read together (default: 100)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per cursor fetch (default: 50000)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s', stream=sys.stderr)
+    try:
+        stats = export_features(args.start, args.end, args.every, args.out, plant_id=args.plant,
+                                asset_ids=args.asset, window=args.window, group_size=args.group_size,
+                                chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+
+class SensorWindow:
+    """
+    Running sufficient statistics over the last `size` readings of one
+    (asset_id, sensor_type) stream.
+
+    Mean/variance use Welford's update (with the matching downdate when a
+    reading leaves the window), min/max use monotonic deques and the trend
+    keeps running regression sums, so push() is amortized O(1).
+    """
+
+    __slots__ = ('size', 'values', 'mean', 'm2', 'sum_y', 'sum_iy', 'seq',
+                 'min_deque', 'max_deque', 'last_timestamp', '_evictions')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: Deque[float] = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Regression sums with x = position in the window (0 = oldest)
+        self.sum_y = 0.0
+        self.sum_iy = 0.0
+        # Absolute sequence number of the next reading, used to expire deque entries
+        self.seq = 0
+        self.min_deque: Deque[Tuple[int, float]] = deque()
+        self.max_deque: Deque[Tuple[int, float]] = deque()
+        self.last_timestamp: Optional[datetime] = None
+        self._evictions = 0
+
+    def push(self, value: float, timestamp: Optional[datetime] = None):
+        if len(self.values) == self.size:
+            self._evict()
+
+        n = len(self.values)
+        self.values.append(value)
+
+        delta = value - self.mean
+        self.mean += delta / (n + 1)
+        self.m2 += delta * (value - self.mean)
+
+        self.sum_iy += n * value
+        self.sum_y += value
+
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((self.seq, value))
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((self.seq, value))
+        self.seq += 1
+
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+
+    def _evict(self):
+        value = self.values.popleft()
+        n = len(self.values)
+
+        if n == 0:
+            self.mean = self.m2 = self.sum_y = self.sum_iy = 0.0
+        else:
+            old_mean = self.mean
+            self.mean = (old_mean * (n + 1) - value) / n
+            self.m2 = max(self.m2 - (value - old_mean) * (value - self.mean), 0.0)
+            # The oldest reading had x = 0; every remaining reading moves one position down
+            self.sum_y -= value
+            self.sum_iy -= self.sum_y
+
+        oldest_seq = self.seq - n
+        while self.min_deque and self.min_deque[0][0] < oldest_seq:
+            self.min_deque.popleft()
+        while self.max_deque and self.max_deque[0][0] < oldest_seq:
+            self.max_deque.popleft()
+
+        # Re-derive the running sums once per window length to stop float drift
+        self._evictions += 1
+        if self._evictions >= self.size:
+            self._evictions = 0
+            self._recompute()
+
+    def _recompute(self):
+        n = len(self.values)
+        if n == 0:
+            return
+        self.sum_y = math.fsum(self.values)
+        self.sum_iy = math.fsum(i * v for i, v in enumerate(self.values))
+        self.mean = self.sum_y / n
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def features(self, sensor_type: str, features: Dict[str, float]):
+        """
+        Add this window's features using the same names and conventions as
+        `extract_statistical_features` (trend measured newest-first).
+        """
+        n = len(self.values)
+        if n == 0:
+            return
+
+        std = math.sqrt(self.m2 / n)
+        minimum = self.min_deque[0][1]
+        maximum = self.max_deque[0][1]
+        features[f'{sensor_type}_mean'] = self.mean
+        features[f'{sensor_type}_std'] = std
+        features[f'{sensor_type}_min'] = minimum
+        features[f'{sensor_type}_max'] = maximum
+        features[f'{sensor_type}_range'] = maximum - minimum
+
+        if n > 1:
+            sxy = self.sum_iy - (n - 1) / 2.0 * self.sum_y
+            sxx = n * (n * n - 1) / 12.0
+            # Database reads come newest first, so the extractor's x axis runs backwards in time
+            features[f'{sensor_type}_trend'] = -sxy / sxx
+        if self.mean != 0:
+            features[f'{sensor_type}_cv'] = std / self.mean
+
+
+class FeatureStore:
+    """
+    Incremental per-asset feature state.
+
+    Keeps a SensorWindow per (asset_id, sensor_type) plus a high-water mark of
+    the newest reading seen per asset, so callers only need to fetch readings
+    that arrived since the last update.
+    """
+
+    def __init__(self, window_size: int = 100):
+        self.window_size = window_size
+        self._windows: Dict[str, Dict[str, SensorWindow]] = {}
+        self._high_water: Dict[str, Optional[datetime]] = {}
+        self._lock = threading.Lock()
+
+    def has(self, asset_id: str) -> bool:
+        return asset_id in self._windows
+
+    def seed(self, asset_id: str, sensor_data: Union[List[Dict[str, Any]], Mapping[str, Any]]):
+        """
+        Replace an asset's state with a freshly fetched window, newest first:
+        reading dicts (`Database.get_sensor_data`) or columns
+        (`Database.get_sensor_window`).
+        """
+        if isinstance(sensor_data, Mapping):
+            timestamps = [ts.replace(tzinfo=timezone.utc) for ts in sensor_data['time'].astype(object)]
+            sensor_data = [
+                {'timestamp': ts, 'sensor_type': sensor_type, 'value': value}
+                for ts, sensor_type, value in zip(timestamps, sensor_data['sensor_type'], sensor_data['value'])
+            ]
+        with self._lock:
+            self._windows[asset_id] = {}
+            self._high_water[asset_id] = None
+            self._apply(asset_id, reversed(sensor_data))
+
+    def update(self, readings: Iterable[Dict[str, Any]]) -> Set[str]:
+        """
+        Fold new readings (oldest first, each with asset_id, sensor_type,
+        value and optionally timestamp) into the state. Readings that are not
+        newer than their stream's last reading are ignored.
+
+        Returns the ids of the assets whose state changed.
+        """
+        touched: Set[str] = set()
+        with self._lock:
+            for reading in readings:
+                asset_id = reading['asset_id']
+                self._windows.setdefault(asset_id, {})
+                self._high_water.setdefault(asset_id, None)
+                if self._apply(asset_id, (reading,)):
+                    touched.add(asset_id)
+        return touched
+
+    def _apply(self, asset_id: str, readings: Iterable[Dict[str, Any]]) -> bool:
+        windows = self._windows[asset_id]
+        changed = False
+        for reading in readings:
+            sensor_type = reading['sensor_type']
+            window = windows.get(sensor_type)
+            if window is None:
+                window = windows[sensor_type] = SensorWindow(self.window_size)
+
+            timestamp = reading.get('timestamp')
+            if timestamp is not None and window.last_timestamp is not None \
+                    and timestamp <= window.last_timestamp:
+                continue
+
+            window.push(float(reading['value']), timestamp)
+            changed = True
+
+            high_water = self._high_water[asset_id]
+            if timestamp is not None and (high_water is None or timestamp > high_water):
+                self._high_water[asset_id] = timestamp
+        return changed
+
+    def snapshot(self, asset_id: str) -> Dict[str, float]:
+        """Current features for an asset"""
+        features: Dict[str, float] = {}
+        with self._lock:
+            for sensor_type, window in self._windows.get(asset_id, {}).items():
+                window.features(sensor_type, features)
+        return features
+
+    def reading_count(self, asset_id: str) -> int:
+        """Number of readings currently held across an asset's windows"""
+        with self._lock:
+            return sum(len(window) for window in self._windows.get(asset_id, {}).values())
+
+    def high_water_mark(self, asset_id: str) -> Optional[datetime]:
+        """Timestamp of the newest reading folded in for an asset"""
+        return self._high_water.get(asset_id)
+
+    def evict(self, asset_id: str):
+        with self._lock:
+            self._windows.pop(asset_id, None)
+            self._high_water.pop(asset_id, None)
+
+
+feature_store = FeatureStore(window_size=int(os.getenv('FEATURE_WINDOW_SIZE', 100)))
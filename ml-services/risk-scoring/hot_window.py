@@ -0,0 +1,293 @@
+"""
+Memory-mapped ring buffers of the most recent readings per (asset_id,
+sensor_type), kept on local disk so a restarted process starts warm.
+
+Files under HOT_WINDOW_PATH:
+
+    meta.json     window length and slot capacity
+    index.json    (asset_id, sensor_type) of every slot, in slot order
+    values.f64    float64 [capacity, 2 * window]
+    times.i64     int64   [capacity, 2 * window], microseconds since the epoch
+    state.i64     int64   [capacity, 2]: readings written, newest time
+
+Each reading is written twice, at position p and p + window of its slot's
+row, so the last `window` readings are always one contiguous slice and a
+stream can be read as a view of the mapping without copying or reordering.
+A slot's state is updated after its readings, so a crash mid-append loses
+at most that append. One process may own a directory at a time.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from database import SensorColumns, to_columns
+from feature_engineering import factorize
+from timestamps import from_micros, to_micros
+
+logger = logging.getLogger(__name__)
+
+
+class HotWindowStore:
+    """
+    Ring buffer of the last `window` readings of every stream, backed by
+    memory-mapped files. Opened lazily on first use; disabled when no path
+    is configured or another process holds the directory.
+    """
+
+    def __init__(self, path: Optional[str], window: int = 100, initial_capacity: int = 1024):
+        self.path = path
+        self.window = window
+        self.initial_capacity = initial_capacity
+        self.enabled = path is not None
+        self._opened = False
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._slots: Dict[Tuple[str, str], int] = {}
+        self._asset_slots: Dict[str, List[int]] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self._capacity = 0
+        self._values: Optional[np.ndarray] = None
+        self._times: Optional[np.ndarray] = None
+        self._state: Optional[np.ndarray] = None
+        self._mapped: List[np.memmap] = []
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        """Map the files, creating or resetting them when missing or laid out for another window"""
+        if self._opened:
+            return
+        self._opened = True
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            import fcntl
+            self._lock_file = open(self._file('lock'), 'w')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            pass
+        except OSError:
+            logger.warning("Hot window store %s is in use by another process, disabling it", self.path)
+            self.enabled = False
+            return
+
+        try:
+            with open(self._file('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._file('index.json'), encoding='utf-8') as f:
+                keys = [tuple(key) for key in json.load(f)]
+            if meta['window'] != self.window or len(keys) > meta['capacity']:
+                raise ValueError(f"laid out for a window of {meta['window']}")
+            self._map(meta['capacity'])
+            self._keys = keys
+            for slot, key in enumerate(keys):
+                self._slots[key] = slot
+                self._asset_slots.setdefault(key[0], []).append(slot)
+            logger.info("Reopened hot window store %s with %d streams", self.path, len(keys))
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Resetting hot window store %s: %s", self.path, e)
+            for name in ('values.f64', 'times.i64', 'state.i64', 'index.json'):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self._slots, self._asset_slots, self._keys = {}, {}, []
+            self._map(self.initial_capacity)
+            self._save_index()
+
+    def _map(self, capacity: int):
+        """(Re)map every file for `capacity` slots, growing them with zeros as needed"""
+        files = (('values.f64', np.float64, 2 * self.window), ('times.i64', np.int64, 2 * self.window),
+                 ('state.i64', np.int64, 2))
+        mapped = []
+        for name, dtype, width in files:
+            size = capacity * width * np.dtype(dtype).itemsize
+            with open(self._file(name), 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            mapped.append(np.memmap(self._file(name), dtype=dtype, mode='r+', shape=(capacity, width)))
+        self._mapped = mapped
+        # Plain ndarray views: indexing a memmap subclass costs more than the copy it avoids
+        self._values, self._times, self._state = (array.view(np.ndarray) for array in mapped)
+        self._capacity = capacity
+        self._write_json('meta.json', {'window': self.window, 'capacity': capacity})
+
+    def _write_json(self, name: str, content: Any):
+        temporary = self._file(name + '.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(content, f)
+        os.replace(temporary, self._file(name))
+
+    def _save_index(self):
+        self._write_json('index.json', self._keys)
+
+    def _slot_codes(self, asset_ids: Sequence[Any], sensor_types: Sequence[Any]) -> np.ndarray:
+        """Slot of every row, allocating slots for streams not seen before"""
+        asset_codes, assets = factorize(asset_ids)
+        sensor_codes, sensors = factorize(sensor_types)
+        pair_codes, pairs = factorize(asset_codes * len(sensors) + sensor_codes)
+        pair_slots = np.empty(len(pairs), dtype=np.int64)
+        added = False
+        for index, pair in enumerate(pairs):
+            asset_code, sensor_code = divmod(int(pair), len(sensors))
+            key = (str(assets[asset_code]), str(sensors[sensor_code]))
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = len(self._keys)
+                self._keys.append(key)
+                self._asset_slots.setdefault(key[0], []).append(slot)
+                added = True
+            pair_slots[index] = slot
+        if added:
+            if len(self._keys) > self._capacity:
+                capacity = self._capacity
+                while capacity < len(self._keys):
+                    capacity *= 2
+                self._map(capacity)
+            self._save_index()
+        return pair_slots[pair_codes]
+
+    def append(self, columns: SensorColumns) -> int:
+        """
+        Fold fetched or ingested readings (asset_id, time, sensor_type and
+        value columns, in any order) into the rings. Readings not newer than
+        their stream's newest are skipped. Returns the number written.
+        """
+        if not self.enabled or not len(columns['value']):
+            return 0
+        with self._lock:
+            self._open()
+            if not self.enabled:
+                return 0
+            times = columns['time'].astype('datetime64[us]').astype(np.int64)
+            values = np.asarray(columns['value'], dtype=np.float64)
+            slots = self._slot_codes(columns['asset_id'], columns['sensor_type'])
+
+            order = np.lexsort((times, slots))
+            slots, times, values = slots[order], times[order], values[order]
+            newest = self._state[slots, 1]
+            written = self._state[slots, 0]
+            fresh = np.where(written > 0, times > newest, True)
+            # Repeated timestamps within a stream keep their first reading
+            fresh[1:] &= (slots[1:] != slots[:-1]) | (times[1:] != times[:-1])
+            slots, times, values = slots[fresh], times[fresh], values[fresh]
+            if not len(slots):
+                return 0
+
+            # Rank within each slot; only the newest `window` readings of a slot are written
+            starts = np.flatnonzero(np.concatenate(([True], slots[1:] != slots[:-1])))
+            counts = np.diff(np.concatenate((starts, [len(slots)])))
+            first_slots = slots[starts]
+            newest_times = times[starts + counts - 1]
+            rank = np.arange(len(slots)) - np.repeat(starts, counts)
+            keep = rank >= np.repeat(counts, counts) - self.window
+            position = (self._state[slots, 0] + rank) % self.window
+
+            slots, times, values, position = slots[keep], times[keep], values[keep], position[keep]
+            for offset in (0, self.window):
+                self._values[slots, position + offset] = values
+                self._times[slots, position + offset] = times
+            self._state[first_slots, 0] += counts
+            self._state[first_slots, 1] = newest_times
+            return int(counts.sum())
+
+    def append_readings(self, readings: List[Dict[str, Any]]) -> int:
+        """`append` for reading dicts (asset_id, timestamp, sensor_type, value)"""
+        if not self.enabled or not readings:
+            return 0
+        rows = [
+            (reading['asset_id'], to_micros(reading['timestamp']), reading['sensor_type'], reading['value'])
+            for reading in readings
+        ]
+        return self.append(to_columns(rows, ['asset_id', 'time', 'sensor_type', 'value']))
+
+    def stream(self, asset_id: str, sensor_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (times, values) of one stream's buffered readings, oldest first, as
+        read-only views of the mapping (empty when the stream is unknown)
+        """
+        with self._lock:
+            self._open()
+            slot = self._slots.get((asset_id, sensor_type)) if self.enabled else None
+            if slot is None:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            return self._stream(slot)
+
+    def _stream(self, slot: int) -> Tuple[np.ndarray, np.ndarray]:
+        written = int(self._state[slot, 0])
+        n = min(written, self.window)
+        end = (written - 1) % self.window + self.window + 1 if written else 0
+        times = self._times[slot, end - n:end]
+        values = self._values[slot, end - n:end]
+        times.flags.writeable = values.flags.writeable = False
+        return times, values
+
+    def high_water_marks(self, asset_ids: Sequence[str]) -> Dict[str, Optional[datetime]]:
+        """Newest buffered reading time per asset, None for assets with nothing buffered"""
+        marks: Dict[str, Optional[datetime]] = {}
+        with self._lock:
+            self._open()
+            for asset_id in asset_ids:
+                slots = self._asset_slots.get(asset_id, []) if self.enabled else []
+                written = [int(self._state[slot, 1]) for slot in slots if self._state[slot, 0] > 0]
+                marks[asset_id] = from_micros(max(written)) if written else None
+        return marks
+
+    def window_batch(self, asset_ids: Sequence[str], per_sensor: int) -> SensorColumns:
+        """
+        The last `per_sensor` readings of every stream of the given assets, in
+        the layout of `Database.get_sensor_window_batch` (grouped by asset,
+        newest first). The result is a new copy; only `stream` returns views
+        of the mapping.
+        """
+        parts: List[Tuple[str, str, np.ndarray, np.ndarray]] = []
+        with self._lock:
+            self._open()
+            for asset_id in sorted(asset_ids) if self.enabled else []:
+                for slot in self._asset_slots.get(asset_id, []):
+                    times, values = self._stream(slot)
+                    if len(values):
+                        parts.append((asset_id, self._keys[slot][1], times[::-1][:per_sensor],
+                                      values[::-1][:per_sensor]))
+            if not parts:
+                return to_columns([], ['asset_id', 'time', 'sensor_type', 'value'])
+            times = np.concatenate([part[2] for part in parts])
+            values = np.concatenate([part[3] for part in parts])
+        lengths = [len(part[3]) for part in parts]
+        columns = {
+            'asset_id': np.repeat(np.array([part[0] for part in parts], dtype=object), lengths),
+            'time': times.view('datetime64[us]'),
+            'sensor_type': np.repeat(np.array([part[1] for part in parts], dtype=object), lengths),
+            'value': values
+        }
+        # Interleave each asset's streams newest first, as the database returns them
+        order = np.lexsort((-times, factorize(columns['asset_id'])[0]))
+        return {name: column[order] for name, column in columns.items()}
+
+    def flush(self):
+        with self._lock:
+            if self._opened and self.enabled:
+                for mapped in self._mapped:
+                    mapped.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'path': self.path,
+                'window': self.window,
+                'opened': self._opened,
+                'streams': len(self._keys),
+                'assets': len(self._asset_slots),
+                'capacity': self._capacity
+            }
+
+
+hot_windows = HotWindowStore(
+    path=os.getenv('HOT_WINDOW_PATH') or None,
+    window=max(int(os.getenv('SENSOR_WINDOW_PER_TYPE', 100)), int(os.getenv('FEATURE_WINDOW_SIZE', 100)))
+)
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from database import db
+from feature_store import feature_store
+from risk_engine import risk_engine
+from cache import risk_cache
+from write_behind import risk_writer
+from scheduler import rescore_scheduler
+from hot_window import hot_windows
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBackpressureError(Exception):
+    """Raised when the ingest queue stays full for longer than the enqueue timeout"""
+
+    def __init__(self, message: str, summary: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        # What had already been accepted from the request before the queue filled up
+        self.summary = summary or {}
+
+
+def parse_reading(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate and normalize one incoming reading.
+
+    Requires asset_id (UUID), sensor_type and a finite numeric value; timestamp
+    is ISO-8601 and defaults to now (naive timestamps are taken as UTC).
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("reading must be a JSON object")
+
+    try:
+        asset_id = str(uuid.UUID(str(raw['asset_id'])))
+        sensor_type = str(raw['sensor_type'])
+        value = float(raw['value'])
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}")
+
+    if not sensor_type:
+        raise ValueError("sensor_type must not be empty")
+    if not math.isfinite(value):
+        raise ValueError("value must be finite")
+
+    timestamp = raw.get('timestamp')
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc)
+    else:
+        timestamp = datetime.fromisoformat(str(timestamp))
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+
+    return {
+        'timestamp': timestamp,
+        'asset_id': asset_id,
+        'sensor_type': sensor_type,
+        'value': value,
+        'unit': raw.get('unit'),
+        'quality': raw.get('quality', 'good')
+    }
+
+
+def _features_moved(before: Dict[str, float], after: Dict[str, float], tolerance: float) -> bool:
+    """True when any feature appeared, disappeared or moved by more than `tolerance` (relative)"""
+    if before.keys() != after.keys():
+        return True
+    for name, old in before.items():
+        new = after[name]
+        if abs(new - old) > tolerance * max(abs(old), abs(new), 1.0):
+            return True
+    return False
+
+
+class IngestPipeline:
+    """
+    Bounded queue between the streaming ingest endpoint and a background
+    worker that COPYs readings into sensor_readings, folds them into the
+    feature store and rescores the assets whose features moved.
+    """
+
+    def __init__(self):
+        self.batch_size = int(os.getenv('INGEST_BATCH_SIZE', 5000))
+        self.queue_size = int(os.getenv('INGEST_QUEUE_SIZE', 20))
+        self.enqueue_timeout = float(os.getenv('INGEST_ENQUEUE_TIMEOUT', 5))
+        self.rescore_tolerance = float(os.getenv('INGEST_RESCORE_TOLERANCE', 0.01))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stats = {
+            'received': 0,
+            'rejected': 0,
+            'inserted': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'rescored_assets': 0,
+            'unchanged_assets': 0,
+            'last_batch_ms': 0.0
+        }
+        self._last_error: Optional[str] = None
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 30.0):
+        """Stop the worker, giving queued batches up to `drain_timeout` seconds to finish"""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingest queue not drained on shutdown (%d batches left)", self._queue.qsize())
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def enqueue(self, batch: List[Dict[str, Any]]):
+        """Queue a parsed batch, waiting up to the enqueue timeout for room"""
+        if self._queue is None:
+            raise RuntimeError("Ingest pipeline is not running")
+        try:
+            await asyncio.wait_for(self._queue.put(batch), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise IngestBackpressureError(
+                f"Ingest queue full ({self.queue_size} batches), retry later"
+            )
+
+    async def ingest(self, records: AsyncIterator[Any]) -> Dict[str, Any]:
+        """
+        Parse raw records into batches and queue them.
+
+        Reading the request body is paced by the queue: when the worker falls
+        behind, enqueue() blocks and the client is slowed down by TCP
+        backpressure, until the enqueue timeout turns it into an error.
+        """
+        summary = {'accepted': 0, 'rejected': 0, 'batches': 0, 'errors': []}
+        batch: List[Dict[str, Any]] = []
+
+        try:
+            async for raw in records:
+                try:
+                    batch.append(parse_reading(raw))
+                except (ValueError, TypeError) as e:
+                    summary['rejected'] += 1
+                    if len(summary['errors']) < 10:
+                        summary['errors'].append(str(e))
+                    continue
+
+                if len(batch) >= self.batch_size:
+                    await self.enqueue(batch)
+                    summary['accepted'] += len(batch)
+                    summary['batches'] += 1
+                    batch = []
+
+            if batch:
+                await self.enqueue(batch)
+                summary['accepted'] += len(batch)
+                summary['batches'] += 1
+        except IngestBackpressureError as e:
+            e.summary = summary
+            raise
+        finally:
+            self._stats['received'] += summary['accepted']
+            self._stats['rejected'] += summary['rejected']
+
+        return summary
+
+    async def _run(self):
+        while True:
+            batch = await self._queue.get()
+            try:
+                await db.run(self.process_batch, batch)
+            except Exception as e:
+                self._stats['failed_batches'] += 1
+                self._last_error = str(e)
+                logger.exception("Failed to process ingest batch of %d readings", len(batch))
+            finally:
+                self._queue.task_done()
+
+    def process_batch(self, readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Write one batch and rescore affected assets (blocking; runs on the DB thread pool)
+        """
+        start = time.perf_counter()
+        readings = sorted(readings, key=lambda r: r['timestamp'])
+        inserted = db.copy_sensor_readings(readings)
+        hot_windows.append_readings(readings)
+
+        arrived: Dict[str, int] = {}
+        for reading in readings:
+            arrived[reading['asset_id']] = arrived.get(reading['asset_id'], 0) + 1
+        rescore_scheduler.note_readings(arrived)
+        asset_ids = list(arrived)
+        known = [asset_id for asset_id in asset_ids if feature_store.has(asset_id)]
+        unknown = [asset_id for asset_id in asset_ids if not feature_store.has(asset_id)]
+
+        # Assets with live state take the new readings incrementally
+        before = {asset_id: feature_store.snapshot(asset_id) for asset_id in known}
+        known_set = set(known)
+        feature_store.update(reading for reading in readings if reading['asset_id'] in known_set)
+        changed = [
+            asset_id for asset_id in known
+            if _features_moved(before[asset_id], feature_store.snapshot(asset_id), self.rescore_tolerance)
+        ]
+
+        # Assets seen for the first time are seeded from the database (which now includes this batch),
+        # with the same per-sensor windows as /api/risk/calculate
+        if unknown:
+            risk_engine.seed_feature_store_batch(unknown)
+            changed.extend(unknown)
+
+        scores = []
+        if changed:
+            assets = db.get_assets_info(changed)
+            scores = risk_engine.score_from_feature_store_batch(assets)
+            for asset, score in zip(assets, scores):
+                risk_cache.put(asset['type'], feature_store.high_water_mark(asset['id']), score)
+            risk_writer.submit_many(scores)
+            rescore_scheduler.note_scores((score.asset_id, score.risk_score) for score in scores)
+
+        self._stats['batches'] += 1
+        self._stats['inserted'] += inserted
+        self._stats['rescored_assets'] += len(scores)
+        self._stats['unchanged_assets'] += len(asset_ids) - len(changed)
+        self._stats['last_batch_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+        return {'inserted': inserted, 'rescored': len(scores)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'queue_capacity': self.queue_size,
+            'running': self._worker is not None,
+            'last_error': self._last_error
+        }
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Decode newline-delimited JSON from a chunked byte stream"""
+    pending = b''
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield _decode_line(line)
+    if pending.strip():
+        yield _decode_line(pending)
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Surfaced as a rejected reading rather than failing the whole stream
+        return None
+
+
+ingest_pipeline = IngestPipeline()
@@ -1,15 +1,100 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+import asyncio
+import json
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from models import RiskCalculationRequest, RiskCalculationResponse
+from models import (
+    RiskCalculationRequest,
+    RiskCalculationResponse,
+    BatchRiskCalculationRequest,
+    BatchRiskCalculationResponse,
+    AssetRiskResult,
+    BatchTimings,
+    SweepRequest,
+    RiskScore,
+)
 from risk_engine import risk_engine
 from database import db
+from ingest import ingest_pipeline, iter_ndjson, IngestBackpressureError
+from cache import risk_cache
+from write_behind import risk_writer
+from model_registry import model_registry
+from single_flight import risk_flights
+from anomaly_engine import anomaly_engine
+from scheduler import rescore_scheduler
+from hot_window import hot_windows
+import columnar
+import plant_rollup
+import logging
+import numpy as np
+import metrics
+from metrics import stage, profiler
 
 load_dotenv()
 
-app = FastAPI(title="OpsSight AI - Risk Scoring Service", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'true').lower() == 'true'
+
+# Set once the lifespan finished warming up; /ready reports 503 until then
+_ready = False
+
+
+def _warm_up():
+    """
+    Pay first-use costs before the first request does: open the pool's
+    initial connections and run the scoring path (features, rules, model,
+    response serialization) once over a synthetic window.
+    """
+    started = time.perf_counter()
+    try:
+        db.ping()
+    except Exception as e:
+        logger.warning("Database not reachable during warm-up: %s", e)
+    
+    sensor_types = ['temperature', 'vibration', 'pressure']
+    window = {
+        'time': np.arange(300, dtype=np.int64).view('datetime64[us]'),
+        'sensor_type': np.repeat(np.array(sensor_types, dtype=object), 100),
+        'value': np.tile(np.linspace(50.0, 60.0, 100), 3)
+    }
+    risk_score = risk_engine.score_sensor_data('warm-up', 'default', window)
+    RiskCalculationResponse(success=True, risk_score=risk_score).model_dump_json()
+    logger.info("Warm-up finished in %.1f ms", (time.perf_counter() - started) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _ready
+    loop = asyncio.get_running_loop()
+    if risk_engine.scoring_mode == 'model':
+        # Load and warm the model before serving; without one, scoring falls back to the rules
+        try:
+            await loop.run_in_executor(None, model_registry.load)
+        except Exception:
+            logger.exception("No risk model loaded from %s, scoring with rules", model_registry.path)
+    if STARTUP_WARMUP:
+        await loop.run_in_executor(None, _warm_up)
+    risk_writer.start()
+    await ingest_pipeline.start()
+    await rescore_scheduler.start()
+    _ready = True
+    yield
+    _ready = False
+    # Flush queued readings and buffered scores, then release pooled database connections
+    await rescore_scheduler.stop()
+    await ingest_pipeline.stop()
+    await asyncio.get_running_loop().run_in_executor(None, risk_writer.stop)
+    hot_windows.flush()
+    db.close()
+
+
+app = FastAPI(title="OpsSight AI - Risk Scoring Service", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -19,60 +104,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        # Test database connection
-        conn = db.get_connection()
-        conn.close()
+        # Test database connection through the shared pool
+        await db.run(db.ping)
         return {
             "status": "healthy",
             "service": "risk-scoring",
-            "database": "connected"
+            "database": "connected",
+            "pool": db.pool_stats()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "service": "risk-scoring",
             "database": "disconnected",
+            "pool": db.pool_stats(),
             "error": str(e)
         }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once startup warm-up finished and the database answers,
+    503 otherwise (unlike /health, which only reports liveness)
+    """
+    if not _ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "service": "risk-scoring"})
+    try:
+        await db.run(db.ping)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={
+            "status": "unavailable", "service": "risk-scoring", "database": "disconnected", "error": str(e)
+        })
+    return {"status": "ready", "service": "risk-scoring", "database": "connected"}
+
+
 @app.post("/api/risk/calculate", response_model=RiskCalculationResponse)
 async def calculate_risk(request: RiskCalculationRequest):
     """
     Calculate risk score for an asset
     """
     try:
-        # Verify asset exists
-        asset_info = db.get_asset_info(request.asset_id)
-        if not asset_info:
-            raise HTTPException(status_code=404, detail=f"Asset {request.asset_id} not found")
-        
-        # Calculate risk score
-        risk_score = risk_engine.calculate_risk_score(request.asset_id, request.asset_type)
-        
-        # Store risk score in database
-        risk_factors_data = [
-            {
-                'factor': rf.factor,
-                'contribution': rf.contribution,
-                'description': rf.description
-            }
-            for rf in risk_score.risk_factors
-        ]
-        
-        db.store_risk_score(
-            asset_id=risk_score.asset_id,
-            risk_score=risk_score.risk_score,
-            explanation=risk_score.explanation,
-            risk_factors=risk_factors_data,
-            confidence=risk_score.confidence
+        # Concurrent requests for the same asset share one fetch-compute-store run
+        risk_score, computed = await risk_flights.run(
+            (request.asset_id, request.asset_type), lambda: _calculate_risk(request)
         )
+        if request.sync_write and not computed:
+            # The shared score may still be in the write-behind buffer
+            with stage('store_risk_score'):
+                await db.run(risk_writer.flush)
         
         return RiskCalculationResponse(
             success=True,
@@ -88,6 +177,350 @@ async def calculate_risk(request: RiskCalculationRequest):
         )
 
 
+async def _calculate_risk(request: RiskCalculationRequest) -> RiskScore:
+    # Verify asset exists
+    with stage('get_asset_info'):
+        asset_info = await db.run(db.get_asset_info, request.asset_id)
+    if not asset_info:
+        raise HTTPException(status_code=404, detail=f"Asset {request.asset_id} not found")
+    
+    # Serve the cached score when no reading arrived since it was computed
+    with stage('get_latest_reading_time'):
+        latest_reading = await db.run(db.get_latest_reading_time, request.asset_id)
+    with stage('cache_lookup'):
+        cached = risk_cache.get(request.asset_id, request.asset_type, latest_reading)
+    if cached is not None:
+        return cached
+    
+    # Calculate risk score
+    with stage('calculate_risk_score'):
+        risk_score = await db.run(risk_engine.calculate_risk_score, request.asset_id, request.asset_type)
+    
+    # Store risk score in database (buffered unless the caller asked to wait)
+    with stage('store_risk_score'):
+        await db.run(risk_writer.submit, risk_score, sync=request.sync_write)
+    risk_cache.put(request.asset_type, latest_reading, risk_score)
+    rescore_scheduler.note_scores([(risk_score.asset_id, risk_score.risk_score)])
+    
+    return risk_score
+
+
+@app.post("/api/risk/calculate-batch", response_model=BatchRiskCalculationResponse)
+async def calculate_risk_batch(request: BatchRiskCalculationRequest, accept: Optional[str] = Header(default=None)):
+    """
+    Calculate risk scores for a set of assets with one fetch and one bulk write.
+    Results come back columnar when the Accept header asks for it (see `columnar`).
+    """
+    media_type = _columnar_media_type(accept)
+    try:
+        start = time.perf_counter()
+        asset_ids = list(dict.fromkeys(request.asset_ids))
+        assets = await db.run(db.get_assets_info, asset_ids)
+        return await db.run(_score_assets, assets, asset_ids, start, request.sync_write, media_type)
+    except Exception as e:
+        return BatchRiskCalculationResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+@app.post("/api/risk/plant/{plant_id}/calculate", response_model=BatchRiskCalculationResponse)
+async def calculate_plant_risk(plant_id: str, sync_write: bool = False,
+                               accept: Optional[str] = Header(default=None)):
+    """
+    Calculate risk scores for every active asset in a plant (columnar on
+    request, as for /api/risk/calculate-batch)
+    """
+    media_type = _columnar_media_type(accept)
+    try:
+        start = time.perf_counter()
+        assets = await db.run(db.get_plant_assets, plant_id)
+        if not assets:
+            raise HTTPException(status_code=404, detail=f"No active assets found for plant {plant_id}")
+        return await db.run(_score_assets, assets, [asset['id'] for asset in assets], start, sync_write,
+                            media_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return BatchRiskCalculationResponse(
+            success=False,
+            error=str(e)
+        )
+
+
+@app.post("/api/readings/stream", status_code=202)
+async def stream_readings(request: Request):
+    """
+    Ingest sensor readings and rescore the assets whose features moved.
+    
+    Accepts NDJSON (application/x-ndjson, streamed as it arrives) or a JSON
+    array / {"readings": [...]} batch. Returns 503 with Retry-After when the
+    ingest queue stays full.
+    """
+    content_type = request.headers.get('content-type', '')
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        records = iter_ndjson(request.stream())
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or NDJSON")
+        if isinstance(payload, dict):
+            payload = payload.get('readings', [])
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Expected a list of readings")
+        records = _iterate(payload)
+    
+    try:
+        summary = await ingest_pipeline.ingest(records)
+    except IngestBackpressureError as e:
+        return JSONResponse(
+            status_code=503,
+            headers={'Retry-After': '1'},
+            content={'success': False, 'error': str(e), **e.summary}
+        )
+    
+    return {'success': True, **summary}
+
+
+@app.post("/api/risk/sweep", status_code=202)
+async def start_sweep(request: SweepRequest):
+    """
+    Start a background process-pool rescoring sweep over a plant (or an
+    explicit list of assets); poll the returned job id for the result
+    """
+    if not request.plant_id and not request.asset_ids:
+        raise HTTPException(status_code=400, detail="plant_id or asset_ids is required")
+    # Imported on first use: the process-pool machinery is not needed to serve requests
+    from sweep import sweep_jobs
+    return sweep_jobs.start(
+        plant_id=request.plant_id,
+        asset_ids=request.asset_ids,
+        workers=request.workers,
+        chunk_size=request.chunk_size
+    )
+
+
+@app.get("/api/risk/sweep/{job_id}")
+async def get_sweep(job_id: str):
+    """Status and timings of a sweep job"""
+    from sweep import sweep_jobs
+    job = sweep_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Sweep job {job_id} not found")
+    return job
+
+
+@app.post("/api/forecast/plant/{plant_id}")
+async def forecast_plant(plant_id: str, store: bool = True, include_forecasts: bool = False):
+    """
+    Forecast every active asset of a plant from one risk history query and
+    bulk-write the forecasts (the nightly job runs the same code)
+    """
+    from forecasting_engine import run_forecast
+    result = await db.run(run_forecast, plant_id=plant_id, store=store)
+    if not result['total_assets']:
+        raise HTTPException(status_code=404, detail=f"No active assets found for plant {plant_id}")
+    if not include_forecasts:
+        result.pop('forecasts')
+    return {'success': True, **result}
+
+
+@app.get("/api/risk/plant/{plant_id}/rollup")
+async def get_plant_rollup(plant_id: str, refresh: bool = False):
+    """
+    Precomputed risk distribution, score histogram, top assets and 24h / 7d
+    changes of a plant's active assets, kept current by every score write
+    (refresh=true rebuilds it from the assets table first)
+    """
+    rollup = await db.run(db.get_plant_rollup, plant_id, refresh)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail=f"No active assets found for plant {plant_id}")
+    return {'success': True, **plant_rollup.format_rollup(rollup)}
+
+
+@app.get("/api/readings/stream/stats")
+async def stream_stats():
+    """Ingest queue depth and throughput counters"""
+    return ingest_pipeline.stats()
+
+
+@app.get("/api/risk/writes/stats")
+async def write_stats():
+    """Write-behind buffer depth, lag and flush counters"""
+    return risk_writer.stats()
+
+
+@app.get("/api/risk/model")
+async def model_status():
+    """Scoring mode, the active model version and the versions on disk"""
+    return {'scoring_mode': risk_engine.scoring_mode, **model_registry.status()}
+
+
+@app.post("/api/risk/model/reload")
+async def reload_model(version: Optional[str] = None):
+    """Load and activate a model version (default: the pinned or newest one)"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, model_registry.load, version)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to load model: {e}")
+    return {'scoring_mode': risk_engine.scoring_mode, **model_registry.status()}
+
+
+@app.get("/api/risk/scheduler/stats")
+async def scheduler_stats():
+    """Tracked assets per risk level, overdue assets and rescoring throughput"""
+    return rescore_scheduler.stats()
+
+
+@app.get("/api/risk/hot-window/stats")
+async def hot_window_stats():
+    """Streams held in the memory-mapped hot window store"""
+    return hot_windows.stats()
+
+
+@app.get("/api/risk/coalescing/stats")
+async def coalescing_stats():
+    """How many score requests shared an in-flight or recent computation"""
+    return risk_flights.stats()
+
+
+@app.get("/api/risk/cache/stats")
+async def cache_stats():
+    """Risk score cache hit/miss/eviction counters"""
+    return risk_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text-format metrics"""
+    pool = db.pool_stats()
+    for state in ('in_use', 'available', 'waiting'):
+        metrics.POOL.labels(state).set(pool[state])
+    metrics.POOL.labels('max').set(pool['max_size'])
+    metrics.INGEST_QUEUE_DEPTH.set(ingest_pipeline.stats()['queue_depth'])
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.post("/debug/profiler/start")
+async def start_profiler(interval_ms: float = 10.0, duration_s: float = 60.0):
+    """
+    Start the sampling profiler (requires PROFILER_ENABLED=true); it stops
+    by itself after `duration_s` seconds
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiler is disabled (set PROFILER_ENABLED=true)")
+    if not 1.0 <= interval_ms <= 1000.0 or not 0 < duration_s <= 3600:
+        raise HTTPException(status_code=400, detail="interval_ms must be 1-1000 and duration_s 0-3600")
+    profiler.start(interval=interval_ms / 1000.0, duration=duration_s)
+    return profiler.status()
+
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    """Stop the sampling profiler, keeping the collected stacks"""
+    await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return profiler.status()
+
+
+@app.get("/debug/profiler")
+async def profiler_report():
+    """Collected stacks in collapsed format (flamegraph.pl / speedscope)"""
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiler is disabled (set PROFILER_ENABLED=true)")
+    return PlainTextResponse(profiler.collapsed())
+
+
+async def _iterate(items: List[Any]):
+    for item in items:
+        yield item
+
+
+def _columnar_media_type(accept: Optional[str]) -> Optional[str]:
+    """Columnar media type the client asked for; 406 when it cannot be produced here"""
+    media_type = columnar.negotiate(accept)
+    if media_type == columnar.ARROW_STREAM and not columnar.arrow_available():
+        raise HTTPException(status_code=406, detail=f"{columnar.ARROW_STREAM} requires pyarrow on the server")
+    return media_type
+
+
+def _score_assets(assets: List[Dict[str, Any]], requested_ids: List[str], start: float,
+                  sync_write: bool = False, media_type: Optional[str] = None) -> Any:
+    """
+    Score the given assets, bulk-store the results and build the batch
+    response, or its encoding as a columnar `media_type`
+    """
+    lookup_ms = (time.perf_counter() - start) * 1000
+    
+    batch = risk_engine.calculate_risk_scores_batch(assets, detect_anomalies=anomaly_engine.enabled)
+    scores = batch['scores']
+    compute_ms = batch['features_ms'] + sum(batch['compute_times'].values())
+    
+    store_start = time.perf_counter()
+    risk_writer.submit_many(scores.values(), sync=sync_write)
+    db.store_anomalies(batch['anomalies'])
+    rescore_scheduler.note_scores((asset_id, score.risk_score) for asset_id, score in scores.items())
+    store_ms = (time.perf_counter() - store_start) * 1000
+    
+    if media_type is not None:
+        summary = {
+            'success': True,
+            'total_assets': len(requested_ids),
+            'scored': len(scores),
+            'failed': len(requested_ids) - len(scores),
+            'anomalies_detected': len(batch['anomalies']),
+            'timings': {
+                'lookup_ms': round(lookup_ms, 3),
+                'fetch_ms': round(batch['fetch_ms'], 3),
+                'compute_ms': round(compute_ms, 3),
+                'store_ms': round(store_ms, 3),
+                'total_ms': round((time.perf_counter() - start) * 1000, 3)
+            }
+        }
+        columns = columnar.result_columns(requested_ids, scores, batch['errors'], batch['compute_times'])
+        return Response(columnar.encode(media_type, summary, columns), media_type=media_type,
+                        headers={'Vary': 'Accept'})
+    
+    results = []
+    for asset_id in requested_ids:
+        if asset_id in scores:
+            results.append(AssetRiskResult(
+                asset_id=asset_id,
+                success=True,
+                risk_score=scores[asset_id],
+                compute_ms=round(batch['compute_times'][asset_id], 3)
+            ))
+        elif asset_id in batch['errors']:
+            results.append(AssetRiskResult(
+                asset_id=asset_id,
+                success=False,
+                error=batch['errors'][asset_id],
+                compute_ms=round(batch['compute_times'][asset_id], 3)
+            ))
+        else:
+            results.append(AssetRiskResult(
+                asset_id=asset_id,
+                success=False,
+                error=f"Asset {asset_id} not found"
+            ))
+    
+    return BatchRiskCalculationResponse(
+        success=True,
+        total_assets=len(results),
+        scored=len(scores),
+        failed=len(results) - len(scores),
+        anomalies_detected=len(batch['anomalies']),
+        results=results,
+        timings=BatchTimings(
+            lookup_ms=round(lookup_ms, 3),
+            fetch_ms=round(batch['fetch_ms'], 3),
+            compute_ms=round(compute_ms, 3),
+            store_ms=round(store_ms, 3),
+            total_ms=round((time.perf_counter() - start) * 1000, 3)
+        )
+    )
+
+
 @app.get("/")
 async def root():
     return {
@@ -98,5 +531,6 @@ async def root():
 
 
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.getenv("SERVICE_PORT", 5000))
     uvicorn.run(app, host="0.0.0.0", port=port)
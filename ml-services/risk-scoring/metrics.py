@@ -0,0 +1,426 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock
+per labelled child, so recording a sample costs a couple of microseconds and
+can stay on in production. Everything is rendered on demand by `/metrics`.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter as Tally
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric(ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    def labels(self, *values: str):
+        """Child metric for one combination of label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            child = self._children.get(key)
+            if child is None:
+                if len(key) != len(self.labelnames):
+                    raise ValueError(f"{self.name} expects labels {self.labelnames}")
+                with self._lock:
+                    child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name: str, labelnames: Sequence[str], key: Tuple[str, ...]) -> List[str]:
+        return [f'{name}{_label_text(labelnames, key)} {_format_value(self.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Per-bucket (not cumulative) counts, the last slot is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name: str, labelnames: Sequence[str], key: Tuple[str, ...]) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.bounds, math.inf), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f'{name}_bucket{_label_text(labelnames, key, le)} {cumulative}')
+        lines.append(f'{name}_sum{_label_text(labelnames, key)} {_format_value(total)}')
+        lines.append(f'{name}_count{_label_text(labelnames, key)} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    'risk_stage_duration_seconds', 'Time spent in each stage of the scoring hot path', ['stage']))
+DB_QUERIES = REGISTRY.register(Counter(
+    'risk_db_queries_total', 'Database calls by query', ['query']))
+DB_ERRORS = REGISTRY.register(Counter(
+    'risk_db_query_errors_total', 'Database calls that raised, by query', ['query']))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'risk_db_query_duration_seconds', 'Database call duration including pool wait', ['query']))
+DB_ROWS = REGISTRY.register(Histogram(
+    'risk_db_rows_fetched', 'Rows returned per database call', ['query'], buckets=ROW_BUCKETS))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'risk_http_requests_total', 'HTTP requests by route and status', ['method', 'route', 'status']))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    'risk_http_request_duration_seconds', 'HTTP request duration by route', ['method', 'route']))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'risk_http_requests_in_flight', 'HTTP requests currently being served', ['route']))
+POOL = REGISTRY.register(Gauge(
+    'risk_db_pool_connections', 'Database pool connections by state', ['state']))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'risk_cache_lookups_total', 'Risk score cache lookups by result', ['result']))
+INGEST_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'risk_ingest_queue_depth', 'Ingest batches waiting to be processed'))
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: _HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+_stage_histograms: Dict[str, _HistogramValue] = {}
+
+
+def stage(name: str):
+    """Context manager timing one stage of the hot path into risk_stage_duration_seconds"""
+    if not ENABLED:
+        return _NULL_TIMER
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms[name] = STAGE_DURATION.labels(name)
+    return _StageTimer(histogram)
+
+
+def _row_count(result: Any) -> int:
+    """Rows in a database call's result: lists of rows, column dicts or per-asset groups"""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        if 'value' in result and hasattr(result['value'], '__len__'):
+            return len(result['value'])
+        if all(isinstance(group, list) for group in result.values()):
+            return sum(len(group) for group in result.values())
+    if isinstance(result, int):
+        return result
+    return 1
+
+
+def instrument_query(name: str, count_rows: bool = True) -> Callable:
+    """Decorator recording a database call's count, duration, errors and rows returned"""
+    def decorator(func: Callable) -> Callable:
+        if not ENABLED:
+            return func
+        queries = DB_QUERIES.labels(name)
+        errors = DB_ERRORS.labels(name)
+        duration = DB_QUERY_DURATION.labels(name)
+        rows = DB_ROWS.labels(name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+                queries.inc()
+            if count_rows:
+                rows.observe(_row_count(result))
+            return result
+        return wrapper
+    return decorator
+
+
+# Hot endpoints with their own in-flight gauge; everything else shares 'all'
+_IN_FLIGHT_PATHS = frozenset({'/api/risk/calculate', '/api/risk/calculate-batch', '/api/readings/stream'})
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests, their duration and the number in
+    flight, labelled by route template so path parameters don't explode
+    label cardinality.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._templates: Dict[Any, str] = {}
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        route = scope.get('route')
+        if route is not None and hasattr(route, 'path'):
+            return route.path
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        template = self._templates.get(endpoint)
+        if template is None:
+            template = next(
+                (r.path for r in getattr(scope.get('app'), 'routes', []) if getattr(r, 'endpoint', None) is endpoint),
+                'unmatched'
+            )
+            self._templates[endpoint] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        in_flight = HTTP_IN_FLIGHT.labels(scope['path'] if scope['path'] in _IN_FLIGHT_PATHS else 'all')
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            route = self._route(scope)
+            HTTP_DURATION.labels(scope['method'], route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope['method'], route, str(status)).inc()
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler: a background thread snapshots every
+    thread's stack at a fixed interval and tallies them in collapsed-stack
+    format (one line per stack, ready for flamegraph.pl / speedscope).
+    Nothing runs while it is stopped.
+    """
+
+    def __init__(self):
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+        self.samples = 0
+        self._stacks: Tally = Tally()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, duration: Optional[float] = None):
+        """Start sampling every `interval` seconds, optionally stopping after `duration` seconds"""
+        with self._lock:
+            if self.running:
+                return
+            self.interval = interval
+            self.started_at = time.time()
+            self.samples = 0
+            self._stacks = Tally()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self, duration: Optional[float]):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        while not self._stop.wait(self.interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self._stacks[';'.join(_frame_names(frame))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'interval_seconds': self.interval,
+            'started_at': self.started_at,
+            'samples': self.samples,
+            'distinct_stacks': len(self._stacks)
+        }
+
+
+def _frame_names(frame: Any) -> Iterator[str]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return reversed(stack)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,253 @@
+"""
+Versioned risk models on local disk, and micro-batched inference.
+
+Each version lives in its own directory under MODEL_PATH:
+
+    MODEL_PATH/
+        1.1.0/
+            manifest.json
+            model.json          (XGBoost) or model.joblib (scikit-learn)
+
+manifest.json describes how to use the model:
+
+    {
+        "framework": "xgboost",            # or "sklearn"
+        "file": "model.json",
+        "features": ["temperature_mean", "temperature_max", ...],
+        "output": "probability",           # or "score" (already 0-100)
+        "missing": null                    # value for absent features, NaN when null
+    }
+
+Feature vectors are built from `extract_statistical_features` output in the
+manifest's feature order. RISK_MODEL_VERSION pins
+a version, otherwise the highest version number is used.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import REGISTRY, ROW_BUCKETS, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+FRAMEWORKS = ('xgboost', 'sklearn')
+
+PREDICT_BATCH_ROWS = REGISTRY.register(Histogram(
+    'risk_model_batch_rows', 'Feature vectors per model predict call', buckets=ROW_BUCKETS))
+PREDICT_DURATION = REGISTRY.register(Histogram(
+    'risk_model_predict_seconds', 'Duration of one model predict call'))
+PREDICT_ERRORS = REGISTRY.register(Counter(
+    'risk_model_predict_errors_total', 'Model predict calls that raised'))
+
+
+def _version_key(version: str) -> Tuple:
+    # Numeric parts compare as numbers, so 1.10.0 sorts after 1.9.0
+    return tuple((0, int(part)) if part.isdigit() else (1, part) for part in re.split(r'[.\-_]', version.lstrip('v')))
+
+
+class RiskModel:
+    """A loaded model version and the feature layout it was trained on"""
+
+    def __init__(self, version: str, framework: str, features: List[str], output: str, estimator: Any,
+                 missing: float = math.nan):
+        self.version = version
+        self.framework = framework
+        self.features = features
+        self.output = output
+        self.estimator = estimator
+        self.missing = missing
+
+    @classmethod
+    def load(cls, directory: str) -> 'RiskModel':
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        framework = manifest.get('framework')
+        if framework not in FRAMEWORKS:
+            raise ValueError(f"{directory}: framework must be one of {FRAMEWORKS}, got {framework!r}")
+        features = manifest.get('features')
+        if not features or not isinstance(features, list):
+            raise ValueError(f"{directory}: manifest needs a non-empty 'features' list")
+        output = manifest.get('output', 'probability')
+        if output not in ('probability', 'score'):
+            raise ValueError(f"{directory}: output must be 'probability' or 'score'")
+
+        path = os.path.join(directory, manifest.get('file', 'model.json' if framework == 'xgboost' else 'model.joblib'))
+        missing = manifest.get('missing')
+        return cls(os.path.basename(os.path.normpath(directory)), framework, features, output,
+                   _load_estimator(framework, path), math.nan if missing is None else float(missing))
+
+    def vectorize(self, features_list: Sequence[Mapping[str, float]]) -> np.ndarray:
+        """Feature dicts -> (n, len(features)) float64 matrix in the manifest's feature order"""
+        return np.array(
+            [[features.get(name, self.missing) for name in self.features] for features in features_list],
+            dtype=np.float64
+        ).reshape(len(features_list), len(self.features))
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """Risk scores (0-100) for every row of a feature matrix"""
+        start = time.perf_counter()
+        try:
+            if self.framework == 'xgboost':
+                raw = np.asarray(self.estimator.inplace_predict(matrix), dtype=np.float64)
+            elif self.output == 'probability' and hasattr(self.estimator, 'predict_proba'):
+                raw = np.asarray(self.estimator.predict_proba(matrix), dtype=np.float64)[:, -1]
+            else:
+                raw = np.asarray(self.estimator.predict(matrix), dtype=np.float64)
+        except Exception:
+            PREDICT_ERRORS.inc()
+            raise
+        finally:
+            PREDICT_BATCH_ROWS.observe(len(matrix))
+            PREDICT_DURATION.observe(time.perf_counter() - start)
+        scores = raw.reshape(len(matrix)) * (100.0 if self.output == 'probability' else 1.0)
+        return np.clip(scores, 0.0, 100.0)
+
+
+def _load_estimator(framework: str, path: str) -> Any:
+    if framework == 'xgboost':
+        try:
+            import xgboost
+        except ImportError:
+            raise RuntimeError("xgboost models require the 'xgboost' package")
+        booster = xgboost.Booster()
+        booster.load_model(path)
+        return booster
+    try:
+        import joblib
+    except ImportError:
+        raise RuntimeError("scikit-learn models require the 'scikit-learn' package")
+    return joblib.load(path)
+
+
+class ModelRegistry:
+    """
+    Model versions under one directory. The active model is loaded once
+    (explicitly at startup, or on first use in worker processes) and warmed
+    with a dummy prediction so the first request does not pay for lazy
+    initialization inside the framework.
+    """
+
+    def __init__(self, path: str, version: Optional[str] = None):
+        self.path = path
+        self.version = version
+        self.active: Optional[RiskModel] = None
+        self.error: Optional[str] = None
+        self._attempted = False
+        self._lock = threading.Lock()
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            (name for name in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, name, MANIFEST))),
+            key=_version_key
+        )
+
+    def load(self, version: Optional[str] = None) -> RiskModel:
+        """Load and warm a version (default: the pinned or newest one) and make it active"""
+        with self._lock:
+            self._attempted = True
+            try:
+                version = version or self.version or (self.versions() or [None])[-1]
+                if version is None:
+                    raise FileNotFoundError(f"no model versions found under {self.path}")
+                model = RiskModel.load(os.path.join(self.path, version))
+                model.predict(model.vectorize([{}]))
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.active, self.error = model, None
+        logger.info("Loaded %s risk model %s with %d features", model.framework, model.version, len(model.features))
+        return model
+
+    def get(self) -> Optional[RiskModel]:
+        """The active model, loading it on first use; None when no model can be loaded"""
+        if self.active is None and not self._attempted:
+            try:
+                self.load()
+            except Exception:
+                logger.exception("Failed to load a risk model from %s, scoring with rules", self.path)
+        return self.active
+
+    def status(self) -> Dict[str, Any]:
+        model = self.active
+        return {
+            'path': self.path,
+            'pinned_version': self.version,
+            'versions': self.versions(),
+            'active_version': model.version if model else None,
+            'framework': model.framework if model else None,
+            'features': model.features if model else [],
+            'error': self.error
+        }
+
+
+class PredictionBatcher:
+    """
+    Coalesces single-row predictions from concurrent threads into one
+    `predict` call. The first queued row waits at most `max_wait` seconds
+    for others to join, up to `max_batch` rows per call.
+    """
+
+    def __init__(self, max_batch: int = 256, max_wait: float = 0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[RiskModel, np.ndarray, Future]] = []
+        self._ready = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def predict(self, model: RiskModel, vector: np.ndarray) -> float:
+        future: Future = Future()
+        with self._ready:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='risk-model-batcher', daemon=True)
+                self._thread.start()
+            self._pending.append((model, vector, future))
+            self._ready.notify()
+        return future.result()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._pending:
+                    self._ready.wait()
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+
+            # A reload can leave rows for two versions in one batch
+            by_model: Dict[int, List[Tuple[RiskModel, np.ndarray, Future]]] = {}
+            for item in batch:
+                by_model.setdefault(id(item[0]), []).append(item)
+            for items in by_model.values():
+                try:
+                    scores = items[0][0].predict(np.vstack([vector for _, vector, _ in items]))
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), score in zip(items, scores.tolist()):
+                    future.set_result(score)
+
+
+model_registry = ModelRegistry(
+    path=os.getenv('MODEL_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'),
+    version=os.getenv('RISK_MODEL_VERSION') or None
+)
+prediction_batcher = PredictionBatcher(
+    max_batch=int(os.getenv('MODEL_MAX_BATCH', 256)),
+    max_wait=float(os.getenv('MODEL_BATCH_WAIT_MS', 2)) / 1000
+)
@@ -23,14 +23,56 @@ class RiskScore(BaseModel):
     explanation: str
     risk_factors: List[RiskFactor]
     confidence: float = Field(ge=0, le=1)
+    model_version: str = '1.0.0'
 
 
 class RiskCalculationRequest(BaseModel):
     asset_id: str
     asset_type: str
+    # Wait for the score to be committed instead of leaving it to the write-behind buffer
+    sync_write: bool = False
 
 
 class RiskCalculationResponse(BaseModel):
     success: bool
     risk_score: Optional[RiskScore] = None
     error: Optional[str] = None
+
+
+class BatchRiskCalculationRequest(BaseModel):
+    asset_ids: List[str] = Field(min_length=1)
+    sync_write: bool = False
+
+
+class AssetRiskResult(BaseModel):
+    asset_id: str
+    success: bool
+    risk_score: Optional[RiskScore] = None
+    error: Optional[str] = None
+    compute_ms: Optional[float] = None
+
+
+class BatchTimings(BaseModel):
+    lookup_ms: float
+    fetch_ms: float
+    compute_ms: float
+    store_ms: float
+    total_ms: float
+
+
+class BatchRiskCalculationResponse(BaseModel):
+    success: bool
+    total_assets: int = 0
+    scored: int = 0
+    failed: int = 0
+    anomalies_detected: int = 0
+    results: List[AssetRiskResult] = []
+    timings: Optional[BatchTimings] = None
+    error: Optional[str] = None
+
+
+class SweepRequest(BaseModel):
+    plant_id: Optional[str] = None
+    asset_ids: Optional[List[str]] = None
+    workers: Optional[int] = Field(default=None, ge=1)
+    chunk_size: Optional[int] = Field(default=None, ge=1)
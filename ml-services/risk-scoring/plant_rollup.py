@@ -0,0 +1,150 @@
+"""
+Plant-level risk rollups for executive summaries.
+
+One row per plant in plant_risk_rollups holds what
+backend/src/services/executiveSummaryService.ts otherwise derives from
+every asset of the plant on each request: the number of active assets,
+the sum of their current scores, a histogram of scores in 10-point
+buckets, counts per risk band and the top-N riskiest assets.
+
+Every score write moves its assets between buckets and bands, so
+`Database.store_risk_scores_batch` applies the per-plant differences
+computed here to the existing rows in the same transaction, and re-reads
+the top-N of the plants it touched through the (plant_id,
+current_risk_score) index. Rows are rebuilt from the assets table when
+missing, older than PLANT_ROLLUP_MAX_AGE_S (assets added, moved or
+decommissioned elsewhere) or on request. Hourly snapshots in
+plant_risk_rollup_history give the changes against 24 hours and 7 days ago.
+
+Bands follow the executive summary: low <= 30 < medium <= 60 < high <= 80 < critical.
+Assets without a score count as 0, as they do there.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+BANDS = ('low', 'medium', 'high', 'critical')
+BAND_LIMITS = np.array([30.0, 60.0, 80.0])
+BUCKET_WIDTH = 10
+BUCKETS = 10
+DELTA_PERIODS = {'24h': timedelta(hours=24), '7d': timedelta(days=7)}
+
+# (plant_id, status, previous score, new score) of one rescored asset
+Move = Tuple[str, Optional[str], Optional[float], Optional[float]]
+
+
+def band_index(scores: np.ndarray) -> np.ndarray:
+    return np.searchsorted(BAND_LIMITS, scores, side='left')
+
+
+def bucket_index(scores: np.ndarray) -> np.ndarray:
+    return np.clip(np.floor(scores / BUCKET_WIDTH), 0, BUCKETS - 1).astype(np.int64)
+
+
+def summarize(scores: Sequence[Optional[float]]) -> Dict[str, Any]:
+    """Rollup counts of a plant's active assets from their current scores"""
+    scores = np.array([score or 0.0 for score in scores], dtype=np.float64)
+    return {
+        'total_assets': len(scores),
+        'score_sum': round(float(scores.sum()), 2),
+        'histogram': np.bincount(bucket_index(scores), minlength=BUCKETS).tolist(),
+        'band_counts': np.bincount(band_index(scores), minlength=len(BANDS)).tolist()
+    }
+
+
+def rollup_deltas(moves: Sequence[Move]) -> List[Tuple[str, float, List[int], List[int]]]:
+    """
+    (plant_id, score_sum, histogram, band_counts) changes per plant for the
+    given moves of active assets, ordered by plant_id and omitting plants
+    left unchanged
+    """
+    moves = [move for move in moves if move[1] == 'active']
+    if not moves:
+        return []
+    plants = sorted({move[0] for move in moves})
+    position = {plant_id: index for index, plant_id in enumerate(plants)}
+    codes = np.array([position[move[0]] for move in moves], dtype=np.int64)
+    previous = np.array([move[2] or 0.0 for move in moves], dtype=np.float64)
+    new = np.array([move[3] or 0.0 for move in moves], dtype=np.float64)
+
+    score = np.bincount(codes, weights=new - previous, minlength=len(plants))
+    histogram = np.zeros((len(plants), BUCKETS), dtype=np.int64)
+    np.add.at(histogram, (codes, bucket_index(new)), 1)
+    np.add.at(histogram, (codes, bucket_index(previous)), -1)
+    bands = np.zeros((len(plants), len(BANDS)), dtype=np.int64)
+    np.add.at(bands, (codes, band_index(new)), 1)
+    np.add.at(bands, (codes, band_index(previous)), -1)
+
+    # Scores are stored with two decimals, so their sums are exact at two decimals
+    score = np.round(score, 2)
+    changed = (score != 0) | histogram.any(axis=1) | bands.any(axis=1)
+    return [
+        (plants[index], float(score[index]), histogram[index].tolist(), bands[index].tolist())
+        for index in np.flatnonzero(changed).tolist()
+    ]
+
+
+def asset_summary(asset: Mapping[str, Any]) -> Dict[str, Any]:
+    """An assets row in the executive summary's AssetRiskSummary shape"""
+    location = asset.get('location') or {}
+    return {
+        'assetId': str(asset['id']),
+        'assetName': asset.get('name'),
+        'assetType': asset.get('type'),
+        'riskScore': float(asset.get('current_risk_score') or 0.0),
+        'status': asset.get('status'),
+        'location': (location.get('building') if isinstance(location, dict) else None) or 'Unknown'
+    }
+
+
+def _mean(total_assets: int, score_sum: float) -> float:
+    return score_sum / total_assets if total_assets else 0.0
+
+
+def _health(mean: float, total_assets: int) -> float:
+    return round((100 - mean) * 10) / 10 if total_assets else 100.0
+
+
+def format_rollup(rollup: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    API response for a rollup row from `Database.get_plant_rollup`, with the
+    change in each figure since the snapshot of every `DELTA_PERIODS` period
+    (None when there is no snapshot that old)
+    """
+    total = rollup['total_assets']
+    mean = _mean(total, rollup['score_sum'])
+    deltas: Dict[str, Optional[Dict[str, Any]]] = {}
+    for label in DELTA_PERIODS:
+        before = rollup['history'].get(label)
+        if before is None:
+            deltas[label] = None
+            continue
+        before_mean = _mean(before['total_assets'], before['score_sum'])
+        deltas[label] = {
+            'since': before['period_start'],
+            'total_assets': total - before['total_assets'],
+            'mean_risk_score': round(mean - before_mean, 2),
+            'overall_health_score': round(_health(mean, total) - _health(before_mean, before['total_assets']), 1),
+            'risk_distribution': {
+                band: now - then for band, now, then in zip(BANDS, rollup['band_counts'], before['band_counts'])
+            }
+        }
+
+    return {
+        'plant_id': rollup['plant_id'],
+        'total_assets': total,
+        'mean_risk_score': round(mean, 2),
+        'overall_health_score': _health(mean, total),
+        'risk_distribution': dict(zip(BANDS, rollup['band_counts'])),
+        'histogram': {'bucket_width': BUCKET_WIDTH, 'counts': list(rollup['histogram'])},
+        'top_assets': rollup['top_assets'],
+        'deltas': deltas,
+        'refreshed_at': rollup['refreshed_at'],
+        'updated_at': rollup['updated_at']
+    }
+
+
+def history_points(now: datetime) -> Dict[str, datetime]:
+    """The time each delta period looks back to"""
+    return {label: now - period for label, period in DELTA_PERIODS.items()}
@@ -0,0 +1,213 @@
+"""
+Per-sensor reading streams for scoring and exporting over history.
+
+A stream holds one (asset_id, sensor_type) pair's readings oldest first as
+(epoch microseconds, values). replay.py and feature_export.py cut the
+readings of each time slice into streams, append them to what the previous
+slice carried over and compute window statistics at every cadence tick.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from database import SensorColumns, db
+
+# A stream's readings as (epoch microseconds, values), oldest first
+Stream = Tuple[np.ndarray, np.ndarray]
+StreamKey = Tuple[str, str]
+
+
+def rolling_window_stats(times: np.ndarray, values: np.ndarray, ticks: np.ndarray,
+                         window: int) -> Dict[str, np.ndarray]:
+    """
+    Statistics of the last `window` readings at or before each tick, for one
+    stream sorted by time. Mean, std and trend come from prefix sums (of
+    values shifted by their mean, to keep cancellation small), min and max
+    from a gather of at most `window` values per tick.
+
+    Matches `extract_statistical_features` on the same readings: population
+    std and the trend measured newest-first.
+    """
+    n = len(values)
+    idx = np.searchsorted(times, ticks, side='right')
+    lo = np.maximum(idx - window, 0)
+
+    if n:
+        positions = idx[:, None] - window + np.arange(window)
+        valid = positions >= lo[:, None]
+        gathered = values[np.clip(positions, 0, n - 1)]
+        maximum = np.where(valid, gathered, -np.inf).max(axis=1)
+        minimum = np.where(valid, gathered, np.inf).min(axis=1)
+    else:
+        maximum = minimum = np.full(len(ticks), np.nan)
+
+    return _range_stats(_prefix_sums(values), lo, idx, minimum, maximum)
+
+
+def time_window_stats(times: np.ndarray, values: np.ndarray, ticks: np.ndarray,
+                      lengths: Dict[str, int], limit: int) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Statistics per window label of the readings in (tick - length, tick] at
+    each tick, for one stream sorted by time, with lengths in microseconds.
+    At most the newest `limit` readings within the longest window count, as
+    in `RiskEngine.window_features`, so these match `extract_window_features`.
+    Min and max over the spans come from a sparse table.
+    """
+    idx = np.searchsorted(times, ticks, side='right')
+    sums = _prefix_sums(values)
+    table = _sparse_table(values)
+    stats = {}
+    for label, length in lengths.items():
+        lo = np.maximum(np.searchsorted(times, ticks - length, side='right'), idx - limit)
+        lo = np.minimum(lo, idx)
+        minimum, maximum = _range_extremes(table, lo, idx)
+        stats[label] = _range_stats(sums, lo, idx, minimum, maximum)
+    return stats
+
+
+def _prefix_sums(values: np.ndarray) -> Tuple[float, np.ndarray, np.ndarray, np.ndarray]:
+    n = len(values)
+    shift = values.mean() if n else 0.0
+    shifted = values - shift
+    return (
+        shift,
+        np.concatenate(([0.0], np.cumsum(shifted))),
+        np.concatenate(([0.0], np.cumsum(shifted * shifted))),
+        np.concatenate(([0.0], np.cumsum(np.arange(n) * shifted)))
+    )
+
+
+def _range_stats(sums: Tuple[float, np.ndarray, np.ndarray, np.ndarray], lo: np.ndarray, hi: np.ndarray,
+                 minimum: np.ndarray, maximum: np.ndarray) -> Dict[str, np.ndarray]:
+    """Statistics of the readings [lo, hi) of one stream from its prefix sums"""
+    shift, p1, p2, pi = sums
+    count = (hi - lo).astype(np.float64)
+    s1 = p1[hi] - p1[lo]
+    s2 = p2[hi] - p2[lo]
+    # Sum of position-in-window * value, with positions counted from the window start
+    sxv = pi[hi] - pi[lo] - lo * s1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shifted_mean = s1 / count
+        std = np.sqrt(np.maximum(s2 / count - shifted_mean * shifted_mean, 0.0))
+        mean = shifted_mean + shift
+        sxy = sxv - (count - 1) / 2.0 * s1
+        sxx = count * (count * count - 1) / 12.0
+        # Chronological slope, negated because features count positions newest first
+        trend = np.where(count > 1, -sxy / sxx, np.nan)
+        cv = np.where(mean != 0, std / mean, np.nan)
+
+    return {
+        'count': count,
+        'mean': mean,
+        'std': std,
+        'min': minimum,
+        'max': maximum,
+        'range': maximum - minimum,
+        'trend': trend,
+        'cv': cv
+    }
+
+
+def _sparse_table(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Min and max of values[i:i + 2**k] in row k, for range queries in constant time"""
+    n = len(values)
+    levels = max(int(n).bit_length(), 1)
+    minimum = np.full((levels, n), np.inf)
+    maximum = np.full((levels, n), -np.inf)
+    minimum[0], maximum[0] = values, values
+    for k in range(1, levels):
+        half = 1 << (k - 1)
+        width = n - (1 << k) + 1
+        minimum[k, :width] = np.minimum(minimum[k - 1, :width], minimum[k - 1, half:half + width])
+        maximum[k, :width] = np.maximum(maximum[k - 1, :width], maximum[k - 1, half:half + width])
+    return minimum, maximum
+
+
+def _range_extremes(table: Tuple[np.ndarray, np.ndarray], lo: np.ndarray,
+                    hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Min and max of each range [lo, hi), NaN where it is empty"""
+    minimum, maximum = table
+    length = hi - lo
+    if not minimum.shape[1]:
+        return np.full(len(lo), np.nan), np.full(len(lo), np.nan)
+    # Two overlapping power-of-two blocks cover each range; k = floor(log2(length))
+    k = np.frexp(np.maximum(length, 1))[1].astype(np.int64) - 1
+    last = np.maximum(hi - (1 << k), 0)
+    first = np.minimum(lo, minimum.shape[1] - 1)
+    low = np.minimum(minimum[k, first], minimum[k, last])
+    high = np.maximum(maximum[k, first], maximum[k, last])
+    empty = length <= 0
+    return np.where(empty, np.nan, low), np.where(empty, np.nan, high)
+
+
+def split_streams(columns: SensorColumns) -> Dict[StreamKey, Stream]:
+    """Cut columns ordered by (asset, sensor type, time) into one stream per pair"""
+    assets, sensors = columns['asset_id'], columns['sensor_type']
+    if len(assets) == 0:
+        return {}
+    changes = np.flatnonzero((assets[1:] != assets[:-1]) | (sensors[1:] != sensors[:-1])) + 1
+    bounds = np.concatenate(([0], changes, [len(assets)]))
+    times = columns['time'].view(np.int64)
+    return {
+        (assets[first], sensors[first]): (times[first:last], columns['value'][first:last])
+        for first, last in zip(bounds[:-1], bounds[1:])
+    }
+
+
+def concat_columns(chunks: Iterator[SensorColumns]) -> SensorColumns:
+    """One set of reading columns from `Database.iter_sensor_readings` chunks"""
+    parts = list(chunks)
+    if not parts:
+        return {'asset_id': np.array([], dtype=object), 'sensor_type': np.array([], dtype=object),
+                'time': np.array([], dtype='datetime64[us]'), 'value': np.array([], dtype=np.float64)}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def merge_streams(carry: Dict[StreamKey, Stream], fresh: Dict[StreamKey, Stream]) -> Dict[StreamKey, Stream]:
+    """Append each stream's readings from the current slice to those carried over"""
+    streams = {}
+    for stream_key in carry.keys() | fresh.keys():
+        old_times, old_values = carry.get(stream_key, (np.empty(0, np.int64), np.empty(0)))
+        new_times, new_values = fresh.get(stream_key, (np.empty(0, np.int64), np.empty(0)))
+        streams[stream_key] = (np.concatenate((old_times, new_times)), np.concatenate((old_values, new_values)))
+    return streams
+
+
+def warmup(asset_ids: List[str], until: datetime, window: int, lookback: Optional[timedelta] = None,
+           limit: int = 0) -> Dict[StreamKey, Stream]:
+    """
+    The last `window` readings of every stream before `until`, oldest first,
+    extended to the last `limit` readings within `lookback` when given
+    """
+    streams = _window_streams(db.get_sensor_window_batch(asset_ids, per_sensor=window, until=until))
+    if lookback:
+        recent = _window_streams(db.get_sensor_window_batch(asset_ids, per_sensor=limit,
+                                                            since=until - lookback, until=until))
+        # Both are trailing runs of the same streams, so their union is the longer of the two
+        for stream_key, stream in recent.items():
+            if len(stream[0]) > len(streams.get(stream_key, ((),))[0]):
+                streams[stream_key] = stream
+    return streams
+
+
+def _window_streams(columns: SensorColumns) -> Dict[StreamKey, Stream]:
+    order = np.lexsort((columns['time'].view(np.int64), columns['sensor_type'].astype(str),
+                        columns['asset_id'].astype(str)))
+    return split_streams({name: column[order] for name, column in columns.items()})
+
+
+def carry_over(streams: Dict[StreamKey, Stream], window: int, since_us: Optional[int] = None,
+               limit: int = 0) -> Dict[StreamKey, Stream]:
+    """
+    What of each stream the next slice needs: its last `window` readings, or
+    its last `limit` readings after `since_us` when that is more
+    """
+    carried = {}
+    for stream_key, (times, values) in streams.items():
+        keep = window
+        if since_us is not None:
+            keep = max(keep, min(limit, len(times) - int(np.searchsorted(times, since_us, side='right'))))
+        carried[stream_key] = (times[-keep:], values[-keep:])
+    return carried
@@ -0,0 +1,231 @@
+"""
+Historical backfill of risk scores.
+
+Streams sensor_readings for a set of assets through a server-side cursor, one
+group of assets and one time slice at a time, computes the rolling-window
+features (and the window-qualified ones live scoring adds, e.g.
+temperature_max@1h) at every cadence tick with vectorized prefix sums and
+writes the resulting scores at their historical time. Progress is checkpointed after
+every slice, so an interrupted run picks up where it stopped; rows that were
+already written are skipped on conflict.
+
+Usage (from ml-services/risk-scoring):
+    python replay.py --plant PLANT-001 --start 2024-01-01 --end 2024-04-01 --every 1h
+                     [--asset ID ...] [--window 100] [--group-size 100] [--slice 1d]
+                     [--checkpoint replay.checkpoint.json] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database import db
+from feature_engineering import features_for_group, parse_duration
+from reading_streams import (
+    Stream,
+    StreamKey,
+    carry_over,
+    concat_columns,
+    merge_streams,
+    rolling_window_stats,
+    split_streams,
+    time_window_stats,
+    warmup
+)
+from risk_engine import risk_engine
+from rule_engine import rule_engine
+from timestamps import from_micros, parse_time, to_micros
+from write_behind import timed_record
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayCheckpoint:
+    """
+    Progress of one replay (identified by a hash of its parameters) as the
+    index of the asset group in progress and where its next slice starts.
+    """
+
+    def __init__(self, path: Optional[str], key: str):
+        self.path = path
+        self.key = key
+
+    def load(self) -> Tuple[int, Optional[int]]:
+        if not self.path or not os.path.exists(self.path):
+            return 0, None
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get('key') != self.key:
+            logger.warning("Ignoring checkpoint %s written for different replay parameters", self.path)
+            return 0, None
+        return state['group'], state.get('resume_at')
+
+    def save(self, group: int, resume_at: Optional[int], **extra):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'key': self.key, 'group': group, 'resume_at': resume_at, **extra}, f)
+        os.replace(temporary, self.path)
+
+
+def _score_slice(assets: List[Dict[str, Any]], streams: Dict[StreamKey, Stream],
+                 ticks: np.ndarray, window: int, windows: Optional[Dict[str, timedelta]] = None,
+                 window_limit: int = 0) -> List[Dict[str, Any]]:
+    """
+    Risk score records for every (asset, tick) with at least one reading in
+    its window, with the window-qualified features of `windows` (see
+    `RiskEngine.feature_windows`) as live scoring adds them
+    """
+    asset_types = {asset['id']: asset['type'] for asset in assets}
+    features: Dict[Tuple[str, int], Dict[str, float]] = {}
+    counts: Dict[Tuple[str, int], int] = {}
+    lengths = {label: length // timedelta(microseconds=1) for label, length in (windows or {}).items()}
+
+    for (asset_id, sensor_type), (times, values) in streams.items():
+        stats = rolling_window_stats(times, values, ticks, window)
+        for tick in np.flatnonzero(stats['count'] > 0).tolist():
+            asset_features = features.setdefault((asset_id, tick), {})
+            counts[(asset_id, tick)] = counts.get((asset_id, tick), 0) + int(stats['count'][tick])
+            for name in ('mean', 'std', 'min', 'max', 'range'):
+                asset_features[f'{sensor_type}_{name}'] = float(stats[name][tick])
+            if stats['count'][tick] > 1:
+                asset_features[f'{sensor_type}_trend'] = float(stats['trend'][tick])
+            if stats['mean'][tick] != 0:
+                asset_features[f'{sensor_type}_cv'] = float(stats['cv'][tick])
+
+    if lengths:
+        for (asset_id, sensor_type), (times, values) in streams.items():
+            for label, stats in time_window_stats(times, values, ticks, lengths, window_limit).items():
+                for tick in np.flatnonzero(stats['count'] > 0).tolist():
+                    if (asset_id, tick) in features:
+                        features_for_group(stats, tick, sensor_type, features[(asset_id, tick)], f'@{label}')
+
+    keys = sorted(features, key=lambda key: (key[1], key[0]))
+    factor_lists = rule_engine.evaluate_batch([features[key] for key in keys],
+                                              [asset_types[asset_id] for asset_id, _ in keys])
+    predictions = risk_engine.predict_batch([features[key] for key in keys])
+    records = []
+    for (asset_id, tick), factors, prediction in zip(keys, factor_lists, predictions):
+        score = risk_engine.score_features(asset_id, asset_types[asset_id], features[(asset_id, tick)],
+                                           counts[(asset_id, tick)], factors,
+                                           timestamp=from_micros(int(ticks[tick])), prediction=prediction)
+        records.append(timed_record(score))
+    return records
+
+
+def replay(start: datetime, end: datetime, every: timedelta, plant_id: Optional[str] = None,
+           asset_ids: Optional[List[str]] = None, window: Optional[int] = None,
+           group_size: int = 100, slice_length: timedelta = timedelta(days=1),
+           chunk_size: int = 50000, checkpoint_path: Optional[str] = None,
+           store: bool = True) -> Dict[str, Any]:
+    """
+    Backfill risk scores every `every` over [start, end) for a plant's active
+    assets (or an explicit list). Memory is bounded by the readings of
+    `group_size` assets over one `slice_length`. The checkpoint is only
+    used when scores are stored.
+    """
+    window = window or risk_engine.window_per_sensor
+    if end <= start:
+        raise ValueError("end must be after start")
+
+    assets = db.get_assets_info(asset_ids) if asset_ids else db.get_plant_assets(plant_id)
+    assets = sorted(assets, key=lambda asset: asset['id'])
+    groups = [assets[first:first + group_size] for first in range(0, len(assets), group_size)]
+
+    key = hashlib.sha1(json.dumps([
+        [asset['id'] for asset in assets], start.isoformat(), end.isoformat(),
+        every.total_seconds(), window, group_size, slice_length.total_seconds()
+    ]).encode('utf-8')).hexdigest()
+    # Dry runs write nothing, so they neither resume from nor record progress
+    checkpoint = ReplayCheckpoint(checkpoint_path if store else None, key)
+    first_group, resume_at = checkpoint.load()
+    if first_group >= len(groups) and groups:
+        logger.info("Replay already completed according to %s", checkpoint_path)
+    elif first_group or resume_at:
+        logger.info("Resuming replay at group %d/%d", first_group + 1, len(groups))
+
+    start_us, end_us, every_us = to_micros(start), to_micros(end), every // timedelta(microseconds=1)
+    slice_us = slice_length // timedelta(microseconds=1)
+    windows = risk_engine.feature_windows()
+    lookback = max(windows.values()) if windows else None
+    lookback_us = lookback // timedelta(microseconds=1) if lookback else None
+    window_limit = risk_engine.window_feature_limit
+    stats = {'assets': len(assets), 'groups': len(groups), 'slices': 0, 'readings': 0,
+             'scores': 0, 'inserted': 0}
+    started = time.perf_counter()
+
+    for group_index in range(first_group, len(groups)):
+        group = groups[group_index]
+        group_ids = [asset['id'] for asset in group]
+        slice_start = resume_at if group_index == first_group and resume_at else start_us
+        carry = warmup(group_ids, from_micros(slice_start), window, lookback, window_limit)
+
+        while slice_start < end_us:
+            slice_end = min(slice_start + slice_us, end_us)
+            first_tick = start_us + -(-(slice_start - start_us) // every_us) * every_us
+            ticks = np.arange(first_tick, slice_end, every_us, dtype=np.int64)
+
+            columns = concat_columns(db.iter_sensor_readings(
+                group_ids, from_micros(slice_start), from_micros(slice_end), chunk_size=chunk_size))
+            streams = merge_streams(carry, split_streams(columns))
+
+            records = _score_slice(group, streams, ticks, window, windows, window_limit) if len(ticks) else []
+            if store and records:
+                stats['inserted'] += db.store_historical_risk_scores(records)
+
+            stats['slices'] += 1
+            stats['readings'] += len(columns['value'])
+            stats['scores'] += len(records)
+            # Only the trailing windows are needed to continue into the next slice
+            carry = carry_over(streams, window, slice_end - lookback_us if lookback_us else None, window_limit)
+            slice_start = slice_end
+            checkpoint.save(group_index, slice_start)
+            logger.info("group %d/%d up to %s: %d readings, %d scores",
+                        group_index + 1, len(groups), from_micros(slice_start).isoformat(),
+                        len(columns['value']), len(records))
+
+        checkpoint.save(group_index + 1, None)
+
+    checkpoint.save(len(groups), None, completed=True)
+    stats['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Backfill historical risk scores from sensor_readings")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--plant', help="plant_id whose active assets to replay")
+    target.add_argument('--asset', action='append', help="Asset id to replay (repeatable)")
+    parser.add_argument('--start', required=True, type=parse_time, help="Start of the range (ISO-8601, UTC if naive)")
+    parser.add_argument('--end', required=True, type=parse_time, help="End of the range, exclusive")
+    parser.add_argument('--every', default='1h', type=parse_duration, help="Scoring cadence (default: 1h)")
+    parser.add_argument('--window', type=int, default=None,
+                        help="Readings per sensor type in each window (default: SENSOR_WINDOW_PER_TYPE)")
+    parser.add_argument('--group-size', type=int, default=100, help="Assets read together (default: 100)")
+    parser.add_argument('--slice', default='1d', type=parse_duration, help="Time read per query (default: 1d)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per cursor fetch (default: 50000)")
+    parser.add_argument('--checkpoint', default='replay.checkpoint.json',
+                        help="Progress file for resuming (default: replay.checkpoint.json)")
+    parser.add_argument('--dry-run', action='store_true', help="Compute scores without writing them")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s', stream=sys.stderr)
+    try:
+        stats = replay(args.start, args.end, args.every, plant_id=args.plant, asset_ids=args.asset,
+                       window=args.window, group_size=args.group_size, slice_length=args.slice,
+                       chunk_size=args.chunk_size, checkpoint_path=args.checkpoint, store=not args.dry_run)
+    finally:
+        db.close()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,44 @@
+import logging
 import numpy as np
-from typing import Dict, Any, List
-from datetime import datetime
-from database import db
-from feature_engineering import extract_statistical_features, calculate_risk_factors
+import os
+import time
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from database import SensorColumns, db
+from feature_store import feature_store
+from feature_engineering import (
+    extract_statistical_features,
+    extract_statistical_features_batch,
+    extract_rollup_features,
+    extract_window_features,
+    calculate_risk_factors,
+    parse_duration
+)
 from models import RiskScore, RiskFactor
+from rule_engine import rule_engine
+from model_registry import model_registry, prediction_batcher
+from metrics import stage
+from anomaly_engine import anomaly_engine
+from hot_window import hot_windows
+
+logger = logging.getLogger(__name__)
+
+# model_version stored with scores computed by the rule engine
+RULES_MODEL_VERSION = '1.0.0'
+
+# (risk score, model version) predicted for one asset
+Prediction = Tuple[float, str]
+
+
+def risk_band(risk_score: float) -> str:
+    """Risk level of a score: LOW (<30), MEDIUM (<60), HIGH (<80) or CRITICAL"""
+    if risk_score < 30:
+        return "LOW"
+    if risk_score < 60:
+        return "MEDIUM"
+    if risk_score < 80:
+        return "HIGH"
+    return "CRITICAL"
 
 
 class RiskEngine:
@@ -19,82 +54,411 @@ class RiskEngine:
             'pump': 15.0,
             'default': 20.0
         }
+        self.use_feature_store = os.getenv('FEATURE_STORE_ENABLED', 'true').lower() == 'true'
+        self.delta_fetch_limit = int(os.getenv('FEATURE_STORE_DELTA_LIMIT', 1000))
+        self.window_per_sensor = int(os.getenv('SENSOR_WINDOW_PER_TYPE', 100))
+        # 'rules' (threshold rules) or 'model' (the active model in the registry, rules as fallback)
+        self.scoring_mode = os.getenv('RISK_SCORING_MODE', 'rules').lower()
+        # A time window (e.g. 24h, 7d) scores from the sensor rollups instead of the last readings
+        window = os.getenv('RISK_FEATURE_WINDOW')
+        self.rollup_window: Optional[timedelta] = parse_duration(window) if window else None
+        # Windows (e.g. 5m,1h,24h,7d) to add qualified features like temperature_max@1h for, on
+        # top of the windows the risk rules reference; all are computed from one fetch
+        self.extra_feature_windows = [label.strip() for label in os.getenv('RISK_FEATURE_WINDOWS', '').split(',')
+                                      if label.strip()]
+        for label in self.extra_feature_windows:
+            parse_duration(label)
+        # Cap on the readings per sensor fetched for the longest window
+        self.window_feature_limit = int(os.getenv('RISK_FEATURE_WINDOWS_LIMIT', 20000))
+        self._window_labels: Tuple[str, ...] = ()
+        self._windows: Dict[str, timedelta] = {}
+    
+    @property
+    def rollup_resolution(self) -> str:
+        """Minute buckets up to a few hours, hour buckets beyond"""
+        return '1m' if self.rollup_window <= timedelta(hours=6) else '1h'
     
     def calculate_risk_score(self, asset_id: str, asset_type: str) -> RiskScore:
         """
         Calculate risk score for an asset based on recent sensor data
         """
-        # Fetch sensor data
-        sensor_data = db.get_sensor_data(asset_id, limit=100)
+        if self.rollup_window is not None:
+            return self._calculate_from_rollups(asset_id, asset_type)
         
-        if not sensor_data:
-            # No data available, return baseline risk
-            base_risk = self.base_risk_scores.get(asset_type, self.base_risk_scores['default'])
-            return RiskScore(
-                asset_id=asset_id,
-                risk_score=base_risk,
-                timestamp=datetime.now(),
-                explanation=f"Baseline risk score for {asset_type}. No sensor data available yet.",
-                risk_factors=[],
-                confidence=0.3
+        if self.use_feature_store:
+            return self._calculate_from_feature_store(asset_id, asset_type)
+        
+        # Fetch the recent window of every sensor type
+        with stage('fetch_sensor_data'):
+            sensor_data = self.fetch_window(asset_id)
+        if not len(sensor_data['value']):
+            return self.baseline_risk_score(asset_id, asset_type)
+        
+        with stage('extract_features'):
+            features = extract_statistical_features(sensor_data)
+        self._add_window_features({asset_id: features})
+        return self.score_features(asset_id, asset_type, features, len(sensor_data['value']))
+    
+    def _calculate_from_feature_store(self, asset_id: str, asset_type: str) -> RiskScore:
+        """
+        Score from the incremental feature store, fetching only readings newer
+        than the asset's high-water mark. The window is seeded from a full
+        fetch the first time an asset is seen, or when too many readings
+        arrived to catch up incrementally.
+        """
+        high_water = feature_store.high_water_mark(asset_id)
+        if feature_store.has(asset_id) and high_water is not None:
+            with stage('fetch_sensor_delta'):
+                new_readings = db.get_sensor_data_since(asset_id, high_water, limit=self.delta_fetch_limit)
+            if len(new_readings) < self.delta_fetch_limit:
+                with stage('feature_store_update'):
+                    feature_store.update({**reading, 'asset_id': asset_id} for reading in new_readings)
+            else:
+                self._seed_feature_store(asset_id)
+        else:
+            self._seed_feature_store(asset_id)
+        
+        return self.score_from_feature_store(asset_id, asset_type)
+    
+    def _calculate_from_rollups(self, asset_id: str, asset_type: str) -> RiskScore:
+        """
+        Score over the last `rollup_window` from the sensor rollups, so a
+        24h or 7d window costs a few hundred bucket rows instead of every reading
+        """
+        with stage('fetch_sensor_rollups'):
+            rollups = db.get_sensor_rollups([asset_id], since=datetime.now(timezone.utc) - self.rollup_window,
+                                            resolution=self.rollup_resolution)
+        if not len(rollups['count']):
+            return self.baseline_risk_score(asset_id, asset_type)
+        
+        with stage('extract_features'):
+            features = next(iter(extract_rollup_features(rollups).values()))
+        self._add_window_features({asset_id: features})
+        return self.score_features(asset_id, asset_type, features, int(rollups['count'].sum()))
+    
+    def fetch_window_batch(self, asset_ids: List[str], per_sensor: Optional[int] = None) -> SensorColumns:
+        """
+        The last `per_sensor` readings of every sensor type of the given
+        assets (see `Database.get_sensor_window_batch`). With the hot window
+        store enabled, only readings newer than what it already holds are
+        fetched and the window is read from the store.
+        """
+        per_sensor = per_sensor or self.window_per_sensor
+        if not self._hot_windows_serve(per_sensor):
+            return db.get_sensor_window_batch(asset_ids, per_sensor=per_sensor)
+        
+        high_water = hot_windows.high_water_marks(asset_ids)
+        cold = [asset_id for asset_id in asset_ids if high_water[asset_id] is None]
+        warm = [asset_id for asset_id in asset_ids if high_water[asset_id] is not None]
+        if cold:
+            hot_windows.append(db.get_sensor_window_batch(cold, per_sensor=hot_windows.window))
+        if warm:
+            since = min(high_water[asset_id] for asset_id in warm)
+            hot_windows.append(db.get_sensor_window_batch(warm, per_sensor=hot_windows.window, since=since))
+        return hot_windows.window_batch(asset_ids, per_sensor)
+    
+    def fetch_window(self, asset_id: str, per_sensor: Optional[int] = None) -> SensorColumns:
+        """`fetch_window_batch` for one asset"""
+        per_sensor = per_sensor or self.window_per_sensor
+        if not self._hot_windows_serve(per_sensor):
+            return db.get_sensor_window(asset_id, per_sensor=per_sensor)
+        return self.fetch_window_batch([asset_id], per_sensor)
+    
+    @staticmethod
+    def _hot_windows_serve(per_sensor: int) -> bool:
+        return hot_windows.enabled and per_sensor <= hot_windows.window
+    
+    def feature_windows(self) -> Dict[str, timedelta]:
+        """Label -> length of every window to compute qualified features for"""
+        labels = (*self.extra_feature_windows, *rule_engine.rules.windows)
+        if labels != self._window_labels:
+            windows: Dict[str, timedelta] = {}
+            for label in labels:
+                try:
+                    windows[label] = parse_duration(label)
+                except ValueError as e:
+                    logger.warning("Ignoring risk rules on feature window %r: %s", label, e)
+            self._window_labels, self._windows = labels, windows
+        return self._windows
+    
+    def window_features(self, asset_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """
+        Window-qualified features (see `extract_window_features`) of the given
+        assets, from one fetch covering the longest window. Empty when no
+        windows are configured or referenced by the rules.
+        """
+        windows = self.feature_windows()
+        if not windows or not asset_ids:
+            return {}
+        now = datetime.now(timezone.utc)
+        with stage('fetch_window_features'):
+            columns = db.get_sensor_window_batch(asset_ids, per_sensor=self.window_feature_limit,
+                                                 since=now - max(windows.values()))
+        with stage('extract_window_features'):
+            return extract_window_features(columns, windows, now)
+    
+    def _add_window_features(self, features: Dict[str, Dict[str, float]]):
+        """Merge window features into each asset's features (asset_id -> features)"""
+        for asset_id, extra in self.window_features(list(features)).items():
+            features[asset_id].update(extra)
+    
+    def _seed_feature_store(self, asset_id: str):
+        with stage('fetch_sensor_data'):
+            sensor_data = self.fetch_window(asset_id, per_sensor=feature_store.window_size)
+        with stage('feature_store_seed'):
+            feature_store.seed(asset_id, sensor_data)
+    
+    def seed_feature_store_batch(self, asset_ids: List[str]):
+        """`_seed_feature_store` for many assets, from one window fetch"""
+        with stage('fetch_sensor_data'):
+            columns = self.fetch_window_batch(asset_ids, per_sensor=feature_store.window_size)
+        with stage('feature_store_seed'):
+            # Rows come grouped by asset, each asset's newest first
+            owners = columns['asset_id']
+            edges = [0, *(np.flatnonzero(owners[1:] != owners[:-1]) + 1).tolist(), len(owners)] if len(owners) else [0]
+            rows = {owners[start]: slice(start, end) for start, end in zip(edges[:-1], edges[1:])}
+            for asset_id in asset_ids:
+                selected = rows.get(asset_id, slice(0, 0))
+                feature_store.seed(asset_id, {name: column[selected] for name, column in columns.items()})
+    
+    def score_from_feature_store(self, asset_id: str, asset_type: str) -> RiskScore:
+        """
+        Calculate risk score from the feature store's current state for an asset
+        """
+        reading_count = feature_store.reading_count(asset_id)
+        if not reading_count:
+            return self.baseline_risk_score(asset_id, asset_type)
+        
+        with stage('feature_store_snapshot'):
+            features = feature_store.snapshot(asset_id)
+        self._add_window_features({asset_id: features})
+        return self.score_features(asset_id, asset_type, features, reading_count)
+    
+    def score_from_feature_store_batch(self, assets: List[Dict[str, Any]]) -> List[RiskScore]:
+        """
+        `score_from_feature_store` for many assets, with one model predict call
+        """
+        with_data = [asset for asset in assets if feature_store.reading_count(asset['id'])]
+        with stage('feature_store_snapshot'):
+            features = {asset['id']: feature_store.snapshot(asset['id']) for asset in with_data}
+        self._add_window_features(features)
+        predictions = dict(zip(features, self.predict_batch(list(features.values()))))
+        
+        return [
+            self.score_features(asset['id'], asset['type'], features[asset['id']],
+                                feature_store.reading_count(asset['id']), prediction=predictions[asset['id']])
+            if asset['id'] in features else self.baseline_risk_score(asset['id'], asset['type'])
+            for asset in assets
+        ]
+    
+    def calculate_risk_scores_batch(self, assets: List[Dict[str, Any]],
+                                    detect_anomalies: bool = False) -> Dict[str, Any]:
+        """
+        Calculate risk scores for many assets using one sensor data fetch.
+        
+        `assets` are rows from the assets table (at least `id` and `type`).
+        Returns a dict with `scores` (asset_id -> RiskScore), `errors`
+        (asset_id -> message), per-asset compute times and the shared fetch
+        and feature extraction times, all in milliseconds. With
+        `detect_anomalies`, `anomalies` holds the anomaly records found in
+        the same readings (none when scoring from rollups).
+        """
+        anomalies: List[Dict[str, Any]] = []
+        if self.rollup_window is not None:
+            fetch_start = time.perf_counter()
+            with stage('fetch_sensor_rollups'):
+                rollups = db.get_sensor_rollups([asset['id'] for asset in assets],
+                                                since=datetime.now(timezone.utc) - self.rollup_window,
+                                                resolution=self.rollup_resolution)
+            fetch_ms = (time.perf_counter() - fetch_start) * 1000
+            
+            features_start = time.perf_counter()
+            with stage('extract_features'):
+                features = extract_rollup_features(rollups)
+            reading_counts: Dict[str, int] = {}
+            for asset_id, count in zip(rollups['asset_id'].tolist(), rollups['count'].tolist()):
+                reading_counts[asset_id] = reading_counts.get(asset_id, 0) + int(count)
+        else:
+            fetch_start = time.perf_counter()
+            columns = self.fetch_window_batch([asset['id'] for asset in assets])
+            fetch_ms = (time.perf_counter() - fetch_start) * 1000
+            
+            # Extract every asset's features in one pass over the columns
+            features_start = time.perf_counter()
+            features = extract_statistical_features_batch(
+                columns['asset_id'], columns['sensor_type'], columns['value']
             )
+            asset_ids, counts = np.unique(columns['asset_id'], return_counts=True)
+            reading_counts = dict(zip(asset_ids.tolist(), counts.tolist()))
+            if detect_anomalies:
+                with stage('detect_anomalies'):
+                    anomalies = anomaly_engine.detect(columns)
         
-        # Extract features
-        features = extract_statistical_features(sensor_data)
+        # Evaluate the risk rules for every asset with readings in one pass
+        with_data = [asset for asset in assets if reading_counts.get(asset['id'])]
+        self._add_window_features({asset['id']: features[asset['id']] for asset in with_data})
+        factor_lists = rule_engine.evaluate_batch(
+            [features[asset['id']] for asset in with_data], [asset['type'] for asset in with_data]
+        )
+        risk_factors = {asset['id']: factors for asset, factors in zip(with_data, factor_lists)}
+        predictions = dict(zip(
+            (asset['id'] for asset in with_data),
+            self.predict_batch([features[asset['id']] for asset in with_data])
+        ))
+        features_ms = (time.perf_counter() - features_start) * 1000
         
-        # Calculate risk factors
-        risk_factors_data = calculate_risk_factors(features, asset_type)
+        scores: Dict[str, RiskScore] = {}
+        errors: Dict[str, str] = {}
+        compute_times: Dict[str, float] = {}
+        
+        for asset in assets:
+            asset_id = asset['id']
+            start = time.perf_counter()
+            try:
+                reading_count = reading_counts.get(asset_id, 0)
+                if reading_count:
+                    scores[asset_id] = self.score_features(
+                        asset_id, asset['type'], features[asset_id], reading_count, risk_factors[asset_id],
+                        prediction=predictions[asset_id]
+                    )
+                else:
+                    scores[asset_id] = self.baseline_risk_score(asset_id, asset['type'])
+            except Exception as e:
+                errors[asset_id] = str(e)
+            compute_times[asset_id] = (time.perf_counter() - start) * 1000
+        
+        return {
+            'scores': scores,
+            'errors': errors,
+            'anomalies': anomalies,
+            'compute_times': compute_times,
+            'fetch_ms': fetch_ms,
+            'features_ms': features_ms
+        }
+    
+    def score_sensor_data(self, asset_id: str, asset_type: str, sensor_data: Any) -> RiskScore:
+        """
+        Calculate risk score for an asset from already fetched sensor data
+        (reading dicts or columns, see `extract_statistical_features`)
+        """
+        reading_count = len(sensor_data['value']) if isinstance(sensor_data, Mapping) else len(sensor_data)
+        if not reading_count:
+            # No data available, return baseline risk
+            return self.baseline_risk_score(asset_id, asset_type)
         
-        # Calculate overall risk score
+        # Extract features
+        with stage('extract_features'):
+            features = extract_statistical_features(sensor_data)
+        
+        return self.score_features(asset_id, asset_type, features, reading_count)
+    
+    def predict(self, features: Dict[str, float]) -> Optional[Prediction]:
+        """
+        Model score for one asset, batched with concurrent callers into a
+        single predict call. None in rules mode or when no model is loaded.
+        """
+        model = model_registry.get() if self.scoring_mode == 'model' else None
+        if model is None:
+            return None
+        return prediction_batcher.predict(model, model.vectorize([features])[0]), model.version
+    
+    def predict_batch(self, features_list: List[Dict[str, float]]) -> List[Optional[Prediction]]:
+        """Model scores for many assets with one predict call (see `predict`)"""
+        model = model_registry.get() if self.scoring_mode == 'model' and features_list else None
+        if model is None:
+            return [None] * len(features_list)
+        with stage('model_predict'):
+            scores = model.predict(model.vectorize(features_list))
+        return [(score, model.version) for score in scores.tolist()]
+    
+    def baseline_risk_score(self, asset_id: str, asset_type: str) -> RiskScore:
+        """
+        Baseline risk score for an asset without sensor data
+        """
         base_risk = self.base_risk_scores.get(asset_type, self.base_risk_scores['default'])
+        return RiskScore(
+            asset_id=asset_id,
+            risk_score=base_risk,
+            timestamp=datetime.now(),
+            explanation=f"Baseline risk score for {asset_type}. No sensor data available yet.",
+            risk_factors=[],
+            confidence=0.3
+        )
+    
+    def score_features(self, asset_id: str, asset_type: str, features: Dict[str, float],
+                       reading_count: int,
+                       risk_factors_data: Optional[List[Dict[str, Any]]] = None,
+                       timestamp: Optional[datetime] = None,
+                       prediction: Optional[Prediction] = None) -> RiskScore:
+        """
+        Calculate risk score for an asset from extracted features. Batch callers
+        pass risk factors already evaluated with `rule_engine.evaluate_batch`
+        and model predictions from `predict_batch`; replays pass the historical
+        `timestamp` the features were taken at.
+        """
+        # Calculate risk factors
+        if risk_factors_data is None:
+            with stage('risk_factors'):
+                risk_factors_data = calculate_risk_factors(features, asset_type)
         
-        # Sum contributions from risk factors
-        total_contribution = sum(rf['contribution'] for rf in risk_factors_data)
+        if prediction is None and self.scoring_mode == 'model':
+            with stage('model_predict'):
+                prediction = self.predict(features)
         
-        # Calculate final risk score (capped at 100)
-        risk_score = min(base_risk + total_contribution, 100.0)
+        if prediction is not None:
+            # The model scores the asset, the rules still explain it
+            risk_score, model_version = prediction
+        else:
+            # Calculate overall risk score
+            base_risk = self.base_risk_scores.get(asset_type, self.base_risk_scores['default'])
+            
+            # Sum contributions from risk factors
+            total_contribution = sum(rf['contribution'] for rf in risk_factors_data)
+            
+            # Calculate final risk score (capped at 100)
+            risk_score = min(base_risk + total_contribution, 100.0)
+            model_version = RULES_MODEL_VERSION
         
         # Generate explanation
         explanation = self._generate_explanation(risk_score, risk_factors_data, asset_type)
         
         # Calculate confidence based on data availability
-        confidence = min(len(sensor_data) / 100.0, 1.0)
+        confidence = min(reading_count / 100.0, 1.0)
         
         # Convert risk factors to RiskFactor objects
-        risk_factors = [
-            RiskFactor(
-                factor=rf['factor'],
-                contribution=rf['contribution'],
-                description=rf['description']
+        with stage('build_model'):
+            risk_factors = [
+                RiskFactor(
+                    factor=rf['factor'],
+                    contribution=rf['contribution'],
+                    description=rf['description']
+                )
+                for rf in risk_factors_data
+            ]
+            
+            return RiskScore(
+                asset_id=asset_id,
+                risk_score=round(risk_score, 1),
+                timestamp=timestamp or datetime.now(),
+                explanation=explanation,
+                risk_factors=risk_factors,
+                confidence=round(confidence, 2),
+                model_version=model_version
             )
-            for rf in risk_factors_data
-        ]
-        
-        return RiskScore(
-            asset_id=asset_id,
-            risk_score=round(risk_score, 1),
-            timestamp=datetime.now(),
-            explanation=explanation,
-            risk_factors=risk_factors,
-            confidence=round(confidence, 2)
-        )
     
     def _generate_explanation(self, risk_score: float, risk_factors: List[Dict[str, Any]], 
                             asset_type: str) -> str:
         """
         Generate human-readable explanation for the risk score
         """
-        if risk_score < 30:
-            risk_level = "LOW"
+        risk_level = risk_band(risk_score)
+        if risk_level == "LOW":
             summary = f"The {asset_type} is operating within normal parameters."
-        elif risk_score < 60:
-            risk_level = "MEDIUM"
+        elif risk_level == "MEDIUM":
             summary = f"The {asset_type} shows some concerning indicators that warrant monitoring."
-        elif risk_score < 80:
-            risk_level = "HIGH"
+        elif risk_level == "HIGH":
             summary = f"The {asset_type} exhibits significant risk factors requiring attention."
         else:
-            risk_level = "CRITICAL"
             summary = f"The {asset_type} is at critical risk and requires immediate intervention."
         
         explanation = f"Risk Level: {risk_level} ({risk_score:.1f}/100). {summary}"
@@ -109,4 +473,23 @@ class RiskEngine:
         return explanation
 
 
+def risk_score_record(risk_score: RiskScore) -> Dict[str, Any]:
+    """Convert a RiskScore into the keyword arguments the database layer stores"""
+    return {
+        'asset_id': risk_score.asset_id,
+        'risk_score': risk_score.risk_score,
+        'explanation': risk_score.explanation,
+        'risk_factors': [
+            {
+                'factor': rf.factor,
+                'contribution': rf.contribution,
+                'description': rf.description
+            }
+            for rf in risk_score.risk_factors
+        ],
+        'confidence': risk_score.confidence,
+        'model_version': risk_score.model_version
+    }
+
+
 risk_engine = RiskEngine()
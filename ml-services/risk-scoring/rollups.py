@@ -0,0 +1,38 @@
+"""
+Refresh the sensor_readings continuous aggregates by hand.
+
+The refresh policies only revisit recent buckets, so readings written far
+in the past (backfills, imports) stay invisible to rollup-based features
+until their range is refreshed:
+
+    python rollups.py --start 2024-01-01 --end 2024-02-01
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from database import ROLLUPS, db
+from timestamps import parse_time
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Materialize sensor_readings rollups over a time range")
+    parser.add_argument('--resolution', choices=sorted(ROLLUPS), action='append',
+                        help="Rollup to refresh (repeatable, default: all)")
+    parser.add_argument('--start', type=parse_time, help="Start of the range (ISO-8601, UTC if naive)")
+    parser.add_argument('--end', type=parse_time, help="End of the range, exclusive")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s', stream=sys.stderr)
+    try:
+        for resolution in args.resolution or sorted(ROLLUPS):
+            logging.info("Refreshing %s from %s to %s", ROLLUPS[resolution][0],
+                         args.start or 'the beginning', args.end or 'now')
+            db.refresh_sensor_rollups(resolution, args.start, args.end)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
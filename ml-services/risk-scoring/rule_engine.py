@@ -0,0 +1,202 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = 'default'
+
+
+class RuleSet:
+    """
+    Risk rules compiled into dense arrays: one column per rule and one row of
+    thresholds per asset type. A threshold of +inf disables a rule for that
+    asset type. Rules on window-qualified features (`temperature_max@1h`)
+    list their windows in `windows`.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]], asset_types: Dict[str, Dict[str, float]]):
+        self.features: List[str] = [rule['feature'] for rule in rules]
+        self.factors: List[str] = [rule['factor'] for rule in rules]
+        self.descriptions: List[str] = [rule['description'] for rule in rules]
+        self.caps = np.array([rule['max_contribution'] for rule in rules], dtype=np.float64)
+        self.windows: List[str] = sorted({feature.split('@', 1)[1] for feature in self.features if '@' in feature})
+
+        self.type_index: Dict[str, int] = {name: index for index, name in enumerate(asset_types)}
+        self.default_index = self.type_index[DEFAULT_PROFILE]
+        self.thresholds = np.full((len(asset_types), len(rules)), np.inf)
+        for type_row, profile in enumerate(asset_types.values()):
+            for rule_column, rule in enumerate(rules):
+                threshold = profile.get(rule['feature'], rule.get('default_threshold'))
+                if threshold is not None:
+                    self.thresholds[type_row, rule_column] = threshold
+
+        # Per-type lists of the enabled rules, for scoring one asset without array overhead
+        self.profiles: List[List[tuple]] = [
+            [
+                (self.features[column], float(self.thresholds[type_row, column]), float(self.caps[column]),
+                 self.factors[column], self.descriptions[column])
+                for column in range(len(rules)) if math.isfinite(self.thresholds[type_row, column])
+            ]
+            for type_row in range(len(asset_types))
+        ]
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> 'RuleSet':
+        """Validate a parsed rules document and compile it"""
+        rules = config.get('rules')
+        asset_types = config.get('asset_types')
+        if not rules or not isinstance(rules, list):
+            raise ValueError("rules config needs a non-empty 'rules' list")
+        if not isinstance(asset_types, dict) or DEFAULT_PROFILE not in asset_types:
+            raise ValueError(f"rules config needs an 'asset_types' mapping with a '{DEFAULT_PROFILE}' profile")
+
+        features = set()
+        for rule in rules:
+            missing = {'feature', 'factor', 'max_contribution', 'description'} - set(rule)
+            if missing:
+                raise ValueError(f"rule {rule.get('feature', '?')} is missing {sorted(missing)}")
+            if rule['feature'] in features:
+                raise ValueError(f"duplicate rule for feature {rule['feature']}")
+            features.add(rule['feature'])
+            _check_threshold(rule.get('default_threshold'), f"default_threshold of {rule['feature']}")
+
+        for asset_type, profile in asset_types.items():
+            unknown = set(profile) - features
+            if unknown:
+                raise ValueError(f"asset type {asset_type} sets thresholds for unknown features {sorted(unknown)}")
+            for feature, threshold in profile.items():
+                _check_threshold(threshold, f"{asset_type}.{feature}")
+
+        return cls(rules, asset_types)
+
+
+def _check_threshold(threshold: Optional[float], name: str):
+    # Contributions are relative to the threshold, so it must be positive
+    if threshold is not None and not (isinstance(threshold, (int, float)) and threshold > 0):
+        raise ValueError(f"{name} must be a positive number")
+
+
+class RuleEngine:
+    """
+    Evaluates risk rules for whole batches of assets with array operations.
+
+    Rules are loaded from a JSON file and reloaded when the file changes
+    (checked at most every `reload_interval` seconds). A config that fails
+    to load is logged and the previous rules stay in effect.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._next_check = 0.0
+        # Bumped by every reload that installs new rules
+        self.generation = 0
+        self._warned_types: set = set()
+        self.rules = self._load()
+
+    def _load(self) -> RuleSet:
+        self._mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding='utf-8') as f:
+            return RuleSet.from_config(json.load(f))
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload the rules if the file changed; returns True when new rules were installed"""
+        with self._lock:
+            try:
+                if not force and os.stat(self.path).st_mtime_ns == self._mtime:
+                    return False
+                self.rules = self._load()
+            except (OSError, ValueError) as e:
+                logger.error("Keeping previous risk rules, failed to load %s: %s", self.path, e)
+                return False
+            self.generation += 1
+            self._warned_types.clear()
+        logger.info("Loaded %d risk rules for %d asset types from %s",
+                    len(self.rules.features), len(self.rules.type_index), self.path)
+        return True
+
+    def _current(self) -> RuleSet:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+        return self.rules
+
+    def current_generation(self) -> int:
+        """`generation` of the rules in effect, picking up a changed file first"""
+        self._current()
+        return self.generation
+
+    def _type_code(self, rules: RuleSet, asset_type: str) -> int:
+        code = rules.type_index.get(asset_type)
+        if code is None:
+            code = rules.default_index
+            if asset_type not in self._warned_types:
+                self._warned_types.add(asset_type)
+                logger.warning("No risk rules for asset type %r, using the %s profile",
+                               asset_type, DEFAULT_PROFILE)
+        return code
+
+    def evaluate_batch(self, features: Sequence[Mapping[str, float]],
+                       asset_types: Sequence[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Risk factors for many assets at once, one list per asset in rule
+        order. Missing features never trigger a rule.
+        """
+        rules = self._current()
+        values = np.array(
+            [[asset_features.get(feature, math.nan) for feature in rules.features] for asset_features in features],
+            dtype=np.float64
+        ).reshape(len(features), len(rules.features))
+        type_codes = np.fromiter((self._type_code(rules, asset_type) for asset_type in asset_types),
+                                 dtype=np.int64, count=len(asset_types))
+        thresholds = rules.thresholds[type_codes]
+
+        with np.errstate(invalid='ignore'):
+            rows, columns = np.nonzero(values > thresholds)
+        breached_values = values[rows, columns]
+        breached_thresholds = thresholds[rows, columns]
+        contributions = np.minimum(
+            ((breached_values - breached_thresholds) / breached_thresholds) * 100, rules.caps[columns]
+        )
+
+        # Only the breached cells need per-item work, to render their descriptions
+        factors: List[List[Dict[str, Any]]] = [[] for _ in range(len(features))]
+        for row, column, value, threshold, contribution in zip(
+                rows.tolist(), columns.tolist(), breached_values.tolist(),
+                breached_thresholds.tolist(), contributions.tolist()):
+            factors[row].append({
+                'factor': rules.factors[column],
+                'contribution': contribution,
+                'description': rules.descriptions[column].format(value=value, threshold=threshold)
+            })
+        return factors
+
+    def evaluate(self, features: Mapping[str, float], asset_type: str) -> List[Dict[str, Any]]:
+        """Risk factors for a single asset (same results as `evaluate_batch`)"""
+        rules = self._current()
+        factors = []
+        for feature, threshold, cap, factor, description in rules.profiles[self._type_code(rules, asset_type)]:
+            value = features.get(feature)
+            if value is not None and value > threshold:
+                factors.append({
+                    'factor': factor,
+                    'contribution': min(((value - threshold) / threshold) * 100, cap),
+                    'description': description.format(value=value, threshold=threshold)
+                })
+        return factors
+
+
+rule_engine = RuleEngine(
+    path=os.getenv('RISK_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_rules.json')),
+    reload_interval=float(os.getenv('RISK_RULES_RELOAD_SECONDS', 5))
+)
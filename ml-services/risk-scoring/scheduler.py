@@ -0,0 +1,267 @@
+"""
+Continuous rescoring of every active asset, most urgent first.
+
+Each asset is due again a fixed interval after its last score, set by the
+risk level of that score (CRITICAL every few seconds, LOW every few
+minutes) and shortened when readings are arriving quickly. Due assets are
+kept in a heap and rescored in bounded batches, with the time spent
+scoring capped at a fraction of wall time and ticks skipped while the
+database pool is busy with requests.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from anomaly_engine import anomaly_engine
+from database import db
+from metrics import REGISTRY, Counter, Gauge
+from risk_engine import risk_band, risk_engine
+from write_behind import risk_writer
+
+logger = logging.getLogger(__name__)
+
+RESCORED = REGISTRY.register(Counter(
+    'risk_scheduler_rescored_total', 'Assets rescored by the scheduler', ['level']))
+OVERDUE = REGISTRY.register(Gauge(
+    'risk_scheduler_overdue', 'Assets past their rescore time after the last batch'))
+
+
+class RescoreScheduler:
+    """
+    Priority queue of assets keyed by when each is next due. Scores computed
+    elsewhere (API calls, ingest, sweeps) are reported with `note_scores` and
+    push the asset back; readings reported with `note_readings` raise its
+    arrival rate and pull it forward.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('SCHEDULER_ENABLED', 'false').lower() == 'true'
+        self.intervals = {
+            'CRITICAL': float(os.getenv('SCHEDULER_INTERVAL_CRITICAL_S', 5)),
+            'HIGH': float(os.getenv('SCHEDULER_INTERVAL_HIGH_S', 15)),
+            'MEDIUM': float(os.getenv('SCHEDULER_INTERVAL_MEDIUM_S', 60)),
+            'LOW': float(os.getenv('SCHEDULER_INTERVAL_LOW_S', 300))
+        }
+        self.batch_size = int(os.getenv('SCHEDULER_BATCH_SIZE', 200))
+        self.tick = float(os.getenv('SCHEDULER_TICK_MS', 1000)) / 1000
+        # Fraction of wall time the scheduler may spend scoring
+        self.budget = float(os.getenv('SCHEDULER_BUDGET', 0.25))
+        if not 0 < self.budget <= 1:
+            raise ValueError(f"SCHEDULER_BUDGET must be in (0, 1], got {self.budget}")
+        self.max_pool_saturation = float(os.getenv('SCHEDULER_MAX_POOL_SATURATION', 0.5))
+        self.asset_refresh = float(os.getenv('SCHEDULER_ASSET_REFRESH_S', 300))
+        # Time constant of the per-asset reading arrival rate
+        self.rate_window = 60.0
+
+        # asset_id -> type, last score, when it was scored, arrival rate and heap version
+        self._assets: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[float, float, int, str]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            'batches': 0,
+            'rescored': 0,
+            'failed': 0,
+            'skipped_busy': 0,
+            'last_batch_ms': 0.0
+        }
+        self._last_error: Optional[str] = None
+
+    def interval(self, entry: Dict[str, Any], now: float) -> float:
+        """Seconds between rescores of an asset: its band interval, shortened by its arrival rate"""
+        rate = entry['rate'] * math.exp(-(now - entry['rate_at']) / self.rate_window)
+        return self.intervals[risk_band(entry['score'])] / (1.0 + math.log1p(rate * 60.0))
+
+    def _schedule(self, asset_id: str, entry: Dict[str, Any], now: float, due: Optional[float] = None):
+        # Lazy deletion: entries pushed earlier for the asset go stale with the version bump
+        entry['version'] += 1
+        if due is None:
+            due = entry['scored_at'] + self.interval(entry, now)
+        heapq.heappush(self._heap, (due, -entry['score'], entry['version'], asset_id))
+
+    def load_assets(self, assets: List[Dict[str, Any]], now: Optional[float] = None):
+        """
+        Track the given assets (rows from the assets table), dropping any no
+        longer listed. New assets start from their stored current_risk_score,
+        their first rescore spread over one interval.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            listed = {asset['id'] for asset in assets}
+            for asset_id in [asset_id for asset_id in self._assets if asset_id not in listed]:
+                del self._assets[asset_id]
+            for asset in assets:
+                entry = self._assets.get(asset['id'])
+                if entry is not None:
+                    entry['type'] = asset['type']
+                    continue
+                entry = self._assets[asset['id']] = {
+                    'type': asset['type'],
+                    'score': float(asset.get('current_risk_score') or 0.0),
+                    'scored_at': now,
+                    'rate': 0.0,
+                    'rate_at': now,
+                    'version': 0
+                }
+                self._schedule(asset['id'], entry, now, due=now + random.random() * self.interval(entry, now))
+            # Rebuilt now and then so stale entries do not accumulate
+            if len(self._heap) > 4 * len(self._assets) + 1024:
+                self._heap = [item for item in self._heap
+                              if item[3] in self._assets and item[2] == self._assets[item[3]]['version']]
+                heapq.heapify(self._heap)
+
+    def note_readings(self, counts: Dict[str, int]):
+        """Record readings that arrived per asset, moving busy assets forward"""
+        now = time.monotonic()
+        with self._lock:
+            for asset_id, count in counts.items():
+                entry = self._assets.get(asset_id)
+                if entry is None:
+                    continue
+                decay = math.exp(-(now - entry['rate_at']) / self.rate_window)
+                entry['rate'] = entry['rate'] * decay + count / self.rate_window
+                entry['rate_at'] = now
+                self._schedule(asset_id, entry, now)
+
+    def note_scores(self, scores: Iterable[Tuple[str, float]]):
+        """Record (asset_id, risk_score) pairs computed now, by the scheduler or anyone else"""
+        now = time.monotonic()
+        with self._lock:
+            for asset_id, risk_score in scores:
+                entry = self._assets.get(asset_id)
+                if entry is None:
+                    continue
+                entry['score'] = float(risk_score)
+                entry['scored_at'] = now
+                self._schedule(asset_id, entry, now)
+
+    def take_due(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Pop up to `limit` due assets, earliest due (then highest score) first"""
+        now = time.monotonic() if now is None else now
+        due: List[Dict[str, Any]] = []
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now:
+                _, _, version, asset_id = heapq.heappop(self._heap)
+                entry = self._assets.get(asset_id)
+                if entry is None or entry['version'] != version:
+                    continue
+                due.append({'id': asset_id, 'type': entry['type']})
+        return due
+
+    def overdue(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return sum(
+                1 for due, _, version, asset_id in self._heap
+                if due <= now and asset_id in self._assets and self._assets[asset_id]['version'] == version
+            )
+
+    def run_once(self) -> Dict[str, Any]:
+        """Rescore one batch of due assets (blocking; runs on the DB thread pool)"""
+        start = time.perf_counter()
+        assets = self.take_due(self.batch_size)
+        if not assets:
+            return {'rescored': 0, 'failed': 0}
+
+        try:
+            batch = risk_engine.calculate_risk_scores_batch(assets, detect_anomalies=anomaly_engine.enabled)
+            scores = batch['scores']
+            risk_writer.submit_many(scores.values())
+            db.store_anomalies(batch['anomalies'])
+        except Exception:
+            # Popped assets are only pushed back by a reschedule; without one they would never run again
+            self._reschedule([asset['id'] for asset in assets])
+            self._stats['failed'] += len(assets)
+            raise
+        self.note_scores((asset_id, score.risk_score) for asset_id, score in scores.items())
+        for score in scores.values():
+            RESCORED.labels(risk_band(score.risk_score)).inc()
+
+        # Failed assets come back after their usual interval rather than every tick
+        self._reschedule(batch['errors'])
+
+        self._stats['batches'] += 1
+        self._stats['rescored'] += len(scores)
+        self._stats['failed'] += len(batch['errors'])
+        self._stats['last_batch_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return {'rescored': len(scores), 'failed': len(batch['errors']), 'full': len(assets) == self.batch_size}
+
+    def _reschedule(self, asset_ids: Iterable[str]):
+        """Schedule assets again at their usual interval from now, keeping their last score"""
+        now = time.monotonic()
+        with self._lock:
+            for asset_id in asset_ids:
+                entry = self._assets.get(asset_id)
+                if entry is not None:
+                    entry['scored_at'] = now
+                    self._schedule(asset_id, entry, now)
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        refresh_at = 0.0
+        while True:
+            pause = self.tick
+            try:
+                if time.monotonic() >= refresh_at:
+                    self.load_assets(await db.run(db.get_active_assets))
+                    refresh_at = time.monotonic() + self.asset_refresh
+
+                if db.pool_stats()['saturation'] > self.max_pool_saturation:
+                    # Requests come first; try again next tick
+                    self._stats['skipped_busy'] += 1
+                else:
+                    started = time.monotonic()
+                    result = await db.run(self.run_once)
+                    busy = time.monotonic() - started
+                    # Keep scoring to `budget` of wall time; go straight on while a backlog remains
+                    rest = busy * (1 - self.budget) / self.budget
+                    pause = rest if result.get('full') else max(self.tick, rest)
+                OVERDUE.set(self.overdue())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._last_error = str(e)
+                logger.exception("Scheduled rescoring failed")
+            await asyncio.sleep(pause)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            levels: Dict[str, int] = {}
+            for entry in self._assets.values():
+                level = risk_band(entry['score'])
+                levels[level] = levels.get(level, 0) + 1
+            tracked = len(self._assets)
+        return {
+            **self._stats,
+            'enabled': self.enabled,
+            'running': self._task is not None,
+            'tracked_assets': tracked,
+            'assets_by_level': levels,
+            'overdue': self.overdue(),
+            'intervals_s': self.intervals,
+            'batch_size': self.batch_size,
+            'budget': self.budget,
+            'last_error': self._last_error
+        }
+
+
+rescore_scheduler = RescoreScheduler()
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from metrics import REGISTRY, Counter
+
+COALESCED = REGISTRY.register(Counter(
+    'risk_score_coalesced_total', 'Score requests answered by another request\'s computation', ['reason']))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key.
+
+    The first caller for a key runs the computation; callers arriving while
+    it is in flight await the same result (or exception). Results are also
+    reused for `min_interval` seconds after they complete, so a burst that
+    arrives just behind a computation does not start another one.
+    """
+
+    def __init__(self, min_interval: float = 0.0, max_recent: int = 10000):
+        self.min_interval = min_interval
+        self.max_recent = max_recent
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        # key -> (monotonic completion time, result), oldest first
+        self._recent: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._stats = {
+            'computed': 0,
+            'coalesced': 0,
+            'recent': 0,
+            'failed': 0
+        }
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Result of `compute()` for `key`, and whether this caller ran it
+        (False when the result was shared).
+        """
+        if self.min_interval > 0:
+            recent = self._recent.get(key)
+            if recent is not None and time.monotonic() - recent[0] < self.min_interval:
+                self._stats['recent'] += 1
+                COALESCED.labels('min_interval').inc()
+                return recent[1], False
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._stats['coalesced'] += 1
+            COALESCED.labels('in_flight').inc()
+            # Shielded so one caller going away does not cancel the others' result
+            return await asyncio.shield(task), False
+
+        task = asyncio.ensure_future(compute())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), True
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            self._stats['failed'] += 1
+            return
+        self._stats['computed'] += 1
+        if self.min_interval > 0:
+            self._recent[key] = (time.monotonic(), task.result())
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def forget(self, key: Hashable):
+        """Drop the reusable result for a key (the next call recomputes)"""
+        self._recent.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        requests = sum(self._stats.values()) + len(self._in_flight)
+        shared = self._stats['coalesced'] + self._stats['recent']
+        return {
+            **self._stats,
+            'in_flight': len(self._in_flight),
+            'shared_rate': round(shared / requests, 4) if requests else 0.0,
+            'min_interval_ms': self.min_interval * 1000
+        }
+
+
+risk_flights = SingleFlight(
+    min_interval=float(os.getenv('RISK_MIN_RESCORE_INTERVAL_MS', 0)) / 1000,
+    max_recent=int(os.getenv('RISK_CACHE_MAX_ENTRIES', 10000))
+)
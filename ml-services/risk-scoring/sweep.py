@@ -0,0 +1,256 @@
+"""
+Plant-wide rescoring sweep.
+
+Fetches every asset's sensor window in one query, places the readings in
+shared memory and shards the assets across a process pool. Each worker
+extracts features and scores its shard, the parent merges the results and
+bulk-writes them.
+
+Usage (from ml-services/risk-scoring):
+    python sweep.py --plant PLANT-001 [--workers 8] [--chunk-size 250] [--dry-run]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from anomaly_engine import anomaly_engine
+from database import db
+from feature_engineering import extract_statistical_features_batch
+from risk_engine import risk_engine
+from rule_engine import rule_engine
+from scheduler import rescore_scheduler
+from write_behind import risk_writer, timed_record
+
+
+def _to_shared(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple[str, Tuple[int, ...], str]]:
+    """Copy an array into a new shared memory block; returns the block and its descriptor"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(descriptor: Tuple[str, Tuple[int, ...], str]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    name, shape, dtype = descriptor
+    # Spawned workers share the parent's resource tracker, so the parent's unlink() cleans up
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _score_shard(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker entry point: score a contiguous range of assets whose readings
+    live in shared memory.
+    """
+    start = time.perf_counter()
+    value_shm, values = _attach(task['values'])
+    code_shm, sensor_codes = _attach(task['sensor_codes'])
+    try:
+        row_start, row_end = task['rows']
+        offsets = task['offsets']
+        sensor_types = task['sensor_types']
+
+        # Asset position within the shard for every row of the shard
+        counts = np.diff(offsets)
+        asset_index = np.repeat(np.arange(len(counts)), counts)
+        features = extract_statistical_features_batch(
+            asset_index,
+            np.asarray(sensor_types, dtype=object)[sensor_codes[row_start:row_end]],
+            values[row_start:row_end]
+        )
+        for index, extra in enumerate(task['window_features']):
+            if counts[index]:
+                features[index].update(extra)
+
+        with_data = [index for index in range(len(counts)) if counts[index]]
+        factor_lists = rule_engine.evaluate_batch(
+            [features[index] for index in with_data], [task['assets'][index][1] for index in with_data]
+        )
+        risk_factors = dict(zip(with_data, factor_lists))
+        predictions = dict(zip(with_data, risk_engine.predict_batch([features[index] for index in with_data])))
+
+        records, errors = [], {}
+        for index, (asset_id, asset_type) in enumerate(task['assets']):
+            try:
+                if counts[index]:
+                    score = risk_engine.score_features(asset_id, asset_type, features[index],
+                                                       int(counts[index]), risk_factors[index],
+                                                       prediction=predictions[index])
+                else:
+                    score = risk_engine.baseline_risk_score(asset_id, asset_type)
+                records.append(timed_record(score))
+            except Exception as e:
+                errors[asset_id] = str(e)
+        return {'records': records, 'errors': errors, 'compute_ms': (time.perf_counter() - start) * 1000}
+    finally:
+        del values, sensor_codes
+        value_shm.close()
+        code_shm.close()
+
+
+def run_sweep(plant_id: Optional[str] = None, asset_ids: Optional[List[str]] = None,
+              workers: Optional[int] = None, chunk_size: Optional[int] = None,
+              store: bool = True) -> Dict[str, Any]:
+    """
+    Rescore every active asset of a plant (or an explicit list of assets)
+    across a process pool and bulk-write the results.
+    """
+    workers = workers or int(os.getenv('SWEEP_WORKERS') or os.cpu_count() or 1)
+    chunk_size = chunk_size or int(os.getenv('SWEEP_CHUNK_SIZE', 250))
+    started = time.perf_counter()
+
+    assets = db.get_assets_info(asset_ids) if asset_ids else db.get_plant_assets(plant_id)
+    columns = risk_engine.fetch_window_batch([asset['id'] for asset in assets])
+    window_features = risk_engine.window_features([asset['id'] for asset in assets])
+    fetch_ms = (time.perf_counter() - started) * 1000
+
+    # Lay readings out asset by asset, in the order the shards will slice them
+    asset_position = {asset['id']: index for index, asset in enumerate(assets)}
+    row_asset = np.fromiter((asset_position[a] for a in columns['asset_id']), dtype=np.int64,
+                            count=len(columns['asset_id']))
+    order = np.argsort(row_asset, kind='stable')
+    sensor_types, sensor_codes = np.unique(columns['sensor_type'], return_inverse=True)
+    sensor_types = sensor_types.tolist()
+    values = np.ascontiguousarray(columns['value'][order])
+    sensor_codes = np.ascontiguousarray(sensor_codes[order].astype(np.int32))
+    offsets = np.searchsorted(row_asset[order], np.arange(len(assets) + 1))
+
+    compute_start = time.perf_counter()
+    # Anomalies come from the same readings, tested here rather than in the shards
+    anomalies = anomaly_engine.detect(columns) if anomaly_engine.enabled else []
+    records: List[Dict[str, Any]] = []
+    errors: Dict[str, str] = {}
+    tasks: List[Dict[str, Any]] = []
+    value_shm, value_descriptor = _to_shared(values)
+    code_shm, code_descriptor = _to_shared(sensor_codes)
+    try:
+        for first in range(0, len(assets), chunk_size):
+            last = min(first + chunk_size, len(assets))
+            tasks.append({
+                'values': value_descriptor,
+                'sensor_codes': code_descriptor,
+                'sensor_types': sensor_types,
+                'rows': (int(offsets[first]), int(offsets[last])),
+                'offsets': (offsets[first:last + 1] - offsets[first]).tolist(),
+                'assets': [(asset['id'], asset['type']) for asset in assets[first:last]],
+                'window_features': [window_features.get(asset['id'], {}) for asset in assets[first:last]]
+            })
+
+        if tasks:
+            # spawn keeps pooled database sockets out of the workers
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+                for result in pool.map(_score_shard, tasks):
+                    records.extend(result['records'])
+                    errors.update(result['errors'])
+    finally:
+        value_shm.close()
+        value_shm.unlink()
+        code_shm.close()
+        code_shm.unlink()
+    compute_ms = (time.perf_counter() - compute_start) * 1000
+
+    store_start = time.perf_counter()
+    if store:
+        # Written in max_rows chunks behind anything already buffered for these assets
+        risk_writer.submit_records(records, sync=True)
+        db.store_anomalies(anomalies)
+        rescore_scheduler.note_scores((record['asset_id'], record['risk_score']) for record in records)
+    store_ms = (time.perf_counter() - store_start) * 1000
+
+    return {
+        'plant_id': plant_id,
+        'total_assets': len(assets),
+        'scored': len(records),
+        'failed': len(errors),
+        'errors': errors,
+        'anomalies': len(anomalies),
+        'readings': int(len(values)),
+        'workers': workers,
+        'chunk_size': chunk_size,
+        'shards': len(tasks),
+        'timings': {
+            'fetch_ms': round(fetch_ms, 3),
+            'compute_ms': round(compute_ms, 3),
+            'store_ms': round(store_ms, 3),
+            'total_ms': round((time.perf_counter() - started) * 1000, 3)
+        },
+        'scores': records
+    }
+
+
+class SweepJobs:
+    """Background sweep jobs started from the API, tracked by job id"""
+
+    def __init__(self, max_history: int = 50):
+        self.max_history = max_history
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, **kwargs) -> Dict[str, Any]:
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'status': 'running',
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'params': kwargs,
+            'result': None,
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_history:
+                del self._jobs[next(iter(self._jobs))]
+        snapshot = dict(job)
+        threading.Thread(target=self._run, args=(job, kwargs), name=f'sweep-{job_id}', daemon=True).start()
+        return snapshot
+
+    def _run(self, job: Dict[str, Any], kwargs: Dict[str, Any]):
+        try:
+            result = run_sweep(**kwargs)
+            result.pop('scores', None)
+            job['result'] = result
+            job['status'] = 'completed'
+        except Exception as e:
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        job['finished_at'] = datetime.now().isoformat()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+sweep_jobs = SweepJobs()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rescore every asset of a plant across a process pool")
+    parser.add_argument('--plant', required=True, help="plant_id to sweep")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: SWEEP_WORKERS or CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Assets per shard (default: SWEEP_CHUNK_SIZE or 250)")
+    parser.add_argument('--dry-run', action='store_true', help="Score without writing results")
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_sweep(plant_id=args.plant, workers=args.workers, chunk_size=args.chunk_size,
+                           store=not args.dry_run)
+    finally:
+        db.close()
+    result.pop('scores')
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
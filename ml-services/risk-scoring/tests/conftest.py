@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The service modules import each other by flat name, as they do when run from their directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,179 @@
+import fnmatch
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import cache
+from cache import InMemoryBackend, RedisBackend, RiskScoreCache
+from models import RiskScore
+
+READ_AT = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeRedis:
+    """The subset of redis.Redis the cache uses, with bytes values and TTLs"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[0] <= self.clock():
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[1] if entry else None
+
+    def setex(self, key, seconds, value):
+        assert isinstance(seconds, int) and seconds >= 1
+        self.data[key] = (self.clock() + seconds, value.encode('utf-8'))
+
+    def delete(self, key):
+        self.data.pop(key if isinstance(key, str) else key.decode('utf-8'), None)
+
+    def scan_iter(self, match):
+        return [key.encode('utf-8') for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request, clock):
+    if request.param == 'memory':
+        return InMemoryBackend(max_entries=100)
+    return RedisBackend(FakeRedis(clock))
+
+
+def score(asset_id='A-1', value=42.0):
+    return RiskScore(asset_id=asset_id, risk_score=value, timestamp=READ_AT, explanation='test',
+                     risk_factors=[], confidence=0.9)
+
+
+def test_backend_round_trip(backend):
+    backend.set('k', 'v', 10)
+    assert backend.get('k') == 'v'
+    backend.delete('k')
+    assert backend.get('k') is None
+
+
+def test_backend_expiry(backend, clock):
+    backend.set('k', 'v', 10)
+    clock.now += 9.5
+    assert backend.get('k') == 'v'
+    clock.now += 1
+    assert backend.get('k') is None
+
+
+def test_backend_clear(backend):
+    backend.set('a', '1', 10)
+    backend.set('b', '2', 10)
+    backend.clear()
+    assert backend.get('a') is None and backend.get('b') is None
+
+
+def test_redis_backend_keeps_to_its_prefix(clock):
+    client = FakeRedis(clock)
+    client.setex('other:k', 10, 'x')
+    backend = RedisBackend(client, prefix='opssight:')
+    backend.set('k', 'v', 0.2)
+    assert 'opssight:k' in client.data
+    backend.clear()
+    assert list(client.data) == ['other:k']
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    backend = InMemoryBackend(max_entries=2)
+    backend.set('a', '1', 10)
+    backend.set('b', '2', 10)
+    assert backend.get('a') == '1'
+    backend.set('c', '3', 10)
+    assert backend.get('b') is None
+    assert backend.get('a') == '1' and backend.get('c') == '3'
+    assert backend.stats()['evictions'] == 1
+
+
+def test_memory_backend_counts_expirations(clock):
+    backend = InMemoryBackend()
+    backend.set('a', '1', 1)
+    clock.now += 2
+    assert backend.get('a') is None
+    assert backend.stats() == {'entries': 0, 'max_entries': 10000, 'evictions': 0, 'expirations': 1}
+
+
+def test_cache_hit_and_miss(backend):
+    risk_cache = RiskScoreCache(backend, ttl=60)
+    assert risk_cache.get('A-1', 'pump', READ_AT) is None
+    risk_cache.put('pump', READ_AT, score())
+    assert risk_cache.get('A-1', 'pump', READ_AT) == score()
+    assert risk_cache.get('A-1', 'pump', READ_AT + timedelta(seconds=1)) is None
+    stats = risk_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 2, 0.3333)
+
+
+def test_cache_expires_after_ttl(backend, clock):
+    risk_cache = RiskScoreCache(backend, ttl=60)
+    risk_cache.put('pump', READ_AT, score())
+    clock.now += 61
+    assert risk_cache.get('A-1', 'pump', READ_AT) is None
+
+
+def test_newer_score_replaces_previous_entry(backend):
+    risk_cache = RiskScoreCache(backend, ttl=60)
+    risk_cache.put('pump', READ_AT, score(value=10))
+    later = READ_AT + timedelta(minutes=1)
+    risk_cache.put('pump', later, score(value=20))
+    assert backend.get(risk_cache._key('A-1', 'pump', READ_AT)) is None
+    assert risk_cache.get('A-1', 'pump', later).risk_score == 20
+
+
+def test_scope_change_misses(backend):
+    version = ['1']
+    risk_cache = RiskScoreCache(backend, ttl=60, scope=lambda: version[0])
+    risk_cache.put('pump', READ_AT, score())
+    version[0] = '2'
+    assert risk_cache.get('A-1', 'pump', READ_AT) is None
+
+
+def test_tracked_assets_are_bounded(backend):
+    risk_cache = RiskScoreCache(backend, ttl=60, max_tracked=3)
+    for index in range(10):
+        risk_cache.put('pump', READ_AT, score(asset_id=f'A-{index}'))
+    assert list(risk_cache._latest_keys) == ['A-7', 'A-8', 'A-9']
+    # Untracked entries still serve hits until they expire
+    assert risk_cache.get('A-0', 'pump', READ_AT) is not None
+
+
+def test_disabled_cache_stores_nothing(backend):
+    risk_cache = RiskScoreCache(backend, ttl=60, enabled=False)
+    risk_cache.put('pump', READ_AT, score())
+    assert risk_cache.get('A-1', 'pump', READ_AT) is None
+    assert risk_cache.stats()['misses'] == 0
+
+
+def test_timestamps_are_keyed_in_utc():
+    risk_cache = RiskScoreCache(InMemoryBackend())
+    offset = READ_AT.astimezone(timezone(timedelta(hours=2)))
+    assert risk_cache._key('A-1', 'pump', offset) == risk_cache._key('A-1', 'pump', READ_AT)
+
+
+def test_module_cache_is_scoped_by_model_and_rules():
+    assert cache.risk_cache.scope is cache._scoring_scope
+    assert cache._scoring_scope().startswith('m=')
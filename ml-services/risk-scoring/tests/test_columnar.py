@@ -0,0 +1,29 @@
+import pytest
+
+from columnar import ARROW_STREAM, COLUMNS_JSON, negotiate
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, None),
+    ('', None),
+    ('application/json', None),
+    (ARROW_STREAM, ARROW_STREAM),
+    (f'{COLUMNS_JSON}, application/json', COLUMNS_JSON),
+    (f'application/json, {ARROW_STREAM}', None),
+    (f'application/json;q=0.9, {ARROW_STREAM};q=0.5', None),
+    (f'{ARROW_STREAM};q=0.5, application/json;q=0.9', None),
+    (f'{COLUMNS_JSON};q=0.8, {ARROW_STREAM};q=0.9', ARROW_STREAM),
+    (f'application/json;q=0, {ARROW_STREAM};q=0.1', ARROW_STREAM),
+    (f'*/*, {ARROW_STREAM}', ARROW_STREAM),
+    (f'*/*;q=0.9, {ARROW_STREAM};q=0.5', None),
+    (f'{ARROW_STREAM.upper()}; Q=1', ARROW_STREAM),
+    ('text/html', None),
+])
+def test_negotiate_prefers_highest_quality(accept, expected):
+    assert negotiate(accept) == expected
+
+
+@pytest.mark.parametrize('q', ['0', '0.0', '0.00', ' 0.000', 'abc', '-1', '1.5', 'nan'])
+def test_negotiate_excludes_zero_and_malformed_quality(q):
+    assert negotiate(f'{ARROW_STREAM};q={q}') is None
+    assert negotiate(f'{ARROW_STREAM};q={q}, {COLUMNS_JSON};q=0.1') == COLUMNS_JSON
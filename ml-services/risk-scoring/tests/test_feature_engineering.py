@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineering import extract_statistical_features
+
+SENSOR_TYPES = ['temperature', 'vibration', 'pressure', 'current']
+
+
+def baseline_features(rows):
+    """The pandas groupby implementation the vectorized one replaced"""
+    df = pd.DataFrame(rows)
+    features = {}
+    for sensor_type in df['sensor_type'].unique():
+        values = df[df['sensor_type'] == sensor_type]['value'].to_numpy(dtype=np.float64)
+        mean = np.mean(values)
+        std = np.std(values)
+        features[f'{sensor_type}_mean'] = float(mean)
+        features[f'{sensor_type}_std'] = float(std)
+        features[f'{sensor_type}_min'] = float(np.min(values))
+        features[f'{sensor_type}_max'] = float(np.max(values))
+        features[f'{sensor_type}_range'] = float(np.max(values) - np.min(values))
+        if len(values) > 1:
+            features[f'{sensor_type}_trend'] = float(np.polyfit(np.arange(len(values)), values, 1)[0])
+        if mean != 0:
+            features[f'{sensor_type}_cv'] = float(std / mean)
+    return features
+
+
+def random_window(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 400))
+    types = rng.choice(SENSOR_TYPES[:int(rng.integers(1, len(SENSOR_TYPES) + 1))], size=n)
+    values = np.round(rng.normal(50, 20, size=n), 2)
+    return [{'sensor_type': str(t), 'value': float(v)} for t, v in zip(types, values)]
+
+
+def as_structured(rows):
+    array = np.zeros(len(rows), dtype=[('sensor_type', 'U32'), ('value', 'f8')])
+    array['sensor_type'] = [row['sensor_type'] for row in rows]
+    array['value'] = [row['value'] for row in rows]
+    return array
+
+
+def as_columns(rows):
+    return {
+        'sensor_type': np.array([row['sensor_type'] for row in rows]),
+        'value': np.array([row['value'] for row in rows], dtype=np.float64)
+    }
+
+
+LAYOUTS = [list, as_structured, as_columns]
+
+
+def assert_features_match(actual, expected):
+    assert list(actual) == list(expected)
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=['dicts', 'structured', 'columns'])
+@pytest.mark.parametrize('seed', range(25))
+def test_matches_pandas_baseline(seed, layout):
+    rows = random_window(seed)
+    assert_features_match(extract_statistical_features(layout(rows)), baseline_features(rows))
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=['dicts', 'structured', 'columns'])
+def test_empty_input(layout):
+    assert extract_statistical_features(layout([])) == {}
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=['dicts', 'structured', 'columns'])
+def test_single_reading_has_no_trend(layout):
+    features = extract_statistical_features(layout([{'sensor_type': 'temperature', 'value': 71.5}]))
+    assert features == {
+        'temperature_mean': 71.5,
+        'temperature_std': 0.0,
+        'temperature_min': 71.5,
+        'temperature_max': 71.5,
+        'temperature_range': 0.0,
+        'temperature_cv': 0.0
+    }
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=['dicts', 'structured', 'columns'])
+def test_constant_values(layout):
+    rows = [{'sensor_type': 'pressure', 'value': 12.0}] * 10 + [{'sensor_type': 'current', 'value': 0.0}] * 3
+    features = extract_statistical_features(layout(rows))
+    assert features['pressure_std'] == 0.0
+    assert features['pressure_cv'] == 0.0
+    assert features['pressure_range'] == 0.0
+    assert features['pressure_trend'] == pytest.approx(0.0, abs=1e-12)
+    assert features['current_std'] == 0.0
+    assert 'current_cv' not in features
+
+
+@pytest.mark.parametrize('layout', LAYOUTS, ids=['dicts', 'structured', 'columns'])
+def test_trend_follows_newest_first_order(layout):
+    # Readings come from the database newest first, so a value rising over
+    # time has a negative slope against row position, as it had with pandas
+    rising = [{'sensor_type': 'vibration', 'value': float(v)} for v in range(10)]
+    newest_first = rising[::-1]
+    features = extract_statistical_features(layout(newest_first))
+    assert features['vibration_trend'] == pytest.approx(-1.0)
+    assert features == pytest.approx(baseline_features(newest_first))
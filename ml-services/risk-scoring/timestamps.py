@@ -0,0 +1,27 @@
+"""
+Parsing of command-line times and conversions between datetimes and the
+int64 microseconds since the Unix epoch that NumPy columns, the hot window
+files and reading streams hold.
+"""
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_time(text: str) -> datetime:
+    """ISO-8601 date or timestamp; naive values are taken as UTC"""
+    value = datetime.fromisoformat(text)
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def to_micros(timestamp: datetime) -> int:
+    """Microseconds since the epoch; naive timestamps are taken as UTC"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(micros: int) -> datetime:
+    """UTC datetime for microseconds since the epoch"""
+    return EPOCH + timedelta(microseconds=micros)
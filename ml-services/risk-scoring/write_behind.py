@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg2 import DataError, IntegrityError
+
+from database import db
+from metrics import REGISTRY, Counter, Gauge, Histogram
+from models import RiskScore
+from risk_engine import risk_score_record
+
+logger = logging.getLogger(__name__)
+
+FLUSHED_ROWS = REGISTRY.register(Counter(
+    'risk_write_behind_rows_total', 'Risk scores written by the write-behind buffer'))
+FLUSH_FAILURES = REGISTRY.register(Counter(
+    'risk_write_behind_flush_failures_total', 'Write-behind flushes that failed and were retried'))
+DROPPED_ROWS = REGISTRY.register(Counter(
+    'risk_write_behind_dropped_total', 'Risk scores the database rejected, dropped instead of retried'))
+FLUSH_DURATION = REGISTRY.register(Histogram(
+    'risk_write_behind_flush_seconds', 'Duration of one write-behind flush'))
+PENDING_ROWS = REGISTRY.register(Gauge(
+    'risk_write_behind_pending', 'Risk scores buffered and not yet written'))
+
+
+class RiskScoreWriter:
+    """
+    Write-behind buffer for computed risk scores.
+
+    Scores are buffered and written by a background thread every
+    `flush_interval` seconds, or as soon as `max_rows` are pending, with one
+    multi-row statement per `max_rows` (see `Database.store_risk_scores_batch`).
+    Flushes are serialized and failed rows are retried ahead of newer ones,
+    so an asset's current score never goes backwards. Rows the database
+    rejects outright (integrity or data errors) are logged and dropped, as
+    retrying them would block every write behind them.
+
+    Durability controls:
+    - `stop()` flushes whatever is pending (called on shutdown)
+    - when the oldest pending score is older than `max_lag` seconds (the
+      database is slow or failing), submitters flush synchronously instead of
+      queueing, so errors reach callers instead of piling up in memory
+    - `sync=True` returns only once the score (and everything queued before
+      it) is committed
+    """
+
+    def __init__(self, flush_interval: float = 0.2, max_rows: int = 1000, max_lag: float = 5.0,
+                 enabled: bool = True):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_lag = max_lag
+        self.enabled = enabled
+
+        # (monotonic enqueue time, record) in submission order
+        self._pending: List[Tuple[float, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'submitted': 0,
+            'written': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'dropped': 0,
+            'sync_flushes': 0,
+            'last_flush_ms': 0.0
+        }
+        self._last_error: Optional[str] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.enabled:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='risk-write-behind', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write everything still pending"""
+        thread = self._thread
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join()
+            self._thread = None
+        self.flush()
+
+    def submit(self, risk_score: RiskScore, sync: bool = False):
+        self.submit_many([risk_score], sync=sync)
+
+    def submit_many(self, risk_scores: Iterable[RiskScore], sync: bool = False):
+        """Queue scores for writing; `sync=True` waits until they are committed"""
+        self.submit_records([timed_record(risk_score) for risk_score in risk_scores], sync=sync)
+
+    def submit_records(self, score_records: List[Dict[str, Any]], sync: bool = False):
+        """Queue already converted records (see `timed_record`)"""
+        now = time.monotonic()
+        records = [(now, record) for record in score_records]
+        if not records:
+            return
+
+        with self._lock:
+            self._pending.extend(records)
+            pending = len(self._pending)
+            lagging = now - self._pending[0][0] > self.max_lag
+        self._stats['submitted'] += len(records)
+        PENDING_ROWS.set(pending)
+
+        if sync or not self.enabled or lagging or self._thread is None:
+            if lagging and not sync:
+                logger.warning("Write-behind lag above %.1fs, flushing synchronously", self.max_lag)
+            self._stats['sync_flushes'] += 1
+            self.flush()
+        elif pending >= self.max_rows:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything pending now; raises (keeping the rows queued) if the write fails"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            # Rows handled (written or dropped) and rows written
+            done = written = 0
+            try:
+                for first in range(0, len(batch), self.max_rows):
+                    chunk = [record for _, record in batch[first:first + self.max_rows]]
+                    try:
+                        db.store_risk_scores_batch(chunk)
+                        written += len(chunk)
+                    except (IntegrityError, DataError):
+                        # One bad row fails the whole statement: write the chunk row by row instead
+                        written += self._store_rows(chunk)
+                    done += len(chunk)
+            except Exception as e:
+                # Put unhandled rows back ahead of anything queued meanwhile
+                with self._lock:
+                    self._pending[:0] = batch[done:]
+                self._stats['failed_flushes'] += 1
+                self._last_error = str(e)
+                FLUSH_FAILURES.inc()
+                raise
+            finally:
+                self._stats['written'] += written
+                FLUSHED_ROWS.inc(written)
+                PENDING_ROWS.set(len(self._pending))
+                elapsed = time.perf_counter() - start
+                FLUSH_DURATION.observe(elapsed)
+                self._stats['last_flush_ms'] = round(elapsed * 1000, 3)
+            self._stats['flushes'] += 1
+
+    def _store_rows(self, records: List[Dict[str, Any]]) -> int:
+        """Store records one at a time, dropping those the database rejects; returns the number stored"""
+        stored = 0
+        for record in records:
+            try:
+                db.store_risk_scores_batch([record])
+                stored += 1
+            except (IntegrityError, DataError) as e:
+                self._stats['dropped'] += 1
+                self._last_error = str(e)
+                DROPPED_ROWS.inc()
+                logger.error("Dropping risk score for asset %s rejected by the database: %s",
+                             record.get('asset_id'), e)
+        return stored
+
+    def _run(self):
+        retry_delay = self.flush_interval
+        while not self._stopping.is_set():
+            self._wakeup.wait(retry_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                retry_delay = self.flush_interval
+            except Exception:
+                logger.exception("Write-behind flush failed, retrying")
+                # Back off while the database is unhealthy
+                retry_delay = min(retry_delay * 2, max(self.max_lag, self.flush_interval))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+            oldest = self._pending[0][0] if self._pending else None
+        return {
+            **self._stats,
+            'enabled': self.enabled,
+            'running': self._thread is not None,
+            'pending': pending,
+            'lag_ms': round((time.monotonic() - oldest) * 1000, 3) if oldest is not None else 0.0,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'max_rows': self.max_rows,
+            'max_lag_ms': self.max_lag * 1000,
+            'last_error': self._last_error
+        }
+
+
+def timed_record(risk_score: RiskScore) -> Dict[str, Any]:
+    """`risk_score_record` plus the time the score was computed"""
+    record = risk_score_record(risk_score)
+    # Keep the time the score was computed rather than when it is flushed
+    timestamp: datetime = risk_score.timestamp
+    record['time'] = timestamp if timestamp.tzinfo is not None else timestamp.astimezone()
+    return record
+
+
+risk_writer = RiskScoreWriter(
+    flush_interval=float(os.getenv('WRITE_BEHIND_FLUSH_MS', 200)) / 1000,
+    max_rows=int(os.getenv('WRITE_BEHIND_MAX_ROWS', 1000)),
+    max_lag=float(os.getenv('WRITE_BEHIND_MAX_LAG_MS', 5000)) / 1000,
+    enabled=os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+)
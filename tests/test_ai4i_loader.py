@@ -0,0 +1,69 @@
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai4i_loader import (
+    READING_COLUMNS,
+    SENSOR_COLUMNS,
+    build_readings,
+    reading_timestamps,
+    readings_to_csv,
+    sensor_frame,
+    synthesize_machine,
+)
+
+END_TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def ai4i_frame(n, seed=0):
+    """Random rows in the shape of the AI4I CSV"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Air temperature [K]": rng.normal(300, 2, n).round(1),
+        "Process temperature [K]": rng.normal(310, 1.5, n).round(1),
+        "Rotational speed [rpm]": rng.integers(1200, 2900, n),
+        "Torque [Nm]": rng.normal(40, 10, n).round(1),
+        "Tool wear [min]": rng.integers(0, 250, n),
+        "Machine failure": (rng.random(n) < 0.03).astype(int),
+    })
+
+
+def time_text(timestamps):
+    # Formatted as load() formats them for COPY
+    return np.datetime_as_string(
+        timestamps.tz_convert("UTC").tz_localize(None).to_numpy().astype("datetime64[s]"), unit="s"
+    ).astype(object) + "Z"
+
+
+def parse_copy_csv(text):
+    frame = pd.read_csv(io.StringIO(text), names=list(READING_COLUMNS), header=None)
+    frame["time"] = pd.to_datetime(frame["time"], utc=True)
+    return frame
+
+
+def reference(wide, asset_id, timestamps):
+    frame = build_readings(wide, asset_id, timestamps)
+    frame["time"] = pd.to_datetime(frame["time"], utc=True)
+    return frame.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("n", [1, 7, 500])
+def test_readings_to_csv_matches_build_readings(n):
+    wide = sensor_frame(ai4i_frame(n))
+    timestamps = reading_timestamps(n, END_TIME, 5)
+    rows = parse_copy_csv(readings_to_csv(wide, "asset-1", time_text(timestamps)))
+    expected = reference(wide, "asset-1", timestamps)
+    pd.testing.assert_frame_equal(rows, expected, check_dtype=False)
+    assert len(rows) == n * len(SENSOR_COLUMNS)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_synthesized_machines_match_build_readings(seed):
+    base = sensor_frame(ai4i_frame(200, seed))
+    machine, _ = synthesize_machine(base, np.random.default_rng(seed))
+    timestamps = reading_timestamps(len(machine), END_TIME, 5)
+    rows = parse_copy_csv(readings_to_csv(machine, "asset-2", time_text(timestamps)))
+    pd.testing.assert_frame_equal(rows, reference(machine, "asset-2", timestamps), check_dtype=False)